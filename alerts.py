@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+from email.message import EmailMessage
+
+
+# === Каналы доставки уведомлений ===
+
+class LogFileSink:
+    """Дописывает уведомления в текстовый журнал."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, alerts):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(f"{alert['время']} [{alert['уровень']}] {alert['сообщение']}\n")
+
+
+class EmailSink:
+    """Отправляет пакет уведомлений одним письмом через SMTP (по умолчанию — локальный сервер на порту 1025)."""
+
+    def __init__(self, recipients, sender="signatum@localhost", host="localhost", port=1025, timeout=10):
+        self.recipients = recipients
+        self.sender = sender
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send(self, alerts):
+        msg = EmailMessage()
+        msg["Subject"] = f"Signatum: уведомлений о запасах — {len(alerts)}"
+        msg["From"] = self.sender
+        msg["To"] = ", ".join(self.recipients)
+        msg.set_content("\n".join(f"[{a['уровень']}] {a['сообщение']}" for a in alerts))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.send_message(msg)
+
+
+class WebhookSink:
+    """Отправляет пакет уведомлений POST-запросом с JSON-телом."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts):
+        body = json.dumps({"уведомления": alerts}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+# === Движок уведомлений ===
+
+class AlertEngine:
+    """Проверяет пороги только для изменившихся ключей, подавляет повторы и доставляет уведомления в фоне.
+
+    evaluate(ключ) возвращает {"уровень", "сообщение"} или None, если всё в порядке.
+    Одинаковое уведомление по ключу повторяется не чаще, чем раз в repeat_after секунд;
+    если за одну проверку набралось больше max_batch уведомлений, каналы получают одну сводку.
+    """
+
+    def __init__(self, evaluate, history_file, sinks=(), repeat_after=3600, max_batch=20):
+        self.evaluate = evaluate
+        self.history_file = history_file
+        self.sinks = list(sinks)
+        self.repeat_after = repeat_after
+        self.max_batch = max_batch
+        self.active = {}  # ключ -> последнее отправленное уведомление
+        self.pending = set()
+        self.listeners = []  # вызываются в потоке check() со списком новых уведомлений
+        self._outbox = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Запускает фоновую доставку по каналам (sinks). До запуска уведомления копятся в очереди,
+        так что при использовании движка как библиотеки лишний поток не создаётся."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._deliver_forever, daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self, keys):
+        self.pending.update(keys)
+
+    def check(self, keys=None):
+        """Проверяет накопленные (или указанные) ключи. Возвращает список новых уведомлений."""
+        if keys is None:
+            keys, self.pending = self.pending, set()
+        now = time.time()
+        raised, resolved = [], []
+        for key in sorted(keys):
+            result = self.evaluate(key)
+            previous = self.active.get(key)
+            if result is None:
+                if previous is not None:
+                    del self.active[key]
+                    resolved.append(self._make(key, "норма", f"{key}: запас восстановлен", now))
+                continue
+            if (previous is not None and previous["уровень"] == result["уровень"]
+                    and now - previous["отметка"] < self.repeat_after):
+                continue
+            alert = self._make(key, result["уровень"], result["сообщение"], now)
+            self.active[key] = alert
+            raised.append(alert)
+        if raised or resolved:
+            self._append_history(raised + resolved)
+            for listener in self.listeners:
+                listener(raised + resolved)
+        if raised:
+            if len(raised) > self.max_batch:
+                summary = self._make("*", "сводка", f"Нехватка по {len(raised)} моделям: " +
+                                     ", ".join(a["ключ"] for a in raised), now)
+                self._outbox.put([summary])
+            else:
+                self._outbox.put(raised)
+        return raised
+
+    def history(self, limit=200):
+        """Последние limit записей журнала уведомлений (новые в конце)."""
+        if not os.path.exists(self.history_file):
+            return []
+        with open(self.history_file, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in deque(f, maxlen=limit) if line.strip()]
+
+    @staticmethod
+    def _make(key, level, message, timestamp):
+        return {
+            "ключ": key,
+            "уровень": level,
+            "сообщение": message,
+            "время": datetime.fromtimestamp(timestamp).isoformat(timespec="seconds"),
+            "отметка": timestamp
+        }
+
+    def _append_history(self, alerts):
+        with open(self.history_file, 'a', encoding='utf-8') as f:
+            for alert in alerts:
+                f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+    def _deliver_forever(self):
+        while True:
+            alerts = self._outbox.get()
+            for sink in self.sinks:
+                try:
+                    sink.send(alerts)
+                except Exception as e:
+                    logging.error(f"Не удалось доставить уведомления через {type(sink).__name__}: {e}")
@@ -0,0 +1,126 @@
+import heapq
+import itertools
+
+from events import CARTRIDGE_REMOVED
+
+# Порядок выдачи картриджей со склада
+POLICIES = {
+    "fifo": "Сначала поступившие раньше",
+    "ресурс": "Сначала с меньшим остаточным ресурсом",
+}
+DEFAULT_POLICY = "fifo"
+RESERVE_FIELD = "резерв"  # серийный номер принтера, за которым закреплён картридж на складе
+
+
+def policy_key(policy, cartridge):
+    """Ключ очереди: чем меньше, тем раньше картридж выдаётся."""
+    received = cartridge.get("дата_поступления") or ""
+    if policy == "ресурс":
+        return cartridge.get("остаточный_ресурс", 100), received
+    return (received,)
+
+
+class StockAllocator:
+    """Очереди картриджей на складе: куча на каждую тройку (модель, площадка, резерв).
+
+    Ключ кучи задаётся политикой выдачи. Очереди обновляются по событиям изменения картриджей
+    (update); изменённая запись кладётся в кучу заново, а устаревшие элементы отбрасываются,
+    когда оказываются на вершине. Так выбор следующего картриджа стоит O(log n).
+    Картриджи в резерве выдаются только своему принтеру, причём раньше свободных.
+    """
+
+    def __init__(self, site_of, policy=DEFAULT_POLICY):
+        self.site_of = site_of
+        self.policy = policy if policy in POLICIES else DEFAULT_POLICY
+        self._heaps = {}  # (модель, площадка, резерв) -> [(ключ, номер, картридж)]
+        self._current = {}  # id картриджа -> (очередь, номер действующего элемента в ней)
+        self._counter = itertools.count()
+
+    def rebuild(self, cartridges, policy=None):
+        if policy is not None:
+            self.policy = policy if policy in POLICIES else DEFAULT_POLICY
+        self._heaps.clear()
+        self._current.clear()
+        for c in cartridges:
+            if c["статус"] == "на складе":
+                self._push(c)
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+    def update(self, changes):
+        """Обработчик событий картриджей."""
+        for e in changes:
+            c = e.record
+            if e.type == CARTRIDGE_REMOVED or c["статус"] != "на складе":
+                self._current.pop(c["id"], None)
+            elif e.old is None or e.old.get("статус") != "на складе" or self._bucket(e.old) != self._bucket(c) or \
+                    policy_key(self.policy, e.old) != policy_key(self.policy, c) or c["id"] not in self._current:
+                self._push(c, heapify=True)
+
+    def allocate(self, model, site=None, printer_sn="", count=1, reserved_only=False, free_only=False):
+        """До count картриджей модели на складе площадки site (None — любой) в порядке политики.
+
+        Для принтера printer_sn сначала берутся закреплённые за ним, потом свободные. Картриджи
+        не извлекаются: они уходят из очередей, когда вызывающий код меняет их состояние.
+        """
+        if reserved_only:
+            reserves = [printer_sn]
+        elif free_only or not printer_sn:
+            reserves = [""]
+        else:
+            reserves = [printer_sn, ""]
+        taken = []
+        for reserve in reserves:
+            buckets = [key for key in self._heaps
+                       if key[0] == model and key[2] == reserve and (site is None or key[1] == site)]
+            taken.extend(self._take(buckets, count - len(taken), {c["id"] for c in taken}))
+            if len(taken) >= count:
+                break
+        return taken
+
+    def available(self, model, site=None, printer_sn=""):
+        """Сколько картриджей модели можно выдать принтеру printer_sn (или без резерва)."""
+        reserves = {printer_sn, ""}
+        return sum(1 for (m, s, reserve), _ in self._current.values()
+                   if m == model and reserve in reserves and (site is None or s == site))
+
+    def _bucket(self, c):
+        return c["модель"], self.site_of(c), c.get(RESERVE_FIELD) or ""
+
+    def _push(self, c, heapify=False):
+        bucket = self._bucket(c)
+        number = next(self._counter)
+        self._current[c["id"]] = (bucket, number)
+        item = (policy_key(self.policy, c), number, c)
+        heap = self._heaps.setdefault(bucket, [])
+        if heapify:
+            heapq.heappush(heap, item)
+        else:
+            heap.append(item)
+
+    def _valid(self, bucket, item):
+        c = item[2]
+        return self._current.get(c["id"]) == (bucket, item[1])
+
+    def _take(self, buckets, count, exclude):
+        """Снимает с вершин куч до count лучших действующих элементов и возвращает их картриджи."""
+        taken, held = [], []
+        while len(taken) < count:
+            best = None
+            for bucket in buckets:
+                heap = self._heaps[bucket]
+                while heap and not self._valid(bucket, heap[0]):
+                    heapq.heappop(heap)  # устаревший элемент: запись изменилась или ушла со склада
+                if heap and (best is None or heap[0][:2] < self._heaps[best][0][:2]):
+                    best = bucket
+            if best is None:
+                break
+            item = heapq.heappop(self._heaps[best])
+            held.append((best, item))
+            c = item[2]
+            # Внутри bus.batch() события ещё не доставлены — проверяем саму запись
+            if c["id"] not in exclude and c["статус"] == "на складе" and self._bucket(c) == best:
+                taken.append(c)
+        for bucket, item in held:
+            heapq.heappush(self._heaps[bucket], item)
+        return taken
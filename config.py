@@ -0,0 +1,25 @@
+import json
+import os
+
+CONFIG_FILE = "config.json"
+
+
+def configured_data_dir():
+    """Папка данных из переменной SIGNATUM_DATA_DIR или из "data_directory" в config.json; None, если не задана."""
+    env_dir = os.environ.get("SIGNATUM_DATA_DIR")
+    if env_dir:
+        return env_dir
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            data_dir = json.load(f).get("data_directory")
+        if data_dir and os.path.isdir(data_dir):
+            return data_dir
+    return None
+
+
+def resolve_data_dir(parser, args):
+    """Папка данных для запуска из командной строки: --data-dir, иначе configured_data_dir(), иначе ошибка parser."""
+    data_dir = args.data_dir or configured_data_dir()
+    if not data_dir:
+        parser.error("не указана папка данных (--data-dir)")
+    return data_dir
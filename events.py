@@ -0,0 +1,81 @@
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Типы событий изменения данных
+CARTRIDGE_ADDED = "картридж_добавлен"
+CARTRIDGE_REMOVED = "картридж_удалён"
+CARTRIDGE_CHANGED = "картридж_изменён"
+CARTRIDGE_STATE_CHANGED = "картридж_сменил_состояние"
+MODEL_ADDED = "модель_добавлена"
+MODEL_CHANGED = "модель_изменена"
+MODEL_REMOVED = "модель_удалена"
+PRINTER_ADDED = "принтер_добавлен"
+PRINTER_CHANGED = "принтер_изменён"
+PRINTER_REMOVED = "принтер_удалён"
+SETTINGS_CHANGED = "настройки_изменены"
+HISTORY_ADDED = "история_дополнена"
+HISTORY_REMOVED = "история_запись_удалена"
+HISTORY_CHANGED = "история_запись_изменена"
+
+CARTRIDGE_EVENTS = (CARTRIDGE_ADDED, CARTRIDGE_REMOVED, CARTRIDGE_CHANGED, CARTRIDGE_STATE_CHANGED)
+MODEL_EVENTS = (MODEL_ADDED, MODEL_CHANGED, MODEL_REMOVED)
+PRINTER_EVENTS = (PRINTER_ADDED, PRINTER_CHANGED, PRINTER_REMOVED)
+HISTORY_EVENTS = (HISTORY_ADDED, HISTORY_REMOVED, HISTORY_CHANGED)
+
+# record — затронутая запись, old — её копия до изменения (для *_CHANGED / *_STATE_CHANGED),
+# models — модели картриджей, остатки которых могли измениться
+ChangeEvent = namedtuple("ChangeEvent", ["type", "record", "old", "models"])
+
+
+class EventBus:
+    """Шина событий изменения данных.
+
+    Подписчик получает список событий: по одному при обычной публикации
+    и все сразу при публикации внутри batch().
+    """
+
+    def __init__(self):
+        self._subscribers = []  # (типы событий или None для всех, обработчик)
+        self._pending = None
+        self._batch_depth = 0
+
+    def subscribe(self, handler, *event_types):
+        self._subscribers.append((frozenset(event_types) or None, handler))
+        return handler
+
+    def unsubscribe(self, handler):
+        self._subscribers = [(types, h) for types, h in self._subscribers if h is not handler]
+
+    def emit(self, event_type, record=None, old=None, models=()):
+        event = ChangeEvent(event_type, record, old, frozenset(models))
+        if self._pending is not None:
+            self._pending.append(event)
+        else:
+            self._deliver([event])
+        return event
+
+    @contextmanager
+    def batch(self):
+        """Копит события и доставляет их подписчикам одним списком по выходу из блока."""
+        if self._batch_depth == 0:
+            self._pending = []
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                events, self._pending = self._pending, None
+                if events:
+                    self._deliver(events)
+
+    def _deliver(self, events):
+        for types, handler in list(self._subscribers):
+            matching = events if types is None else [e for e in events if e.type in types]
+            if not matching:
+                continue
+            try:
+                handler(matching)
+            except Exception:
+                logging.exception(f"Ошибка обработчика событий {getattr(handler, '__name__', handler)}")
@@ -0,0 +1,324 @@
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import datetime, timedelta
+
+from config import resolve_data_dir
+from oplog import to_timestamp
+
+HISTORY_COLUMNS_DIRNAME = "history_columns"
+META_FILENAME = "meta.json"
+# Столбец -> код типа array: время установки, код модели, код площадки, остаток при установке (-1 — не указан)
+COLUMNS = {"время": "d", "модель": "I", "площадка": "I", "ресурс": "h"}
+NO_RESOURCE = -1
+WEEK = 7 * 24 * 3600
+
+
+class HistoryColumns:
+    """Столбцовая копия истории установок для быстрой аналитики только на чтение.
+
+    Каждый столбец — отдельный файл фиксированной ширины (см. COLUMNS), строки упорядочены
+    по времени установки. Файлы отображаются в память (mmap), поэтому подсчёты и выборки
+    за период не разбирают JSON и не создают объект на каждую запись: интервал дат находится
+    двоичным поиском по столбцу "время", а агрегаты считаются по срезам столбцов.
+    Модели и площадки хранятся кодами; словари кодов лежат в meta.json.
+    """
+
+    def __init__(self, data_dir):
+        self.directory = os.path.join(data_dir, HISTORY_COLUMNS_DIRNAME)
+        self.meta = None
+        self._maps = {}
+        self._views = {}
+
+    # === Запись ===
+
+    def build(self, records, default_site=""):
+        """Пересобирает столбцы из записей истории установок (раздел "записи" history.json).
+
+        Установки без площадки относятся к default_site.
+        """
+        self.close()
+        meta = {"модели": [], "площадки": [], "записей": 0, "последняя": None,
+                "источник": len(records), "площадка_по_умолчанию": default_site}
+        columns = {name: array(code) for name, code in COLUMNS.items()}
+        _append_rows(meta, columns, _rows(records, default_site))
+        os.makedirs(self.directory, exist_ok=True)
+        for name, column in columns.items():
+            tmp = self._path(name) + ".tmp"
+            with open(tmp, 'wb') as f:
+                column.tofile(f)
+            os.replace(tmp, self._path(name))
+        self._write_meta(meta)
+
+    def append(self, records):
+        """Дописывает установки, которые не раньше последней в хранилище. Возвращает False, если
+        хранилища нет или порядок нарушен — тогда нужна пересборка build."""
+        meta = self._read_meta()
+        if meta is None:
+            return False
+        rows = _rows(records, meta["площадка_по_умолчанию"])
+        if rows and meta["последняя"] is not None and rows[0][0] < meta["последняя"]:
+            return False
+        self.close()
+        columns = {name: array(code) for name, code in COLUMNS.items()}
+        _append_rows(meta, columns, rows)
+        meta["источник"] += len(records)
+        for name, column in columns.items():
+            with open(self._path(name), 'ab') as f:
+                column.tofile(f)
+        self._write_meta(meta)
+        return True
+
+    def matches(self, records, default_site=""):
+        """Соответствует ли хранилище списку установок: то же число записей, та же последняя дата
+        и площадка по умолчанию. Дешёвая проверка при запуске; правки задним числом не распознаёт."""
+        meta = self._read_meta()
+        if meta is None or meta["источник"] != len(records) or meta["площадка_по_умолчанию"] != default_site:
+            return False
+        last = _rows(records[-1:], default_site)
+        return not last or last[0][0] == meta["последняя"]
+
+    # === Чтение ===
+
+    def open(self):
+        """Отображает столбцы в память. Возвращает False, если хранилище ещё не построено."""
+        if self.meta is not None:
+            return True
+        meta = self._read_meta()
+        if meta is None:
+            return False
+        for name, code in COLUMNS.items():
+            with open(self._path(name), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size:
+                    self._maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    view = memoryview(self._maps[name])
+                else:
+                    view = memoryview(b"")
+            self._views[name] = view.cast(code)[:meta["записей"]]
+        self.meta = meta
+        return True
+
+    def close(self):
+        for view in self._views.values():
+            view.release()
+        for m in self._maps.values():
+            m.close()
+        self._views.clear()
+        self._maps.clear()
+        self.meta = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.meta["записей"] if self.meta else 0
+
+    def span(self, start=None, end=None):
+        """Индексы [lo, hi) установок с start <= время < end."""
+        times = self._views["время"]
+        lo = bisect_left(times, to_timestamp(start)) if start is not None else 0
+        hi = bisect_left(times, to_timestamp(end)) if end is not None else len(times)
+        return lo, hi
+
+    def count(self, start=None, end=None, model=None, site=None):
+        lo, hi = self.span(start, end)
+        filters = self._filters(model, site)
+        if filters is None:
+            return 0
+        if not filters:
+            return hi - lo
+        if len(filters) == 1:
+            (name, code), = filters.items()
+            return array(COLUMNS[name], self._views[name][lo:hi]).count(code)
+        models, sites = self._views["модель"][lo:hi], self._views["площадка"][lo:hi]
+        return sum(1 for m, s in zip(models, sites) if m == filters["модель"] and s == filters["площадка"])
+
+    def counts_by_model(self, start=None, end=None, site=None):
+        """{модель: число установок} за период."""
+        lo, hi = self.span(start, end)
+        models = self._views["модель"][lo:hi]
+        if site is None:
+            counts = Counter(models)
+        else:
+            site_code = self._code("площадки", site)
+            if site_code is None:
+                return {}
+            counts = Counter(m for m, s in zip(models, self._views["площадка"][lo:hi]) if s == site_code)
+        names = self.meta["модели"]
+        return {names[code]: n for code, n in counts.most_common()}
+
+    def weekly_counts(self, models, start, end, weeks, site=None):
+        """Установки по моделям, разложенные по неделям: модель -> [кол-во за неделю].
+
+        Считает так же, как reorder.weekly_consumption: start <= время <= end, установки
+        после последней полной недели попадают в последнюю.
+        """
+        series = {model: [0] * weeks for model in models}
+        codes = {code: series[model] for model in models
+                 if (code := self._code("модели", model)) is not None}
+        site_code = None if site is None else self._code("площадки", site)
+        if not codes or (site is not None and site_code is None):
+            return series
+        start, end = to_timestamp(start), to_timestamp(end)
+        times = self._views["время"]
+        lo = bisect_left(times, start)
+        hi = bisect_right(times, end)
+        sites = self._views["площадка"]
+        last = weeks - 1
+        for i, code in enumerate(self._views["модель"][lo:hi], lo):
+            counts = codes.get(code)
+            if counts is not None and (site_code is None or sites[i] == site_code):
+                counts[min(last, int(times[i] - start) // WEEK)] += 1
+        return series
+
+    def resource_stats(self, start=None, end=None, site=None):
+        """{модель: (установок с указанным остатком, средний остаток при установке)}."""
+        lo, hi = self.span(start, end)
+        site_code = None if site is None else self._code("площадки", site)
+        if site is not None and site_code is None:
+            return {}
+        sums, counts = Counter(), Counter()
+        sites = self._views["площадка"][lo:hi]
+        for i, (m, r) in enumerate(zip(self._views["модель"][lo:hi], self._views["ресурс"][lo:hi])):
+            if r != NO_RESOURCE and (site_code is None or sites[i] == site_code):
+                sums[m] += r
+                counts[m] += 1
+        names = self.meta["модели"]
+        return {names[m]: (n, round(sums[m] / n, 1)) for m, n in counts.items()}
+
+    def first_time(self):
+        return self._views["время"][0] if len(self) else None
+
+    def last_time(self):
+        return self._views["время"][len(self) - 1] if len(self) else None
+
+    def _filters(self, model, site):
+        """{столбец: код} для заданных фильтров или None, если значения нет в словаре (совпадений нет)."""
+        filters = {}
+        for column, key, value in (("модель", "модели", model), ("площадка", "площадки", site)):
+            if value is not None:
+                code = self._code(key, value)
+                if code is None:
+                    return None
+                filters[column] = code
+        return filters
+
+    def _code(self, key, value):
+        codes = self.meta.setdefault(f"_{key}_коды", {name: i for i, name in enumerate(self.meta[key])})
+        return codes.get(value)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.{COLUMNS[name]}")
+
+    def _read_meta(self):
+        path = os.path.join(self.directory, META_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        meta = {k: v for k, v in meta.items() if not k.startswith("_")}
+        meta["обновлено"] = time.time()
+        path = os.path.join(self.directory, META_FILENAME)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+
+def _rows(records, default_site):
+    """Строки (время, модель, площадка, остаток) записей с корректной датой установки, по возрастанию времени."""
+    rows = []
+    for rec in records:
+        try:
+            ts = datetime.fromisoformat(rec["дата_установки"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            continue
+        rows.append((ts, rec.get("модель_картриджа") or "", rec.get("площадка") or default_site,
+                     rec.get("остаток_при_установке")))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def _append_rows(meta, columns, rows):
+    """Кодирует строки (время, модель, площадка, остаток) в столбцы, дополняя словари meta."""
+    codes = {key: {name: i for i, name in enumerate(meta[key])} for key in ("модели", "площадки")}
+    for ts, model, site, resource in rows:
+        columns["время"].append(ts)
+        for column, key, value in (("модель", "модели", model), ("площадка", "площадки", site)):
+            code = codes[key].get(value)
+            if code is None:
+                code = codes[key][value] = len(meta[key])
+                meta[key].append(value)
+            columns[column].append(code)
+        try:
+            columns["ресурс"].append(max(NO_RESOURCE, min(32767, int(resource))))
+        except (TypeError, ValueError):
+            columns["ресурс"].append(NO_RESOURCE)
+    meta["записей"] += len(rows)
+    if rows:
+        meta["последняя"] = rows[-1][0]
+
+
+# === Запуск из командной строки ===
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Signatum: быстрая статистика по истории установок")
+    parser.add_argument("--data-dir", help="папка данных Signatum (по умолчанию — SIGNATUM_DATA_DIR или config.json)")
+    parser.add_argument("--from", dest="start", help="начало периода, ГГГГ-ММ-ДД")
+    parser.add_argument("--to", dest="end", help="конец периода (не включая), ГГГГ-ММ-ДД")
+    parser.add_argument("--model", help="только эта модель")
+    parser.add_argument("--site", help="только эта площадка")
+    parser.add_argument("--weekly", action="store_true", help="установки модели (--model) по неделям")
+    parser.add_argument("--resource", action="store_true", help="средний остаток при установке по моделям")
+    parser.add_argument("--rebuild", action="store_true", help="пересобрать столбцы из history.json")
+    args = parser.parse_args(argv)
+    data_dir = resolve_data_dir(parser, args)
+    default_site = "Основная"
+    settings_path = os.path.join(data_dir, "settings.json")
+    if os.path.exists(settings_path):
+        with open(settings_path, 'r', encoding='utf-8') as f:
+            default_site = json.load(f).get("площадка_по_умолчанию", default_site)
+    with open(os.path.join(data_dir, "history.json"), 'r', encoding='utf-8') as f:
+        records = json.load(f).get("записи", [])
+    store = HistoryColumns(data_dir)
+    # Как при запуске программы: устаревшее хранилище пересобирается, иначе отчёт не увидит новых установок
+    if args.rebuild or not store.matches(records, default_site):
+        store.build(records, default_site)
+    start = datetime.fromisoformat(args.start) if args.start else None
+    end = datetime.fromisoformat(args.end) if args.end else None
+    with store:
+        updated = datetime.fromtimestamp(store.meta["обновлено"])
+        print(f"Установок в хранилище: {len(store)} (обновлено {updated:%d.%m.%Y %H:%M})")
+        if args.weekly:
+            if not args.model:
+                parser.error("--weekly требует --model")
+            end = end or datetime.now()
+            start = start or end - timedelta(days=182)
+            weeks = max(1, -(-(end - start).days // 7))
+            for week, n in enumerate(store.weekly_counts([args.model], start, end, weeks, args.site)[args.model]):
+                print(f"  {start + timedelta(weeks=week):%d.%m.%Y}: {n}")
+        elif args.resource:
+            for model, (n, mean) in sorted(store.resource_stats(start, end, args.site).items()):
+                print(f"  {model}: {n} установок, средний остаток {mean}%")
+        elif args.model:
+            print(f"  {args.model}: {store.count(start, end, args.model, args.site)}")
+        else:
+            for model, n in store.counts_by_model(start, end, args.site).items():
+                print(f"  {model}: {n}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from allocation import RESERVE_FIELD
+from config import resolve_data_dir
+
+# Виды проблем: код -> описание для отчёта
+CHECKS = {
+    "дубль_сн_картриджа": "Повторяющийся серийный номер картриджа",
+    "дубль_сн_принтера": "Повторяющийся серийный номер принтера",
+    "нет_модели_принтера": "Принтер ссылается на модель картриджа, которой нет в реестре",
+    "нет_модели_картриджа": "Картридж модели, которой нет в реестре",
+    "неверный_ресурс": "Остаточный ресурс не число или вне 0–100",
+    "неверная_дата": "Дата в неверном формате",
+    "нет_картриджа": "Запись истории ссылается на несуществующий картридж",
+    "резерв_без_принтера": "Картридж в резерве у принтера, которого нет",
+}
+# Форматы, в которых даты вводили вручную; такие даты переводятся в ISO
+DATE_FORMATS = ("%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y", "%d/%m/%Y", "%Y/%m/%d")
+NO_SERIAL = ("", "N/A")
+
+
+def check(printers, cartridges, models, history, archived_serials=()):
+    """Проверяет все коллекции за один проход по каждой, сверяясь с заранее построенными множествами.
+
+    Возвращает список проблем {"проверка", "вид", "запись", "поле", "значение", "исправление"}.
+    "исправление" — изменения полей записи "вид" (для "нет_модели_*" — название модели,
+    которую нужно добавить в реестр) или None, если автоматически исправить нельзя.
+    """
+    issues = []
+    known_models = {m.get("модель") for m in models}
+    serials = {c.get("серийный_номер") for c in cartridges}
+    seen_serials = set()
+    seen_printer_serials = set()
+
+    for p in printers:
+        sn = p.get("серийный_номер", "")
+        if sn not in NO_SERIAL:
+            if sn in seen_printer_serials:
+                # Картриджи ссылаются на принтер по серийному номеру — переименование разорвёт связь
+                issues.append(_issue("дубль_сн_принтера", "принтер", p, "серийный_номер", sn))
+            seen_printer_serials.add(sn)
+        for i in range(1, 5):
+            model = p.get(f"картридж_{i}", "")
+            if model and model not in known_models:
+                issues.append(_issue("нет_модели_принтера", "принтер", p, f"картридж_{i}", model, model))
+        _check_dates(issues, "принтер", p)
+
+    for c in cartridges:
+        sn = c.get("серийный_номер", "")
+        if sn not in NO_SERIAL:
+            if sn in seen_serials:
+                new_sn = _free_serial(sn, serials)
+                issues.append(_issue("дубль_сн_картриджа", "картридж", c, "серийный_номер", sn,
+                                     {"серийный_номер": new_sn}))
+            seen_serials.add(sn)
+        reserve = c.get(RESERVE_FIELD)
+        if reserve and reserve not in seen_printer_serials:
+            # Принтер удалён или сменил серийный номер — резерв снимается, картридж становится свободным
+            issues.append(_issue("резерв_без_принтера", "картридж", c, RESERVE_FIELD, reserve, {RESERVE_FIELD: ""}))
+        if c.get("модель") not in known_models:
+            issues.append(_issue("нет_модели_картриджа", "картридж", c, "модель", c.get("модель"), c.get("модель")))
+        if "остаточный_ресурс" in c:
+            resource = _valid_resource(c["остаточный_ресурс"])
+            if resource != c["остаточный_ресурс"]:
+                issues.append(_issue("неверный_ресурс", "картридж", c, "остаточный_ресурс", c["остаточный_ресурс"],
+                                     {"остаточный_ресурс": resource}))
+        _check_dates(issues, "картридж", c)
+
+    for entry in history:
+        sn = entry.get("серийный_номер", "")
+        if sn not in NO_SERIAL and sn not in serials and sn not in archived_serials:
+            # История нужна для расчёта расхода, поэтому такие записи не удаляются
+            issues.append(_issue("нет_картриджа", "история", entry, "серийный_номер", sn))
+        _check_dates(issues, "история", entry)
+
+    for m in models:
+        _check_dates(issues, "модель", m)
+    return issues
+
+
+def _issue(code, kind, record, field, value, fix=None):
+    return {"проверка": code, "вид": kind, "запись": record, "поле": field, "значение": value, "исправление": fix}
+
+
+def _check_dates(issues, kind, record):
+    for field, value in record.items():
+        if field.startswith("дата_") and value:
+            fixed = _parse_date(value)
+            if fixed != value:
+                issues.append(_issue("неверная_дата", kind, record, field, value, fixed and {field: fixed}))
+
+
+def _parse_date(value):
+    """Дата в ISO: value как есть, если он уже в ISO, иначе перевод из DATE_FORMATS или None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        datetime.fromisoformat(value)
+        return value
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _valid_resource(value):
+    try:
+        resource = int(value)
+    except (TypeError, ValueError):
+        return 100
+    return min(100, max(0, resource))
+
+
+def _free_serial(sn, serials):
+    n = 2
+    while f"{sn}-{n}" in serials:
+        n += 1
+    new_sn = f"{sn}-{n}"
+    serials.add(new_sn)
+    return new_sn
+
+
+def summarize(issues):
+    """{код проверки: (всего, исправимо автоматически)} в порядке CHECKS."""
+    counts = {}
+    for issue in issues:
+        total, fixable = counts.get(issue["проверка"], (0, 0))
+        counts[issue["проверка"]] = (total + 1, fixable + (issue["исправление"] is not None))
+    return {code: counts[code] for code in CHECKS if code in counts}
+
+
+def plan_repairs(issues):
+    """Сводит исправления в пакет: (модели для добавления в реестр, [(вид, запись, изменения)])."""
+    missing_models = []
+    changes = {}
+    for issue in issues:
+        fix = issue["исправление"]
+        if fix is None:
+            continue
+        if issue["проверка"] in ("нет_модели_принтера", "нет_модели_картриджа"):
+            if fix not in missing_models:
+                missing_models.append(fix)
+            continue
+        key = id(issue["запись"])
+        if key not in changes:
+            changes[key] = (issue["вид"], issue["запись"], {})
+        changes[key][2].update(fix)
+    return missing_models, list(changes.values())
+
+
+def load_archive_serials(path):
+    """Серийные номера картриджей из архива списанных (cartridges_archive.jsonl)."""
+    serials = set()
+    if not os.path.exists(path):
+        return serials
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                serials.add(json.loads(line).get("серийный_номер"))
+    return serials
+
+
+def format_report(issues, limit=20):
+    lines = []
+    for code, (total, fixable) in summarize(issues).items():
+        lines.append(f"{CHECKS[code]}: {total} (исправимо: {fixable})")
+        for issue in [i for i in issues if i["проверка"] == code][:limit]:
+            lines.append(f"  {issue['вид']} {issue['запись'].get('id', '')}: {issue['поле']} = {issue['значение']!r}")
+    return lines
+
+
+# === Запуск из командной строки ===
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Signatum: проверка целостности данных")
+    parser.add_argument("--data-dir", help="папка данных Signatum (по умолчанию — SIGNATUM_DATA_DIR или config.json)")
+    parser.add_argument("--repair", action="store_true", help="исправить всё, что исправляется автоматически")
+    parser.add_argument("--limit", type=int, default=20, help="сколько записей показывать по каждой проверке")
+    args = parser.parse_args(argv)
+    data_dir = resolve_data_dir(parser, args)
+    os.environ["SIGNATUM_DATA_DIR"] = data_dir
+    import main as app  # данные только читаются и проверяются при импорте; startup() программы не выполняется
+
+    issues = app.integrity_issues
+    for line in format_report(issues, args.limit):
+        print(line)
+    if not issues:
+        print("Проблем не найдено")
+        return 0
+    if args.repair:
+        app.backup_files()
+        fixed = app.repair_data_integrity(issues)
+        left = app.check_data_integrity()
+        print(f"Исправлено записей: {fixed}, осталось проблем: {len(left)}")
+        return 1 if left else 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
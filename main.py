@@ -2,23 +2,48 @@ import os
 import json
 import csv
 import shutil
-from datetime import datetime
+import time
+import getpass
+import itertools
+import uuid
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from tkinter import *
 from tkinter import ttk, messagebox, filedialog
-from fpdf import FPDF
 import logging
+from search_index import SearchIndex
+import events
+from events import EventBus
+from snmp_poller import SupplyPoller
+from alerts import AlertEngine, LogFileSink, EmailSink, WebhookSink
+from oplog import OperationLog
+from stock_history import StockHistory
+from reorder import plan_orders, group_by_supplier, export_plan_csv, REORDER_DEFAULTS
+from reports import render_stock_report, render_purchase_order
+import integrity
+from xlsx import XlsxWriter, iter_rows, sheet_names
+from allocation import StockAllocator, POLICIES as ALLOCATION_POLICIES, RESERVE_FIELD
+from history_store import HistoryColumns
+from config import CONFIG_FILE, configured_data_dir
 
 # === Глобальный конфиг ===
-CONFIG_FILE = "config.json"
+# Модуль запущен как программа, а не импортирован командами reorder/reports/integrity или тестами:
+# только тогда может открыться диалог выбора папки. Импорт только читает данные, см. startup()
+RUN_AS_APP = __name__ == "__main__"
 
 
 def get_or_ask_data_directory():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            cfg = json.load(f)
-            data_dir = cfg.get("data_directory")
-            if data_dir and os.path.isdir(data_dir):
-                return data_dir
+    # Переменная окружения задаёт папку без диалога (запуск из командной строки и планировщика)
+    data_dir = configured_data_dir()
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+        return data_dir
+    if not RUN_AS_APP:
+        raise RuntimeError("Не задана папка данных: SIGNATUM_DATA_DIR или data_directory в config.json")
     root = Tk()
     root.withdraw()
     folder = filedialog.askdirectory(title="Выберите папку для хранения данных программы Signatum")
@@ -37,8 +62,8 @@ CARTRIDGES_FILE = os.path.join(DATA_DIR, "cartridges.json")
 CARTRIDGE_MODELS_FILE = os.path.join(DATA_DIR, "cartridge_models.json")
 HISTORY_FILE = os.path.join(DATA_DIR, "history.json")
 SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
+CARTRIDGES_ARCHIVE_FILE = os.path.join(DATA_DIR, "cartridges_archive.jsonl")
 BACKUP_DIR = os.path.join(DATA_DIR, "backups")
-os.makedirs(BACKUP_DIR, exist_ok=True)
 LOG_FILE = os.path.join(DATA_DIR, "app_log.txt")
 
 # Создаем папку assets/font если её нет
@@ -54,19 +79,18 @@ logging.basicConfig(
 
 
 def backup_files():
+    os.makedirs(BACKUP_DIR, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    for file in [PRINTERS_FILE, CARTRIDGES_FILE, CARTRIDGE_MODELS_FILE, HISTORY_FILE, SETTINGS_FILE]:
+    for file in [PRINTERS_FILE, CARTRIDGES_FILE, CARTRIDGE_MODELS_FILE, HISTORY_FILE, SETTINGS_FILE,
+                 CARTRIDGES_ARCHIVE_FILE]:
         if os.path.exists(file):
             shutil.copy(file, os.path.join(BACKUP_DIR, f"backup_{timestamp}_{os.path.basename(file)}"))
 
 
-backup_files()
-
-
 def load_json(file_path, default):
+    """Содержимое файла данных или default, если файла ещё нет (его создаёт startup())."""
     if not os.path.exists(file_path):
-        save_json(file_path, default)
-        logging.info(f"Создан новый файл: {file_path}")
+        return default
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
@@ -93,100 +117,196 @@ def get_cartridge_models_from_registry_only():
     return sorted(models)
 
 
-def get_warehouse_stock():
-    """Возвращает количество картриджей на складе, только для моделей, которые реально есть на складе"""
-    stock = {}
-    for c in cartridges_data["картриджи"]:
-        if c["статус"] == "на складе":
-            model = c["модель"]
-            stock[model] = stock.get(model, 0) + 1
-    return stock
+def get_warehouse_stock(site=None):
+    """Возвращает количество картриджей на складе (всех площадок или одной), только для моделей, которые там есть"""
+    if site is None:
+        return dict(warehouse_stock)
+    return dict(site_stock.get(site, {}))
+
+
+# === Классификация картриджей ===
+
+COLOR_TYPE = "цветной"
+# Тип картриджа -> шаблоны (регулярные выражения без учёта регистра) для поля "тип" модели и её названия.
+# Переопределяются в settings.json, раздел "классификация_картриджей"; типы проверяются по порядку
+CARTRIDGE_TYPE_RULES_DEFAULT = {
+    COLOR_TYPE: ["cyan", "magenta", "yellow", "color", "цветной"],
+    "чёрно-белый": ["black", "mono", "ч[её]рн"],
+}
+
+_compiled_type_rules = None
+_cartridge_type_cache = {}  # модель -> тип картриджа (None — не определён); сбрасывается по событиям моделей
+
+
+def get_cartridge_type_rules():
+    return settings_data.get("классификация_картриджей") or CARTRIDGE_TYPE_RULES_DEFAULT
+
+
+def set_cartridge_type_rules(rules):
+    """Заменяет правила классификации. Неверное регулярное выражение — ValueError."""
+    for patterns in rules.values():
+        for pattern in patterns:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"неверный шаблон '{pattern}': {e}")
+    settings_data["классификация_картриджей"] = rules
+    invalidate_cartridge_types()
+
+
+def invalidate_cartridge_types(models=None):
+    """Сбрасывает кэш типов для моделей models, а без аргумента — весь кэш вместе со скомпилированными правилами."""
+    global _compiled_type_rules
+    if models is None:
+        _compiled_type_rules = None
+        _cartridge_type_cache.clear()
+        return
+    for model in models:
+        _cartridge_type_cache.pop(model, None)
+
+
+def _type_rules():
+    global _compiled_type_rules
+    if _compiled_type_rules is None:
+        _compiled_type_rules = [(cartridge_type, re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE))
+                                for cartridge_type, patterns in get_cartridge_type_rules().items() if patterns]
+    return _compiled_type_rules
+
+
+def get_cartridge_type(model):
+    """Тип картриджа модели: по полю "тип" из реестра, если оно подходит под правила, иначе по названию."""
+    if model in _cartridge_type_cache:
+        return _cartridge_type_cache[model]
+    declared = next((m.get("тип", "") for m in cartridge_models_data["модели_картриджей"] if m["модель"] == model), "")
+    result = None
+    for text in (declared, model):
+        result = next((t for t, rule in _type_rules() if text and (t == text.lower() or rule.search(text))), None)
+        if result:
+            break
+    _cartridge_type_cache[model] = result
+    return result
 
 
 def is_color_printer(printer):
     """Определяет, является ли принтер цветным"""
-    color_models = ["Cyan", "Magenta", "Yellow", "Color", "Цветной"]
-    for i in range(1, 5):
-        cart_model = printer.get(f"картридж_{i}", "")
-        if any(color_model.lower() in cart_model.lower() for color_model in color_models):
-            return True
-    return False
+    return any(get_cartridge_type(printer.get(f"картридж_{i}") or "") == COLOR_TYPE for i in range(1, 5))
 
 
-def get_critical_level(model):
-    return settings_data["критические_уровни"].get(model, 5)
+# === Площадки ===
 
+ALL_SITES = "Все площадки"
 
-# ✅ ИСПРАВЛЕНА ЭТА ФУНКЦИЯ — теперь отображаются ВСЕ модели из реестра, даже с количеством 0
-def get_stock_with_status():
-    """Возвращает данные о запасах для ВСЕХ моделей из реестра, включая нулевые остатки."""
-    actual_stock = get_warehouse_stock()
-    result = []
-    for model_data in cartridge_models_data["модели_картриджей"]:
-        model = model_data["модель"]
-        qty = actual_stock.get(model, 0)  # 0, если нет на складе
-        crit = get_critical_level(model)
 
-        if qty == 0:
-            status = "Отсутствует"
-            color = "red"
-            priority = 1
-        elif qty < crit:
-            status = "Низкий"
-            color = "orange"
-            priority = 2
-        else:
-            status = "Норма"
-            color = "green"
-            priority = 3
+def get_default_site():
+    return settings_data.get("площадка_по_умолчанию", "Основная")
+
+
+def site_of(record):
+    """Площадка картриджа или принтера; записи без площадки относятся к площадке по умолчанию."""
+    return record.get("площадка") or get_default_site()
+
+
+def get_sites():
+    sites = set(settings_data.get("площадки", []))
+    sites.update(site_stock)
+    sites.add(get_default_site())
+    return sorted(sites)
+
+
+def register_site(site):
+    """Добавляет площадку в список settings.json. Возвращает True, если она новая."""
+    sites = settings_data.setdefault("площадки", [])
+    if not site or site in sites:
+        return False
+    sites.append(site)
+    return True
 
-        result.append({
-            "модель": model,
-            "количество": qty,
-            "критический_уровень": crit,
-            "статус": status,
-            "цвет": color,
-            "приоритет": priority
-        })
 
+def get_critical_level(model, site=None):
+    """Критический уровень модели: свой для площадки, если задан, иначе общий."""
+    if site is not None:
+        level = settings_data.get("критические_уровни_площадок", {}).get(site, {}).get(model)
+        if level is not None:
+            return level
+    return settings_data["критические_уровни"].get(model, 5)
+
+
+# ✅ ИСПРАВЛЕНА ЭТА ФУНКЦИЯ — теперь отображаются ВСЕ модели из реестра, даже с количеством 0
+def get_stock_with_status(site=None):
+    """Возвращает данные о запасах для ВСЕХ моделей из реестра, включая нулевые остатки (site=None — все площадки)."""
+    result = [get_model_stock_status(model_data["модель"], site)
+              for model_data in cartridge_models_data["модели_картриджей"]]
     # Сортируем: сначала отсутствующие и низкие
     result.sort(key=lambda x: x["приоритет"])
     return result
 
 
-def update_stock_display(tree, search_query=""):
+def get_model_stock_status(model, site=None):
+    stock = warehouse_stock if site is None else site_stock.get(site, {})
+    qty = stock.get(model, 0)  # 0, если нет на складе
+    crit = get_critical_level(model, site)
+
+    if qty == 0:
+        status = "Отсутствует"
+        color = "red"
+        priority = 1
+    elif qty < crit:
+        status = "Низкий"
+        color = "orange"
+        priority = 2
+    else:
+        status = "Норма"
+        color = "green"
+        priority = 3
+
+    return {
+        "модель": model,
+        "площадка": site,
+        "количество": qty,
+        "критический_уровень": crit,
+        "статус": status,
+        "цвет": color,
+        "приоритет": priority
+    }
+
+
+def _stock_row(item):
+    return (item["модель"], item["количество"], item["критический_уровень"], item["статус"])
+
+
+def update_stock_display(tree, search_query="", site=None):
     for row in tree.get_children():
         tree.delete(row)
-    stock_data = get_stock_with_status()
+    stock_data = get_stock_with_status(site)
     for item in stock_data:
         if search_query and search_query.lower() not in item["модель"].lower():
             continue
-        tree.insert("", "end", values=(
-            item["модель"],
-            item["количество"],
-            item["критический_уровень"],
-            item["статус"]
-        ), tags=(item["цвет"],))
+        tree.insert("", "end", iid=item["модель"], values=_stock_row(item), tags=(item["цвет"],))
     tree.tag_configure("red", background="#ffcccc")
     tree.tag_configure("orange", background="#ffebcc")
     tree.tag_configure("green", background="#d4edda")
 
 
-def show_critical_alerts():
-    stock_data = get_stock_with_status()
-    alerts = []
-    for item in stock_data:
-        if item["приоритет"] in [1, 2]:  # Отсутствует или низкий уровень
-            alerts.append(f"{item['модель']} (осталось {item['количество']} шт.)")
-    if alerts:
-        msg = "Срочно закажите:\n" + "\n".join(alerts)
-        messagebox.showwarning("Критический уровень запаса!", msg)
-        logging.warning("Показано уведомление: " + "; ".join(alerts))
+def refresh_stock_rows(tree, models, search_query="", site=None):
+    """Обновляет в таблице остатков только строки указанных моделей."""
+    registry = set(get_cartridge_models_from_registry_only())
+    for model in models:
+        visible = model in registry and not (search_query and search_query.lower() not in model.lower())
+        if not visible:
+            if tree.exists(model):
+                tree.delete(model)
+            continue
+        item = get_model_stock_status(model, site)
+        if tree.exists(model):
+            tree.item(model, values=_stock_row(item), tags=(item["цвет"],))
+        else:
+            tree.insert("", 0, iid=model, values=_stock_row(item), tags=(item["цвет"],))
 
 
 def get_printer_cartridge_status(printer):
-    """Возвращает статус по каждому картриджу и общий статус принтера."""
-    stock = get_warehouse_stock()
+    """Возвращает статус по каждому картриджу и общий статус принтера (по запасам его площадки)."""
+    site = site_of(printer)
+    stock = get_warehouse_stock(site)
     cartridges_needed = []
     has_at_least_one_ready = False
     has_zero_stock = False
@@ -196,7 +316,7 @@ def get_printer_cartridge_status(printer):
         if not model:
             continue
         qty = stock.get(model, 0)  # Если модели нет на складе, количество = 0
-        crit = get_critical_level(model)
+        crit = get_critical_level(model, site)
         if qty == 0:
             status = "❌ Отсутствует"
             color = "red"
@@ -233,42 +353,1408 @@ def get_printer_cartridge_status(printer):
     return cartridges_needed, overall, overall_color
 
 
+# === Жизненный цикл картриджей ===
+
+# Допустимые переходы: (из состояния, в состояние) -> поле с датой перехода
+CARTRIDGE_TRANSITIONS = {
+    ("на складе", "в использовании"): "дата_установки",
+    ("на складе", "списан"): "дата_списания",
+    ("в использовании", "пустой"): "дата_снятия",
+    ("пустой", "на заправке"): "дата_отправки_на_заправку",
+    ("пустой", "списан"): "дата_списания",
+    ("на заправке", "на складе"): "дата_возврата",
+    ("на заправке", "списан"): "дата_списания",
+}
+TERMINAL_STATUSES = {"списан"}
+
+# Серийный номер принтера -> картриджи, установленные в нём сейчас
+printer_cartridges_index = {}
+
+
+def get_printer_label(printer):
+    return f"{printer.get('модель', 'Без названия')} ({printer.get('серийный_номер', 'N/A')})"
+
+
+def rebuild_printer_index():
+    """Перестраивает индекс текущих картриджей по принтерам."""
+    printer_cartridges_index.clear()
+    for c in cartridges_data["картриджи"]:
+        if c["статус"] == "в использовании" and c.get("принтер_сн"):
+            printer_cartridges_index.setdefault(c["принтер_сн"], []).append(c)
+
+
+def change_cartridge_state(cartridge, new_status, printer=None):
+    """Переводит картридж в новое состояние. Возвращает снятые при замене картриджи."""
+    old_status = cartridge["статус"]
+    date_field = CARTRIDGE_TRANSITIONS.get((old_status, new_status))
+    if not date_field:
+        raise ValueError(f"Недопустимый переход: '{old_status}' → '{new_status}'")
+    old = dict(cartridge)
+    now = datetime.now().isoformat()
+    replaced = []
+    if old_status == "в использовании":
+        installed = printer_cartridges_index.get(cartridge.get("принтер_сн"), [])
+        if cartridge in installed:
+            installed.remove(cartridge)
+    if new_status == "в использовании":
+        cartridge.pop(RESERVE_FIELD, None)  # резерв снят: картридж выдан
+        if printer:
+            printer_sn = printer.get("серийный_номер", "")
+            # Картридж той же модели в этом принтере считается снятым при замене
+            for previous in list(printer_cartridges_index.get(printer_sn, [])):
+                if previous["модель"] == cartridge["модель"]:
+                    change_cartridge_state(previous, "пустой")
+                    replaced.append(previous)
+            cartridge["принтер"] = get_printer_label(printer)
+            cartridge["принтер_сн"] = printer_sn
+            cartridge["площадка"] = site_of(printer)
+            printer_cartridges_index.setdefault(printer_sn, []).append(cartridge)
+        else:
+            cartridge["принтер"] = "N/A"
+            cartridge["принтер_сн"] = ""
+    elif new_status == "на складе":
+        cartridge["остаточный_ресурс"] = 100
+        cartridge["количество_заправок"] = cartridge.get("количество_заправок", 0) + 1
+        cartridge["принтер"] = ""
+        cartridge["принтер_сн"] = ""
+    cartridge["статус"] = new_status
+    cartridge[date_field] = now
+    bus.emit(events.CARTRIDGE_STATE_CHANGED, cartridge, old, models=[cartridge["модель"]])
+    logging.info(f"Картридж {cartridge['модель']} (SN: {cartridge.get('серийный_номер', 'N/A')}): "
+                 f"{old_status} → {new_status}")
+    return replaced
+
+
+_archived_ids = None  # id картриджей в архиве; читается из файла при первом обращении
+
+
+def archived_cartridge_ids():
+    global _archived_ids
+    if _archived_ids is None:
+        _archived_ids = set()
+        if os.path.exists(CARTRIDGES_ARCHIVE_FILE):
+            with open(CARTRIDGES_ARCHIVE_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        _archived_ids.add(json.loads(line).get("id"))
+    return _archived_ids
+
+
+def archive_cartridges(cartridges):
+    """Дописывает записи в архив списанных; записи, чей id уже есть в архиве, пропускаются."""
+    ids = archived_cartridge_ids()
+    new = [c for c in cartridges if c.get("id") not in ids]
+    if not new:
+        return
+    with open(CARTRIDGES_ARCHIVE_FILE, 'a', encoding='utf-8') as f:
+        for c in new:
+            f.write(json.dumps(c, ensure_ascii=False) + "\n")
+    ids.update(c.get("id") for c in new)
+
+
+def unarchive_cartridges(cartridge_ids):
+    """Убирает из архива записи с указанными id — при отмене списания картридж возвращается в рабочий набор."""
+    ids = archived_cartridge_ids()
+    cartridge_ids = set(cartridge_ids) & ids
+    if not cartridge_ids:
+        return
+    with open(CARTRIDGES_ARCHIVE_FILE, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip() and json.loads(line).get("id") not in cartridge_ids]
+    with open(CARTRIDGES_ARCHIVE_FILE, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    ids -= cartridge_ids
+
+
+def offload_terminal_cartridges():
+    """Переносит списанные картриджи из рабочего набора в архив (cartridges_archive.jsonl)."""
+    terminal = [c for c in cartridges_data["картриджи"] if c["статус"] in TERMINAL_STATUSES]
+    if not terminal:
+        return 0
+    archive_cartridges(terminal)
+    remove_cartridges(terminal)
+    save_json(CARTRIDGES_FILE, cartridges_data)
+    logging.info(f"Перенесено в архив картриджей: {len(terminal)}")
+    return len(terminal)
+
+
+# === Глобальный поиск ===
+
+# Поля, по которым индексируются записи каждого вида
+SEARCH_FIELDS = {
+    "модель": ("модель", "тип", "описание"),
+    "принтер": ("модель", "серийный_номер", "ip_адрес", "закреплён_за", "площадка", "комментарий"),
+    "картридж": ("модель", "серийный_номер", "статус", "принтер", "площадка", "комментарий"),
+}
+search_index = SearchIndex()
+cartridges_by_serial = {}  # серийный номер -> картридж (без "N/A")
+search_index_ready = False  # индекс строится при первом поиске и дальше обновляется инкрементально
+
+
+def _search_text(kind, record):
+    parts = [str(record.get(field, "")) for field in SEARCH_FIELDS[kind]]
+    if kind == "модель" and isinstance(record.get("принтеры"), list):
+        parts.extend(record["принтеры"])
+    return " ".join(parts)
+
+
+def index_record(kind, record):
+    """Обновляет индексы после добавления или изменения записи."""
+    if kind == "картридж":
+        sn = record.get("серийный_номер")
+        if sn and sn != "N/A":
+            cartridges_by_serial[sn] = record
+    if search_index_ready:
+        search_index.add((kind, record["id"]), _search_text(kind, record), (kind, record))
+
+
+def unindex_record(kind, record):
+    """Убирает запись из индексов перед удалением или изменением ключевых полей."""
+    if kind == "картридж" and cartridges_by_serial.get(record.get("серийный_номер")) is record:
+        del cartridges_by_serial[record["серийный_номер"]]
+    if search_index_ready:
+        search_index.remove((kind, record["id"]))
+
+
+def get_search_index():
+    global search_index_ready
+    if not search_index_ready:
+        search_index.clear()
+        search_index_ready = True
+        for model_data in cartridge_models_data["модели_картриджей"]:
+            index_record("модель", model_data)
+        for p in printers_data["принтеры"]:
+            index_record("принтер", p)
+        for c in cartridges_data["картриджи"]:
+            index_record("картридж", c)
+        search_index.prepare()
+        logging.info(f"Построен поисковый индекс: {len(search_index)} записей")
+    return search_index
+
+
+def global_search(query, limit=20):
+    """Ищет по моделям, принтерам и картриджам с учётом префиксов и опечаток. Возвращает [(вид, запись)]."""
+    return [payload for _, payload in get_search_index().search(query, limit)]
+
+
+# === Изменение данных и события ===
+
+bus = EventBus()
+# Счётчики обновляются по событиям; общий остаток ведётся вместе с остатками площадок
+warehouse_stock = {}  # модель -> количество на складе всех площадок
+site_stock = {}  # площадка -> {модель: количество на складе}
+
+EVENT_KINDS = {}
+for _type in events.CARTRIDGE_EVENTS:
+    EVENT_KINDS[_type] = "картридж"
+for _type in events.MODEL_EVENTS:
+    EVENT_KINDS[_type] = "модель"
+for _type in events.PRINTER_EVENTS:
+    EVENT_KINDS[_type] = "принтер"
+for _type in events.HISTORY_EVENTS:
+    EVENT_KINDS[_type] = "история"
+
+# Хэш-индексы записей по "id". Ведутся прямо в функциях изменения (а не по событиям),
+# чтобы поиск по id работал и внутри bus.batch()
+records_by_id = {"картридж": {}, "модель": {}, "принтер": {}, "история": {}}
+cartridges_by_id = records_by_id["картридж"]
+models_by_id = records_by_id["модель"]
+printers_by_id = records_by_id["принтер"]
+history_by_id = records_by_id["история"]
+
+
+def new_record_id():
+    return uuid.uuid4().hex
+
+
+def _register_id(kind, record):
+    if not record.get("id"):
+        record["id"] = new_record_id()
+    records_by_id[kind][record["id"]] = record
+
+
+def migrate_record_ids():
+    """Присваивает id записям, созданным до появления идентификаторов (и дублям), и заполняет индексы по id.
+    Файлы не записываются: возвращает пути файлов, в которых появились новые id (их сохраняет startup())."""
+    sources = [
+        ("принтер", PRINTERS_FILE, printers_data, [printers_data["принтеры"]]),
+        ("модель", CARTRIDGE_MODELS_FILE, cartridge_models_data, [cartridge_models_data["модели_картриджей"]]),
+        ("картридж", CARTRIDGES_FILE, cartridges_data, [cartridges_data["картриджи"]]),
+        ("история", HISTORY_FILE, history_data, [history_data["записи"], history_data.get("перемещения", [])]),
+    ]
+    changed = []
+    for kind, path, data, sections in sources:
+        index = records_by_id[kind]
+        index.clear()
+        assigned = 0
+        for records in sections:
+            for record in records:
+                if not record.get("id") or record["id"] in index:
+                    record["id"] = new_record_id()
+                    assigned += 1
+                index[record["id"]] = record
+        if assigned:
+            changed.append(path)
+            logging.info(f"Присвоены id ({kind}): {assigned}")
+    return changed
+
+
+def add_cartridge(cartridge):
+    cartridges_data["картриджи"].append(cartridge)
+    _register_id("картридж", cartridge)
+    bus.emit(events.CARTRIDGE_ADDED, cartridge, models=[cartridge["модель"]])
+
+
+def remove_cartridges(to_remove):
+    """Удаляет из рабочего набора указанные записи картриджей (по id)."""
+    removed_ids = {c["id"] for c in to_remove}
+    if not removed_ids:
+        return
+    cartridges_data["картриджи"][:] = [c for c in cartridges_data["картриджи"] if c["id"] not in removed_ids]
+    for cartridge_id in removed_ids:
+        cartridges_by_id.pop(cartridge_id, None)
+    with bus.batch():
+        for c in to_remove:
+            bus.emit(events.CARTRIDGE_REMOVED, c, models=[c["модель"]])
+
+
+def update_cartridge(cartridge, changes):
+    old = dict(cartridge)
+    cartridge.update(changes)
+    bus.emit(events.CARTRIDGE_CHANGED, cartridge, old, models={old["модель"], cartridge["модель"]})
+
+
+def restore_cartridge(cartridge, snapshot):
+    """Возвращает записи картриджа ровно те поля, что были в снимке."""
+    old = dict(cartridge)
+    cartridge.clear()
+    cartridge.update(snapshot)
+    bus.emit(events.CARTRIDGE_CHANGED, cartridge, old, models={old["модель"], cartridge["модель"]})
+
+
+def _replace_fields(record, new_data):
+    """Заменяет содержимое записи на месте (ссылки на запись остаются действительными). Возвращает копию старой."""
+    old = dict(record)
+    new_data = dict(new_data)
+    record.clear()
+    record.update(new_data)
+    return old
+
+
+def save_cartridge_model(model_data):
+    """Добавляет модель или, если модель с таким id уже есть, обновляет её на месте. Возвращает запись реестра."""
+    existing = models_by_id.get(model_data.get("id"))
+    if existing is None:
+        cartridge_models_data["модели_картриджей"].append(model_data)
+        _register_id("модель", model_data)
+        bus.emit(events.MODEL_ADDED, model_data, models=[model_data["модель"]])
+        return model_data
+    old = _replace_fields(existing, model_data)
+    bus.emit(events.MODEL_CHANGED, existing, old, models={old["модель"], existing["модель"]})
+    return existing
+
+
+def delete_cartridge_model(model_id):
+    model_data = models_by_id.pop(model_id)
+    models = cartridge_models_data["модели_картриджей"]
+    models[:] = [m for m in models if m["id"] != model_id]
+    bus.emit(events.MODEL_REMOVED, model_data, models=[model_data["модель"]])
+    return model_data
+
+
+def save_printer_record(printer):
+    """Добавляет принтер или, если принтер с таким id уже есть, обновляет его на месте. Возвращает запись."""
+    existing = printers_by_id.get(printer.get("id"))
+    if existing is None:
+        printers_data["принтеры"].append(printer)
+        _register_id("принтер", printer)
+        bus.emit(events.PRINTER_ADDED, printer)
+        return printer
+    old = _replace_fields(existing, printer)
+    bus.emit(events.PRINTER_CHANGED, existing, old)
+    return existing
+
+
+def delete_printer(printer_id):
+    printer = printers_by_id.pop(printer_id)
+    printers = printers_data["принтеры"]
+    printers[:] = [p for p in printers if p["id"] != printer_id]
+    bus.emit(events.PRINTER_REMOVED, printer)
+    return printer
+
+
+def critical_levels_snapshot():
+    return {
+        "критические_уровни": dict(settings_data["критические_уровни"]),
+        "критические_уровни_площадок": {site: dict(levels) for site, levels in
+                                        settings_data.get("критические_уровни_площадок", {}).items()}
+    }
+
+
+def set_critical_levels(levels, site=None):
+    """Задаёт критические уровни: общие (site=None) или для одной площадки."""
+    old = critical_levels_snapshot()
+    if site is None:
+        target = settings_data["критические_уровни"]
+    else:
+        target = settings_data.setdefault("критические_уровни_площадок", {}).setdefault(site, {})
+    changed = {m for m, v in levels.items() if target.get(m) != v}
+    target.update(levels)
+    if changed:
+        bus.emit(events.SETTINGS_CHANGED, settings_data, old, models=changed)
+
+
+def restore_critical_levels(snapshot):
+    """Возвращает критические уровни к снимку critical_levels_snapshot()."""
+    old = critical_levels_snapshot()
+    changed = set()
+    for before, after in [(old["критические_уровни"], snapshot["критические_уровни"])] + [
+            (old["критические_уровни_площадок"].get(site, {}), snapshot["критические_уровни_площадок"].get(site, {}))
+            for site in set(old["критические_уровни_площадок"]) | set(snapshot["критические_уровни_площадок"])]:
+        changed.update(m for m in set(before) | set(after) if before.get(m) != after.get(m))
+    settings_data["критические_уровни"] = dict(snapshot["критические_уровни"])
+    settings_data["критические_уровни_площадок"] = {site: dict(levels) for site, levels in
+                                                   snapshot["критические_уровни_площадок"].items()}
+    if changed:
+        bus.emit(events.SETTINGS_CHANGED, settings_data, old, models=changed)
+
+
+def history_section(entry):
+    """Раздел history.json, к которому относится запись: установки или перемещения."""
+    return "перемещения" if "откуда" in entry else "записи"
+
+
+def add_history_entry(entry):
+    history_data.setdefault(history_section(entry), []).append(entry)
+    _register_id("история", entry)
+    bus.emit(events.HISTORY_ADDED, entry)
+
+
+def remove_history_entry(entry):
+    history_by_id.pop(entry["id"], None)
+    records = history_data.get(history_section(entry), [])
+    records[:] = [r for r in records if r["id"] != entry["id"]]
+    bus.emit(events.HISTORY_REMOVED, entry)
+
+
+def update_history_entry(entry, changes):
+    old = _replace_fields(entry, {**entry, **changes})
+    bus.emit(events.HISTORY_CHANGED, entry, old)
+
+
+def set_stock_quantity(model, new_qty, site=None):
+    """Доводит количество картриджей модели на складе площадки до new_qty: добавляет записи или удаляет самые новые."""
+    site = site or get_default_site()
+    current_cartridges = [c for c in cartridges_data["картриджи"] if
+                          c["модель"] == model and c["статус"] == "на складе" and site_of(c) == site]
+    current_count = len(current_cartridges)
+    with bus.batch():
+        if new_qty > current_count:
+            to_add = new_qty - current_count
+            for i in range(to_add):
+                add_cartridge({
+                    "модель": model,
+                    "серийный_номер": f"AUTO_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{i}",
+                    "статус": "на складе",
+                    "площадка": site,
+                    "дата_поступления": datetime.now().isoformat(),
+                    "остаточный_ресурс": 100,
+                    "принтер": "",
+                    "комментарий": "Добавлено автоматически"
+                })
+        elif new_qty < current_count:
+            remove_cartridges(current_cartridges[new_qty:])
+
+
+def transfer_cartridges(model, from_site, to_site, qty):
+    """Перемещает qty картриджей модели со склада одной площадки на склад другой. Возвращает перемещённые записи."""
+    if from_site == to_site:
+        raise ValueError("Площадки отправления и назначения совпадают")
+    # Перемещаются только незарезервированные картриджи, в порядке выдачи
+    moved = stock_allocator.allocate(model, from_site, count=max(qty, 0), free_only=True)
+    if qty <= 0 or len(moved) < qty:
+        raise ValueError(f"На площадке '{from_site}' на складе {len(moved)} свободных шт. модели '{model}'")
+    now = datetime.now().isoformat()
+    with bus.batch():
+        for c in moved:
+            update_cartridge(c, {"площадка": to_site, "дата_перемещения": now})
+        add_history_entry({
+            "модель_картриджа": model,
+            "количество": qty,
+            "откуда": from_site,
+            "куда": to_site,
+            "дата": now,
+            "серийные_номера": [c.get("серийный_номер", "N/A") for c in moved]
+        })
+    register_site(to_site)
+    logging.info(f"Перемещение: {model} × {qty}, {from_site} → {to_site}")
+    return moved
+
+
+def get_site_stock_summary(models=None):
+    """Сводка остатков по площадкам из счётчиков: [{"модель", "по_площадкам": {площадка: кол-во}, "всего", "ниже_уровня"}]."""
+    if models is None:
+        models = get_cartridge_models_from_registry_only()
+    sites = get_sites()
+    rows = []
+    for model in models:
+        per_site = {site: site_stock.get(site, {}).get(model, 0) for site in sites}
+        rows.append({
+            "модель": model,
+            "по_площадкам": per_site,
+            "всего": warehouse_stock.get(model, 0),
+            "ниже_уровня": [site for site, qty in per_site.items() if qty < get_critical_level(model, site)]
+        })
+    return rows
+
+
+def changed_models(changes):
+    models = set()
+    for e in changes:
+        models.update(e.models)
+    return models
+
+
+def changed_stock_keys(changes):
+    """Пары (площадка, модель), остатки которых могли измениться. Для событий без площадки — все площадки."""
+    keys = set()
+    for e in changes:
+        if e.type in events.CARTRIDGE_EVENTS:
+            for record in (e.record, e.old):
+                if record is not None:
+                    keys.add((site_of(record), record["модель"]))
+        else:
+            keys.update((site, model) for site in get_sites() for model in e.models)
+    return keys
+
+
+def rebuild_warehouse_stock():
+    warehouse_stock.clear()
+    site_stock.clear()
+    for c in cartridges_data["картриджи"]:
+        if c["статус"] == "на складе":
+            _count_stock(site_of(c), c["модель"], +1)
+
+
+def _add_count(counter, model, delta):
+    qty = counter.get(model, 0) + delta
+    if qty > 0:
+        counter[model] = qty
+    else:
+        counter.pop(model, None)
+
+
+def _count_stock(site, model, delta):
+    _add_count(warehouse_stock, model, delta)
+    counter = site_stock.setdefault(site, {})
+    _add_count(counter, model, delta)
+    if not counter:
+        del site_stock[site]
+
+
+def stock_deltas(changes):
+    """Изменения остатков по событиям картриджей: {(площадка, модель): дельта}."""
+    deltas = {}
+    # В пакете запись могла измениться уже после события (отмена: добавление, затем возврат полей),
+    # поэтому состояние после события — это «было» следующего события той же записи
+    after = {}
+    states = []
+    for e in reversed(changes):
+        states.append(after.get(e.record["id"], e.record))
+        if e.old is not None:
+            after[e.record["id"]] = e.old
+    for e, state in zip(changes, reversed(states)):
+        if e.type != events.CARTRIDGE_ADDED:
+            before = e.old if e.type != events.CARTRIDGE_REMOVED else e.record
+            if before["статус"] == "на складе":
+                key = (site_of(before), before["модель"])
+                deltas[key] = deltas.get(key, 0) - 1
+        if e.type != events.CARTRIDGE_REMOVED and state["статус"] == "на складе":
+            key = (site_of(state), state["модель"])
+            deltas[key] = deltas.get(key, 0) + 1
+    return deltas
+
+
+def _update_warehouse_stock(changes):
+    for (site, model), delta in stock_deltas(changes).items():
+        if delta:
+            _count_stock(site, model, delta)
+
+
+def _update_indexes(changes):
+    for e in changes:
+        kind = EVENT_KINDS[e.type]
+        if e.old is not None:
+            if kind == "картридж":
+                old_sn = e.old.get("серийный_номер")
+                if old_sn != e.record.get("серийный_номер") and cartridges_by_serial.get(old_sn) is e.record:
+                    del cartridges_by_serial[old_sn]
+            else:
+                unindex_record(kind, e.old)
+        if e.type in (events.CARTRIDGE_REMOVED, events.MODEL_REMOVED, events.PRINTER_REMOVED):
+            unindex_record(kind, e.record)
+        else:
+            index_record(kind, e.record)
+
+
+bus.subscribe(_update_warehouse_stock, *events.CARTRIDGE_EVENTS)
+bus.subscribe(lambda changes: invalidate_cartridge_types(changed_models(changes)), *events.MODEL_EVENTS)
+bus.subscribe(_update_indexes, *events.CARTRIDGE_EVENTS, *events.MODEL_EVENTS, *events.PRINTER_EVENTS)
+
+
+def find_cartridge_by_serial(sn):
+    cartridge = cartridges_by_serial.get(sn)
+    if cartridge is not None and cartridge.get("серийный_номер") == sn:
+        return cartridge
+    return None
+
+
+def check_printer_slots(printer, model):
+    """Проверяет, что модель указана в слотах принтера (если слоты заполнены). Иначе — ValueError."""
+    slots = [printer.get(f"картридж_{i}") for i in range(1, 5) if printer.get(f"картридж_{i}")]
+    if slots and model not in slots:
+        raise ValueError(f"модель {model} не подходит к принтеру {get_printer_label(printer)} "
+                         f"(слоты: {', '.join(slots)})")
+
+
+def record_installation(cartridge, printer=None):
+    """Переводит картридж со склада в принтер и добавляет запись в историю (без сохранения файлов)."""
+    if printer:
+        check_printer_slots(printer, cartridge["модель"])
+    replaced = change_cartridge_state(cartridge, "в использовании", printer)
+    add_history_entry({
+        "модель_картриджа": cartridge["модель"],
+        "серийный_номер": cartridge.get("серийный_номер", "N/A"),
+        "принтер": cartridge["принтер"],
+        "площадка": site_of(cartridge),
+        "дата_установки": cartridge["дата_установки"],
+        "остаток_при_установке": cartridge.get("остаточный_ресурс", 100)
+    })
+    logging.info(f"Установлен картридж: {cartridge['модель']}, SN: {cartridge.get('серийный_номер', 'N/A')}, "
+                 f"принтер: {cartridge['принтер']}")
+    if replaced:
+        logging.info(f"Снято при замене: {', '.join(c.get('серийный_номер', 'N/A') for c in replaced)}")
+    return replaced
+
+
+# Выдача со склада: очереди по моделям в порядке политики из settings.json ("распределение")
+stock_allocator = StockAllocator(site_of, settings_data.get("распределение", {}).get("политика"))
+bus.subscribe(stock_allocator.update, *events.CARTRIDGE_EVENTS)
+
+
+def set_allocation_policy(policy):
+    settings_data.setdefault("распределение", {})["политика"] = policy
+    stock_allocator.rebuild(cartridges_data["картриджи"], policy)
+
+
+def set_reservation(model, site, printer, qty):
+    """Доводит число картриджей модели на складе площадки, закреплённых за принтером, до qty:
+    закрепляет свободные или снимает резерв с лишних (последних в порядке выдачи)."""
+    printer_sn = printer.get("серийный_номер", "")
+    if printer_sn in integrity.NO_SERIAL:
+        # Резерв держится по серийному номеру: без него резервом стал бы свободный остаток или общий "N/A"
+        raise ValueError(f"У принтера {get_printer_label(printer)} нет серийного номера — резерв невозможен")
+    reserved = stock_allocator.allocate(model, site, printer_sn, count=len(cartridges_data["картриджи"]),
+                                        reserved_only=True)
+    if qty > len(reserved):
+        check_printer_slots(printer, model)
+        chosen = stock_allocator.allocate(model, site, count=qty - len(reserved), free_only=True)
+        if len(chosen) < qty - len(reserved):
+            raise ValueError(f"На площадке '{site}' свободно {len(chosen)} шт. модели '{model}', "
+                             f"в резерве у принтера {len(reserved)}")
+        changes = {RESERVE_FIELD: printer_sn}
+    else:
+        chosen = reserved[qty:]
+        changes = {RESERVE_FIELD: ""}
+    with bus.batch():
+        for c in chosen:
+            update_cartridge(c, changes)
+
+
+def release_reservations(printer_sn):
+    """Снимает резерв с картриджей, закреплённых за printer_sn, если такого принтера больше нет
+    (удалён или сменил серийный номер). Возвращает число освобождённых картриджей."""
+    if printer_sn in integrity.NO_SERIAL or any(p.get("серийный_номер") == printer_sn
+                                                 for p in printers_data["принтеры"]):
+        return 0
+    reserved = [c for c in cartridges_data["картриджи"] if c.get(RESERVE_FIELD) == printer_sn]
+    with bus.batch():
+        for c in reserved:
+            update_cartridge(c, {RESERVE_FIELD: ""})
+    if reserved:
+        logging.info(f"Снят резерв принтера {printer_sn}: {len(reserved)} шт.")
+    return len(reserved)
+
+
+files_with_new_ids = migrate_record_ids()
+rebuild_warehouse_stock()
+stock_allocator.rebuild(cartridges_data["картриджи"])
+for _cartridge in cartridges_data["картриджи"]:
+    index_record("картридж", _cartridge)
+rebuild_printer_index()
+
+
+# === Журнал операций, отмена и повтор ===
+
+OPLOG_FILE = os.path.join(DATA_DIR, "oplog.jsonl")
+UNDO_DEPTH = 100
+OPLOG_VIEW_LIMIT = 5000  # строк журнала в окне за одну выборку
+
+operation_log = OperationLog(OPLOG_FILE)
+# Шаги отмены: {"операция": описание, "события": [(событие, снимок записи после изменения)]}
+undo_stack = []
+redo_stack = []
+_current_operation = None
+_replaying = False  # применяется шаг отмены/повтора — в стеки его не кладём
+
+EVENT_FILES = (
+    (events.CARTRIDGE_EVENTS, CARTRIDGES_FILE, cartridges_data),
+    (events.MODEL_EVENTS, CARTRIDGE_MODELS_FILE, cartridge_models_data),
+    (events.PRINTER_EVENTS, PRINTERS_FILE, printers_data),
+    ((events.SETTINGS_CHANGED,), SETTINGS_FILE, settings_data),
+    (events.HISTORY_EVENTS, HISTORY_FILE, history_data),
+)
+
+
+def get_current_user():
+    return settings_data.get("пользователь") or getpass.getuser()
+
+
+@contextmanager
+def operation(description):
+    """Объединяет изменения внутри блока в одну операцию журнала и один шаг отмены."""
+    global _current_operation
+    outer = _current_operation is None
+    if outer:
+        _current_operation = description
+    try:
+        with bus.batch():
+            yield
+    finally:
+        if outer:
+            _current_operation = None
+
+
+def _snapshot(event):
+    if event.type == events.SETTINGS_CHANGED:
+        return critical_levels_snapshot()
+    return dict(event.record)
+
+
+def _compact_change(event, after):
+    """Изменение для журнала: для добавления и удаления — запись целиком, для правки — только отличающиеся поля."""
+    record = event.record
+    item = {"событие": event.type, "id": record.get("id")}
+    if event.old is None:
+        item["запись"] = after
+    else:
+        fields = [f for f in set(event.old) | set(after) if event.old.get(f) != after.get(f)]
+        item["было"] = {f: event.old.get(f) for f in fields}
+        item["стало"] = {f: after.get(f) for f in fields}
+    return item
+
+
+def _record_operation(changes):
+    description = _current_operation or ", ".join(sorted({e.type for e in changes}))
+    steps = [(e, _snapshot(e)) for e in changes]
+    operation_log.append(get_current_user(), description, [_compact_change(e, after) for e, after in steps])
+    if _replaying:
+        return
+    undo_stack.append({"операция": description, "события": steps})
+    del undo_stack[:-UNDO_DEPTH]
+    redo_stack.clear()
+
+
+def _insert_record(event):
+    if event.type in events.CARTRIDGE_EVENTS:
+        add_cartridge(event.record)
+    elif event.type in events.MODEL_EVENTS:
+        save_cartridge_model(event.record)
+    elif event.type in events.PRINTER_EVENTS:
+        save_printer_record(event.record)
+    else:
+        add_history_entry(event.record)
+
+
+def _delete_record(event):
+    if event.type in events.CARTRIDGE_EVENTS:
+        remove_cartridges([event.record])
+    elif event.type in events.MODEL_EVENTS:
+        delete_cartridge_model(event.record["id"])
+    elif event.type in events.PRINTER_EVENTS:
+        delete_printer(event.record["id"])
+    else:
+        remove_history_entry(event.record)
+
+
+def _apply_step(event, after, inverse):
+    """Повторяет изменение (inverse=False) или откатывает его (inverse=True)."""
+    if event.type in (events.CARTRIDGE_ADDED, events.MODEL_ADDED, events.PRINTER_ADDED, events.HISTORY_ADDED,
+                      events.CARTRIDGE_REMOVED, events.MODEL_REMOVED, events.PRINTER_REMOVED,
+                      events.HISTORY_REMOVED):
+        added = event.type in (events.CARTRIDGE_ADDED, events.MODEL_ADDED, events.PRINTER_ADDED,
+                               events.HISTORY_ADDED)
+        if added != inverse:
+            _insert_record(event)
+        else:
+            _delete_record(event)
+    elif event.type == events.SETTINGS_CHANGED:
+        restore_critical_levels(event.old if inverse else after)
+    elif event.type == events.MODEL_CHANGED:
+        save_cartridge_model(event.old if inverse else after)
+    elif event.type == events.PRINTER_CHANGED:
+        save_printer_record(event.old if inverse else after)
+    elif event.type == events.HISTORY_CHANGED:
+        update_history_entry(event.record, event.old if inverse else after)
+    else:
+        restore_cartridge(event.record, event.old if inverse else after)
+
+
+def _replay(step, inverse):
+    global _replaying
+    _replaying = True
+    try:
+        with operation(f"{'Отмена' if inverse else 'Повтор'}: {step['операция']}"):
+            for event, after in (reversed(step["события"]) if inverse else step["события"]):
+                _apply_step(event, after, inverse)
+    finally:
+        _replaying = False
+    # Перенос в архив — часть операции: отмена возвращает списанные картриджи из архива, повтор — снова в архив
+    archived = [after for event, after in step["события"]
+                if event.type == events.CARTRIDGE_REMOVED and after["статус"] in TERMINAL_STATUSES]
+    if archived and inverse:
+        unarchive_cartridges(c["id"] for c in archived)
+    elif archived:
+        archive_cartridges(archived)
+    rebuild_printer_index()
+    types = {event.type for event, _ in step["события"]}
+    for event_types, path, data in EVENT_FILES:
+        if types & set(event_types):
+            save_json(path, data)
+
+
+def undo_last():
+    """Отменяет последнюю операцию. Возвращает её описание или None, если отменять нечего."""
+    if not undo_stack:
+        return None
+    step = undo_stack.pop()
+    _replay(step, inverse=True)
+    redo_stack.append(step)
+    logging.info(f"Отменено: {step['операция']}")
+    return step["операция"]
+
+
+def redo_last():
+    """Повторяет последнюю отменённую операцию. Возвращает её описание или None."""
+    if not redo_stack:
+        return None
+    step = redo_stack.pop()
+    _replay(step, inverse=False)
+    undo_stack.append(step)
+    logging.info(f"Повторено: {step['операция']}")
+    return step["операция"]
+
+
+bus.subscribe(_record_operation)
+
+
+# === Остатки на дату ===
+
+# Снимок остатков делается после стольких изменений (это же — предел проигрывания при запросе) или раз в сутки
+STOCK_SNAPSHOT_EVERY = 500
+STOCK_SNAPSHOT_MAX_AGE = 24 * 3600
+
+stock_history = StockHistory(DATA_DIR, STOCK_SNAPSHOT_EVERY, STOCK_SNAPSHOT_MAX_AGE)
+bus.subscribe(lambda changes: stock_history.record(stock_deltas(changes), site_stock), *events.CARTRIDGE_EVENTS)
+
+
+# === Столбцовое хранилище истории установок ===
+
+# Копия раздела "записи" history.json в столбцах, отображаемых в память (см. history_store):
+# расход по неделям и подсчёты за период считаются без разбора дат каждой записи.
+# Новые установки дописываются по событиям; удаление и правка записей помечают хранилище
+# для пересборки, которая выполняется при следующем запросе.
+history_columns = HistoryColumns(DATA_DIR)
+history_columns_stale = not history_columns.matches(history_data["записи"], get_default_site())
+
+
+def get_history_columns():
+    """Открытое хранилище, соответствующее history_data (при необходимости пересобирается)."""
+    global history_columns_stale
+    if not history_columns_stale and history_columns.open() and \
+            history_columns.meta["площадка_по_умолчанию"] == get_default_site():
+        return history_columns
+    start = time.perf_counter()
+    history_columns.build(history_data["записи"], get_default_site())
+    history_columns_stale = False
+    logging.info(f"Столбцы истории пересобраны: {len(history_data['записи'])} записей "
+                 f"за {time.perf_counter() - start:.2f} с")
+    history_columns.open()
+    return history_columns
+
+
+def _update_history_columns(changes):
+    global history_columns_stale
+    if history_columns_stale:
+        return
+    added = []
+    for e in changes:
+        if history_section(e.record) != "записи":
+            continue
+        if e.type != events.HISTORY_ADDED:
+            history_columns_stale = True
+            return
+        added.append(e.record)
+    if added and not history_columns.append(added):
+        history_columns_stale = True
+
+
+bus.subscribe(_update_history_columns, *events.HISTORY_EVENTS)
+
+
+def get_reorder_plan(budget=None, site=None):
+    """План закупки по всем моделям реестра (site=None — по всем площадкам), см. reorder.plan_orders."""
+    pipeline = {}
+    for c in cartridges_data["картриджи"]:
+        if c["статус"] == "на заправке" and (site is None or site_of(c) == site):
+            pipeline[c["модель"]] = pipeline.get(c["модель"], 0) + 1
+    models = cartridge_models_data["модели_картриджей"]
+    critical = {m["модель"]: get_critical_level(m["модель"], site) for m in models}
+    settings = settings_data.get("закупка")
+    days = {**REORDER_DEFAULTS, **(settings or {})}["период_анализа_дней"]
+    now = datetime.now()
+    consumption = get_history_columns().weekly_counts([m["модель"] for m in models], now - timedelta(days=days),
+                                                      now, max(1, -(-days // 7)), site)
+    return plan_orders(models, get_warehouse_stock(site), pipeline, None, critical, settings, budget, now,
+                       consumption)
+
+
+# === Проверка целостности данных ===
+
+# "исправлять_при_запуске" в разделе "целостность" settings.json включает автоисправление при запуске
+INTEGRITY_DEFAULTS = {"исправлять_при_запуске": False}
+INTEGRITY_VIEW_LIMIT = 5000  # строк в окне проверки
+
+
+def check_data_integrity():
+    """Проверяет все данные (см. integrity.check) и пишет сводку в лог. Возвращает список проблем."""
+    start = time.perf_counter()
+    issues = integrity.check(printers_data["принтеры"], cartridges_data["картриджи"],
+                             cartridge_models_data["модели_картриджей"],
+                             history_data["записи"] + history_data.get("перемещения", []),
+                             integrity.load_archive_serials(CARTRIDGES_ARCHIVE_FILE))
+    for code, (total, fixable) in integrity.summarize(issues).items():
+        logging.warning(f"Целостность: {integrity.CHECKS[code]} — {total} (исправимо: {fixable})")
+    logging.info(f"Проверка целостности: проблем {len(issues)}, {(time.perf_counter() - start) * 1000:.0f} мс")
+    return issues
+
+
+def repair_data_integrity(issues):
+    """Исправляет всё, что исправляется автоматически, одним пакетом через обычные функции изменения,
+    так что исправление попадает в журнал и отменяется целиком. Возвращает число затронутых записей."""
+    missing_models, changes = integrity.plan_repairs(issues)
+    if not missing_models and not changes:
+        return 0
+    now = datetime.now().isoformat()
+    with operation("Исправление данных"):
+        for model in missing_models:
+            used_in = sorted({p.get("модель", "") for p in printers_data["принтеры"]
+                              if model in (p.get(f"картридж_{i}") for i in range(1, 5))})
+            save_cartridge_model({"модель": model, "принтеры": used_in, "описание": "Добавлена проверкой данных",
+                                  "тип": "", "дата_добавления": now})
+        for kind, record, fields in changes:
+            if kind == "картридж":
+                update_cartridge(record, fields)
+            elif kind == "принтер":
+                save_printer_record({**record, **fields})
+            elif kind == "модель":
+                save_cartridge_model({**record, **fields})
+            else:
+                update_history_entry(record, fields)
+    kinds = {kind for kind, _, _ in changes} | ({"модель"} if missing_models else set())
+    for event_types, path, data in EVENT_FILES:
+        if kinds & {EVENT_KINDS.get(t) for t in event_types}:
+            save_json(path, data)
+    logging.info(f"Исправлено при проверке целостности: моделей добавлено {len(missing_models)}, "
+                 f"записей изменено {len(changes)}")
+    return len(missing_models) + len(changes)
+
+
+integrity_issues = check_data_integrity()
+
+
+# === Запуск программы ===
+
+def startup():
+    """Изменения папки данных при запуске программы. Импорт main (команды reorder, reports, integrity
+    и тесты) данные только читает, а это делает одна программа — после резервной копии."""
+    global integrity_issues
+    backup_files()
+    for _, path, data in EVENT_FILES:
+        if not os.path.exists(path) or path in files_with_new_ids:
+            save_json(path, data)
+    files_with_new_ids.clear()
+    # Перенос списанных в архив при запуске — не действие пользователя: в журнал и стек отмены не попадает
+    bus.unsubscribe(_record_operation)
+    try:
+        offload_terminal_cartridges()
+    finally:
+        bus.subscribe(_record_operation)
+    stock_history.ensure_snapshot(site_stock)
+    if integrity_issues and {**INTEGRITY_DEFAULTS, **settings_data.get("целостность", {})}["исправлять_при_запуске"]:
+        repair_data_integrity(integrity_issues)
+        integrity_issues = check_data_integrity()
+
+
+# Режим сканера: установки копятся в очереди и записываются пакетом
+SCAN_BATCH_SIZE = 25
+SCAN_COMMIT_DELAY_MS = 3000
+
+
+# === Уведомления о запасах ===
+
+ALERTS_HISTORY_FILE = os.path.join(DATA_DIR, "alerts_history.jsonl")
+ALERTS_LOG_FILE = os.path.join(DATA_DIR, "alerts.log")
+ALERT_CHECK_INTERVAL_MS = 2000
+ALERT_FULL_CHECK_TICKS = 1800  # полная перепроверка всех моделей примерно раз в час
+ALERT_PANEL_SIZE = 50
+
+
+def stock_alert_key(site, model):
+    return f"{model} @ {site}"
+
+
+def stock_alert_keys(keys=None):
+    """Ключи уведомлений для пар (площадка, модель); без аргумента — все модели реестра на всех площадках."""
+    if keys is None:
+        keys = [(site, model) for site in get_sites() for model in get_cartridge_models_from_registry_only()]
+    return {stock_alert_key(site, model) for site, model in keys}
+
+
+def evaluate_stock_alert(key):
+    """Уведомление по паре модель/площадка для AlertEngine или None, если запас в норме."""
+    model, _, site = key.rpartition(" @ ")
+    if not any(m["модель"] == model for m in cartridge_models_data["модели_картриджей"]):
+        return None
+    item = get_model_stock_status(model, site)
+    if item["приоритет"] == 1:
+        return {"уровень": "критично", "сообщение": f"{model} ({site}): нет на складе, срочно закажите"}
+    if item["приоритет"] == 2:
+        return {"уровень": "внимание",
+                "сообщение": f"{model} ({site}): осталось {item['количество']} шт. "
+                             f"(крит. уровень {item['критический_уровень']})"}
+    return None
+
+
+def build_alert_sinks():
+    """Каналы доставки из settings.json, раздел "уведомления": {"email": {...}, "webhook": "http://..."}."""
+    cfg = settings_data.get("уведомления", {})
+    sinks = [LogFileSink(ALERTS_LOG_FILE)]
+    email = cfg.get("email")
+    if email and email.get("кому"):
+        sinks.append(EmailSink(email["кому"], email.get("от", "signatum@localhost"),
+                               email.get("сервер", "localhost"), email.get("порт", 1025)))
+    if cfg.get("webhook"):
+        sinks.append(WebhookSink(cfg["webhook"]))
+    return sinks
+
+
+alert_engine = AlertEngine(
+    evaluate_stock_alert,
+    ALERTS_HISTORY_FILE,
+    build_alert_sinks(),
+    repeat_after=settings_data.get("уведомления", {}).get("повтор_минут", 60) * 60
+)
+bus.subscribe(lambda changes: alert_engine.mark_dirty(stock_alert_keys(changed_stock_keys(changes))),
+              *events.CARTRIDGE_EVENTS, *events.MODEL_EVENTS, events.SETTINGS_CHANGED)
+
+
+# === Опрос принтеров по SNMP ===
+
+# Настройки опроса можно переопределить в settings.json, раздел "snmp"
+SNMP_DEFAULTS = {"community": "public", "таймаут": 2.0, "повторы": 1, "параллельно": 32, "кэш_секунд": 300}
+# Порог остатка тонера (%), ниже которого принтер помечается как требующий замены
+SNMP_LOW_PERCENT = 10
+
+_snmp_settings = {**SNMP_DEFAULTS, **settings_data.get("snmp", {})}
+supply_poller = SupplyPoller(
+    community=_snmp_settings["community"],
+    timeout=_snmp_settings["таймаут"],
+    retries=_snmp_settings["повторы"],
+    concurrency=_snmp_settings["параллельно"],
+    cache_ttl=_snmp_settings["кэш_секунд"]
+)
+
+
+def get_printer_supply_summary(printer):
+    """Текст для отчёта по последнему SNMP-опросу и признак скорой замены."""
+    address = printer.get("ip_адрес", "").strip()
+    if not address:
+        return "—", False
+    result = supply_poller.cached(address)
+    if result is None:
+        return "не опрошен", False
+    if "ошибка" in result:
+        return "нет ответа", False
+    percent, days_left = supply_poller.summary(address)
+    if percent is None:
+        return "неизвестно", False
+    text = f"{percent}%"
+    if days_left is not None:
+        text += f" (≈{days_left:.0f} дн.)"
+    return text, percent <= SNMP_LOW_PERCENT or (days_left is not None and days_left <= 7)
+
+
+def printer_status_row(p):
+    """Строка отчёта "Статус принтеров" и цвет общего статуса."""
+    model = p.get("модель", "Без названия")
+    is_color = is_color_printer(p)
+    printer_type = "Цветной" if is_color else "Черно-белый"
+    cartridges_needed, overall, overall_color = get_printer_cartridge_status(p)
+    cart_statuses = ["—"] * 4
+    for i, cart in enumerate(cartridges_needed[:4]):
+        cart_statuses[i] = cart["статус"]
+    supply_text, replace_soon = get_printer_supply_summary(p)
+    if replace_soon and overall_color == "green":
+        overall, overall_color = "⚠️ Скоро замена", "orange"
+    return (model, site_of(p), printer_type, cart_statuses[0], cart_statuses[1], cart_statuses[2], cart_statuses[3],
+            overall, supply_text), overall_color
+
+
+# === Пакетные отчёты ===
+
+def build_report_snapshot(budget=None):
+    """Готовые строки отчётов по каждой площадке и по всем сразу для reports.run_batch (только простые типы)."""
+    sites = {}
+    for site in [None] + get_sites():
+        printers = [p for p in printers_data["принтеры"] if site is None or site_of(p) == site]
+        sites[site or ALL_SITES] = {
+            "остатки": [_stock_row(item) for item in get_stock_with_status(site)],
+            "принтеры": [printer_status_row(p)[0] for p in printers],
+            "закупка": get_reorder_plan(budget, site)
+        }
+    return {"создан": datetime.now().isoformat(timespec="seconds"), "площадки": sites}
+
+
+# === Импорт и экспорт Excel ===
+
+# Столбцы листов книги: (заголовок, поле записи). Те же заголовки ищутся при импорте
+PRINTER_COLUMNS = (("Модель", "модель"), ("Серийный номер", "серийный_номер"), ("IP-адрес", "ip_адрес"),
+                   ("Площадка", "площадка"), ("Закреплён за", "закреплён_за"), ("Картридж 1", "картридж_1"),
+                   ("Картридж 2", "картридж_2"), ("Картридж 3", "картридж_3"), ("Картридж 4", "картридж_4"),
+                   ("Комментарий", "комментарий"))
+MODEL_COLUMNS = (("Модель", "модель"), ("Тип", "тип"), ("Описание", "описание"), ("Принтеры", "принтеры"),
+                 ("Поставщик", "поставщик"), ("Цена", "цена"), ("Срок поставки, дн.", "срок_поставки_дней"),
+                 ("Кратность", "кратность"))
+HISTORY_COLUMNS = (("Модель", "модель_картриджа"), ("Серийный номер", "серийный_номер"), ("Принтер", "принтер"),
+                   ("Площадка", "площадка"), ("Дата установки", "дата_установки"),
+                   ("Остаток при установке", "остаток_при_установке"))
+STATUS_HEADER = ("Модель", "Площадка", "Тип", "Картридж 1", "Картридж 2", "Картридж 3", "Картридж 4", "Статус",
+                 "Тонер")
+IMPORT_ERRORS_SHOWN = 30
+
+
+def export_workbook(path, site=None):
+    """Книга Excel: остатки (площадки site или все), статус принтеров, принтеры, модели и история установок."""
+    def fields(records, columns):
+        for record in records:
+            yield [", ".join(value) if isinstance(value, list) else value
+                   for value in (record.get(field) for _, field in columns)]
+
+    with XlsxWriter(path) as book:
+        book.write_sheet("Остатки", ("Модель", "Остаток", "Критический уровень", "Статус"),
+                         ([item["модель"], item["количество"], item["критический_уровень"], item["статус"]]
+                          for item in get_stock_with_status(site)))
+        book.write_sheet("Статус принтеров", STATUS_HEADER,
+                         (printer_status_row(p)[0] for p in printers_data["принтеры"]))
+        book.write_sheet("Принтеры", [title for title, _ in PRINTER_COLUMNS],
+                         fields(printers_data["принтеры"], PRINTER_COLUMNS))
+        book.write_sheet("Модели", [title for title, _ in MODEL_COLUMNS],
+                         fields(cartridge_models_data["модели_картриджей"], MODEL_COLUMNS))
+        book.write_sheet("История", [title for title, _ in HISTORY_COLUMNS],
+                         fields(history_data["записи"], HISTORY_COLUMNS))
+
+
+def _read_import_sheet(path, sheet, columns, validate):
+    """Читает лист построчно и проверяет каждую строку. Возвращает ([(номер строки, поля)], [ошибки])."""
+    rows = iter_rows(path, sheet)
+    header = [str(v).strip() if v is not None else "" for v in next(rows, [])]
+    positions = {field: header.index(title) for title, field in columns if title in header}
+    if "модель" not in positions:
+        return [], [f"{sheet}: нет столбца «Модель»"]
+    records, errors = [], []
+    for number in itertools.count(2):
+        try:
+            row = next(rows, None)
+        except ValueError as e:  # ячейка, которую нельзя прочитать; дальше лист не разбирается
+            errors.append(f"{sheet}, строка {number}: {e}")
+            break
+        if row is None:
+            break
+        values = {field: row[i] if i < len(row) else None for field, i in positions.items()}
+        if all(v in (None, "") for v in values.values()):
+            continue
+        values = {field: "" if v is None else v for field, v in values.items()}
+        try:
+            records.append((number, validate(values)))
+        except ValueError as e:
+            errors.append(f"{sheet}, строка {number}: {e}")
+    return records, errors
+
+
+def _import_text(value):
+    # Числа из Excel приходят как int/float: серийный номер 12345 не должен стать "12345.0"
+    return str(value).strip()
+
+
+def _validate_model_row(values):
+    model = {field: _import_text(value) for field, value in values.items()}
+    if not model["модель"]:
+        raise ValueError("не указана модель")
+    for field, convert in (("цена", float), ("срок_поставки_дней", int), ("кратность", int)):
+        if field not in model:
+            continue
+        text = model[field].replace(",", ".")
+        try:
+            model[field] = convert(float(text)) if text else None
+        except ValueError:
+            raise ValueError(f"«{text}» в поле {field} — не число")
+        if model[field] is not None and model[field] < 0:
+            raise ValueError(f"{field} не может быть отрицательным")
+    if "принтеры" in model:
+        model["принтеры"] = [p.strip() for p in model["принтеры"].split(",") if p.strip()]
+    return model
+
+
+def _validate_printer_row(values):
+    printer = {field: _import_text(value) for field, value in values.items()}
+    if not printer["модель"] or not printer.get("серийный_номер"):
+        raise ValueError("модель и серийный номер обязательны")
+    return printer
+
+
+def import_workbook(path):
+    """Импортирует листы «Модели» и «Принтеры» (какие есть в книге). Модели сопоставляются по названию,
+    принтеры — по серийному номеру: найденные обновляются, остальные добавляются.
+
+    Сначала проверяются все строки обоих листов; если есть хоть одна ошибка, ничего не меняется.
+    Возвращает {"добавлено", "обновлено", "ошибки"}.
+    """
+    sheets = sheet_names(path)
+    if "Модели" not in sheets and "Принтеры" not in sheets:
+        return {"добавлено": 0, "обновлено": 0, "ошибки": ["В книге нет листов «Модели» и «Принтеры»"]}
+    models, printers, errors = [], [], []
+    if "Модели" in sheets:
+        models, errors = _read_import_sheet(path, "Модели", MODEL_COLUMNS, _validate_model_row)
+    if "Принтеры" in sheets:
+        printers, printer_errors = _read_import_sheet(path, "Принтеры", PRINTER_COLUMNS, _validate_printer_row)
+        errors += printer_errors
+
+    # Проверки по всему пакету: повторы внутри книги и ссылки на модели
+    known_models = {m["модель"] for m in cartridge_models_data["модели_картриджей"]}
+    seen = {}
+    for number, model in models:
+        key = model["модель"].lower()
+        if key in seen:
+            errors.append(f"Модели, строка {number}: модель «{model['модель']}» уже была в строке {seen[key]}")
+        seen[key] = number
+        known_models.add(model["модель"])
+    seen = {}
+    for number, printer in printers:
+        if printer["серийный_номер"] in seen:
+            errors.append(f"Принтеры, строка {number}: серийный номер {printer['серийный_номер']} "
+                          f"уже был в строке {seen[printer['серийный_номер']]}")
+        seen[printer["серийный_номер"]] = number
+        for i in range(1, 5):
+            model = printer.get(f"картридж_{i}")
+            if model and model not in known_models:
+                errors.append(f"Принтеры, строка {number}: модели картриджа «{model}» нет в реестре")
+    if errors:
+        return {"добавлено": 0, "обновлено": 0, "ошибки": errors}
+
+    added = updated = 0
+    models_by_name = {m["модель"].lower(): m for m in cartridge_models_data["модели_картриджей"]}
+    printers_by_serial = {p.get("серийный_номер"): p for p in printers_data["принтеры"]}
+    now = datetime.now().isoformat()
+    with operation(f"Импорт из Excel: {os.path.basename(path)}"):
+        for _, model in models:
+            existing = models_by_name.get(model["модель"].lower())
+            if existing:
+                save_cartridge_model({**existing, **model})
+                updated += 1
+            else:
+                save_cartridge_model({"id": new_record_id(), "принтеры": [], "описание": "", "тип": "",
+                                      **model, "дата_добавления": now})
+                added += 1
+        for _, printer in printers:
+            existing = printers_by_serial.get(printer["серийный_номер"])
+            printer["площадка"] = printer.get("площадка") or site_of(existing or {})
+            if existing:
+                save_printer_record({**existing, **printer})
+                updated += 1
+            else:
+                save_printer_record({"id": new_record_id(), **printer})
+                added += 1
+        sites_added = [register_site(printer["площадка"]) for _, printer in printers]
+    if models:
+        save_json(CARTRIDGE_MODELS_FILE, cartridge_models_data)
+    if printers:
+        save_json(PRINTERS_FILE, printers_data)
+    if any(sites_added):
+        save_json(SETTINGS_FILE, settings_data)
+    logging.info(f"Импорт из Excel {path}: добавлено {added}, обновлено {updated}")
+    return {"добавлено": added, "обновлено": updated, "ошибки": []}
+
+
+# === Кэш экранов ===
+
+# Переключения экранов дольше этого порога записываются в лог
+VIEW_SWITCH_BUDGET_MS = 100
+
+
+class ViewManager:
+    """Хранит построенные экраны главного окна: экран строится один раз, дальше только скрывается и показывается.
+
+    Пока экран скрыт, относящиеся к нему события изменения данных копятся и передаются
+    его функции обновления при следующем показе.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.views = {}
+        self.current = None
+        self.transient = None
+        self.switch_times = {}  # имя экрана -> длительность последнего переключения, мс
+        bus.subscribe(self._on_changes)
+
+    def register(self, name, builder, refresher=None, event_types=()):
+        self.views[name] = {
+            "builder": builder,
+            "refresher": refresher,
+            "event_types": set(event_types),
+            "frame": None,
+            "pending": []
+        }
+
+    def show(self, name):
+        start = time.perf_counter()
+        self._hide_current()
+        view = self.views[name]
+        if view["frame"] is None:
+            view["frame"] = Frame(self.root)
+            view["builder"](view["frame"])
+            view["pending"] = []
+        elif view["pending"]:
+            pending, view["pending"] = view["pending"], []
+            view["refresher"](pending)
+        view["frame"].pack(fill=BOTH, expand=True)
+        self.current = name
+        self._record_switch(name, start)
+
+    def show_transient(self, name, builder):
+        """Показывает одноразовый экран (например, форму), который уничтожается при уходе с него."""
+        start = time.perf_counter()
+        self._hide_current()
+        self.transient = Frame(self.root)
+        builder(self.transient)
+        self.transient.pack(fill=BOTH, expand=True)
+        self.current = None
+        self._record_switch(name, start)
+
+    def _hide_current(self):
+        if self.transient is not None:
+            self.transient.destroy()
+            self.transient = None
+        if self.current is not None:
+            self.views[self.current]["frame"].pack_forget()
+
+    def _record_switch(self, name, start):
+        self.root.update_idletasks()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.switch_times[name] = elapsed_ms
+        if elapsed_ms > VIEW_SWITCH_BUDGET_MS:
+            logging.warning(f"Медленное переключение на экран '{name}': {elapsed_ms:.0f} мс")
+
+    def _on_changes(self, changes):
+        for name, view in self.views.items():
+            if view["frame"] is None or view["refresher"] is None:
+                continue
+            relevant = [e for e in changes if e.type in view["event_types"]]
+            if not relevant:
+                continue
+            if name == self.current:
+                view["refresher"](relevant)
+            else:
+                view["pending"].extend(relevant)
+
+
 # === Основной класс приложения ===
 class CartridgeApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Signatum — Учёт картриджей")
         self.root.geometry("1200x750")
+        self.views = ViewManager(root)
+        self.views.register("main", self._build_main_view)
+        self.views.register("printer_list", self._build_printer_list, self._refresh_printer_list,
+                            events.PRINTER_EVENTS)
+        self.views.register("printer_status", self._build_printer_status_report, self._refresh_printer_status_report,
+                            events.CARTRIDGE_EVENTS + events.MODEL_EVENTS + events.PRINTER_EVENTS +
+                            (events.SETTINGS_CHANGED,))
         self.create_main_view()
-
-    def clear_window(self):
-        for widget in self.root.winfo_children():
-            widget.destroy()
+        bus.subscribe(self.on_data_changed)
+        alert_engine.listeners.append(self.show_alerts)
+        alert_engine.start()
+        alert_engine.mark_dirty(stock_alert_keys())
+        self._alert_ticks = 0
+        self.root.after(0, self._alert_tick)
+        if integrity_issues:
+            self.alerts_list.insert(0, f"Проверка данных: проблем {len(integrity_issues)}, см. «Проверка данных»")
+            self.alerts_list.itemconfig(0, fg="#ef6c00")
+        self.root.bind("<Control-z>", lambda e: self.undo())
+        self.root.bind("<Control-y>", lambda e: self.redo())
 
     def create_main_view(self):
-        self.clear_window()
-        left_frame = Frame(self.root, padx=10, pady=10, width=400)
+        self.views.show("main")
+
+    def _build_main_view(self, frame):
+        left_frame = Frame(frame, padx=10, pady=10, width=400)
         left_frame.pack(side=LEFT, fill=Y, expand=False)
         Label(left_frame, text="Какой картридж только что был установлен?", font=("Arial", 12, "bold")).pack(anchor=W,
                                                                                                              pady=(0,
                                                                                                                    10))
         self.model_var = StringVar()
         Label(left_frame, text="Модель картриджа:").pack(anchor=W)
-        model_combo = ttk.Combobox(left_frame, textvariable=self.model_var,
-                                   values=get_cartridge_models_from_registry_only(), state="readonly")
-        model_combo.pack(fill=X, pady=(0, 10))
+        self.model_combo = ttk.Combobox(left_frame, textvariable=self.model_var,
+                                        values=get_cartridge_models_from_registry_only(), state="readonly")
+        self.model_combo.pack(fill=X, pady=(0, 10))
+        Label(left_frame, text="Принтер:").pack(anchor=W)
+        self.printer_var = StringVar()
+        self.printers_by_label = {get_printer_label(p): p for p in printers_data["принтеры"]}
+        self.printer_combo = ttk.Combobox(left_frame, textvariable=self.printer_var,
+                                          values=sorted(self.printers_by_label), state="readonly")
+        self.printer_combo.pack(fill=X, pady=(0, 10))
         Label(left_frame, text="Серийный номер (опционально):").pack(anchor=W)
         self.sn_entry = Entry(left_frame)
         self.sn_entry.pack(fill=X, pady=(0, 10))
         Button(left_frame, text="Подтвердить установку", command=self.confirm_installation, bg="#4CAF50",
-               fg="white").pack(pady=(0, 20))
+               fg="white").pack(pady=(0, 5))
+        Button(left_frame, text="Режим сканера", command=self.show_scan_mode).pack(pady=(0, 20))
         Button(left_frame, text="Добавить картридж на склад", command=self.add_cartridge_to_warehouse).pack(fill=X,
                                                                                                             pady=5)
         Button(left_frame, text="Список моделей картриджей", command=self.show_cartridge_models_list).pack(fill=X,
                                                                                                            pady=5)
         Button(left_frame, text="Управление принтерами", command=self.show_printer_list).pack(fill=X, pady=5)
         Button(left_frame, text="История установок", command=self.show_history).pack(fill=X, pady=5)
+        Button(left_frame, text="Картриджи вне склада", command=self.show_cartridge_lifecycle).pack(fill=X, pady=5)
+        Button(left_frame, text="🔍 Глобальный поиск", command=self.show_global_search).pack(fill=X, pady=5)
         Button(left_frame, text="Настройки запасов", command=self.open_settings).pack(fill=X, pady=5)
+        undo_frame = Frame(left_frame)
+        undo_frame.pack(fill=X, pady=5)
+        Button(undo_frame, text="↶ Отменить", command=self.undo).pack(side=LEFT, fill=X, expand=True)
+        Button(undo_frame, text="↷ Повторить", command=self.redo).pack(side=LEFT, fill=X, expand=True, padx=(5, 0))
+        Button(left_frame, text="Журнал операций", command=self.show_operation_log).pack(fill=X, pady=5)
+        Button(left_frame, text="Проверка данных", command=self.show_data_integrity).pack(fill=X, pady=5)
+        Button(left_frame, text="🛒 Заказ на закупку", command=self.show_reorder_plan).pack(fill=X, pady=5)
         Button(
             left_frame,
             text="📊 Статус принтеров",
@@ -278,11 +1764,26 @@ class CartridgeApp:
             font=("Arial", 10, "bold"),
             height=2
         ).pack(fill=X, pady=(15, 5))
+        Label(left_frame, text="Уведомления:").pack(anchor=W, pady=(10, 0))
+        self.alerts_list = Listbox(left_frame, height=8)
+        self.alerts_list.pack(fill=BOTH, expand=True)
+        Button(left_frame, text="История уведомлений", command=self.show_alert_history).pack(fill=X, pady=5)
 
-        right_frame = Frame(self.root, padx=10, pady=10)
+        right_frame = Frame(frame, padx=10, pady=10)
         right_frame.pack(side=RIGHT, fill=BOTH, expand=True)
         Label(right_frame, text="Картриджи на складе", font=("Arial", 12, "bold")).pack(anchor=W, pady=(0, 10))
 
+        site_frame = Frame(right_frame)
+        site_frame.pack(fill=X, pady=(0, 5))
+        Label(site_frame, text="Площадка:", anchor=W).pack(side=LEFT)
+        self.site_var = StringVar(value=ALL_SITES)
+        self.site_combo = ttk.Combobox(site_frame, textvariable=self.site_var, values=[ALL_SITES] + get_sites(),
+                                       state="readonly")
+        self.site_combo.pack(side=LEFT, padx=(5, 0))
+        self.site_combo.bind("<<ComboboxSelected>>", lambda e: self.on_search_change())
+        Button(site_frame, text="Остатки по площадкам", command=self.show_site_summary).pack(side=LEFT, padx=5)
+        Button(site_frame, text="Остатки на дату", command=self.show_stock_at_date).pack(side=LEFT, padx=5)
+
         search_frame = Frame(right_frame)
         search_frame.pack(fill=X, pady=(0, 5))
         Label(search_frame, text="Поиск по модели:", anchor=W).pack(side=LEFT)
@@ -300,6 +1801,8 @@ class CartridgeApp:
 
         self.stock_context_menu = Menu(self.root, tearoff=0)
         self.stock_context_menu.add_command(label="Изменить количество", command=self.edit_stock_quantity)
+        self.stock_context_menu.add_command(label="Переместить на другую площадку", command=self.transfer_stock)
+        self.stock_context_menu.add_command(label="Резерв для принтера", command=self.reserve_stock)
         self.stock_context_menu.add_command(label="Редактировать запись", command=self.edit_stock_record)
         self.stock_context_menu.add_command(label="Удалить запись", command=self.delete_stock_record)
 
@@ -314,17 +1817,132 @@ class CartridgeApp:
         btn_frame = Frame(right_frame)
         btn_frame.pack(side=BOTTOM, anchor=SE, pady=10)
         Button(btn_frame, text="Обновить данные",
-               command=lambda: update_stock_display(self.stock_tree, self.search_var.get())).pack(side=LEFT, padx=5)
+               command=self.on_search_change).pack(side=LEFT, padx=5)
         Button(btn_frame, text="Экспорт в CSV", command=self.export_csv).pack(side=LEFT, padx=5)
         Button(btn_frame, text="Экспорт в PDF", command=self.export_pdf).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Экспорт в Excel", command=self.export_xlsx).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Импорт из Excel", command=self.import_xlsx).pack(side=LEFT, padx=5)
         Button(btn_frame, text="Настройки", command=self.open_global_settings).pack(side=LEFT, padx=5)
 
         update_stock_display(self.stock_tree)
-        show_critical_alerts()
+
+    def current_site(self):
+        """Выбранная на главном экране площадка или None, если показаны все."""
+        site = self.site_var.get()
+        return None if site == ALL_SITES else site
 
     def on_search_change(self):
         query = self.search_var.get()
-        update_stock_display(self.stock_tree, query)
+        update_stock_display(self.stock_tree, query, self.current_site())
+
+    def on_data_changed(self, changes):
+        """Точечно обновляет главный экран по событиям изменения данных."""
+        if not self.stock_tree.winfo_exists():
+            return
+        types = {e.type for e in changes}
+        if types & set(events.MODEL_EVENTS):
+            self.model_combo.config(values=get_cartridge_models_from_registry_only())
+        if types & set(events.PRINTER_EVENTS):
+            self.printers_by_label = {get_printer_label(p): p for p in printers_data["принтеры"]}
+            self.printer_combo.config(values=sorted(self.printers_by_label))
+        self.site_combo.config(values=[ALL_SITES] + get_sites())
+        models = changed_models(changes)
+        if models:
+            refresh_stock_rows(self.stock_tree, models, self.search_var.get(), self.current_site())
+
+    def show_alerts(self, alerts):
+        """Добавляет уведомления в панель главного экрана, не блокируя работу."""
+        colors = {"критично": "#c62828", "внимание": "#ef6c00", "норма": "#2e7d32"}
+        for alert in alerts:
+            self.alerts_list.insert(0, f"{alert['время'][11:16]}  {alert['сообщение']}")
+            self.alerts_list.itemconfig(0, fg=colors.get(alert["уровень"], "black"))
+        if self.alerts_list.size() > ALERT_PANEL_SIZE:
+            self.alerts_list.delete(ALERT_PANEL_SIZE, END)
+
+    def _alert_tick(self):
+        self._alert_ticks += 1
+        if self._alert_ticks % ALERT_FULL_CHECK_TICKS == 0:
+            alert_engine.mark_dirty(stock_alert_keys())
+        alert_engine.check()
+        self.root.after(ALERT_CHECK_INTERVAL_MS, self._alert_tick)
+
+    def show_alert_history(self):
+        win = Toplevel(self.root)
+        win.title("История уведомлений")
+        win.geometry("800x500")
+        columns = ("Время", "Уровень", "Сообщение")
+        tree = ttk.Treeview(win, columns=columns, show="headings")
+        tree.heading("Время", text="Время")
+        tree.column("Время", width=150)
+        tree.heading("Уровень", text="Уровень")
+        tree.column("Уровень", width=100)
+        tree.heading("Сообщение", text="Сообщение")
+        tree.column("Сообщение", width=500)
+        tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        for alert in reversed(alert_engine.history()):
+            tree.insert("", "end", values=(alert["время"], alert["уровень"], alert["сообщение"]))
+
+    # === Отмена, повтор и журнал операций ===
+    def undo(self):
+        self._undo_redo(undo_last, "Отменено", "Нечего отменять")
+
+    def redo(self):
+        self._undo_redo(redo_last, "Повторено", "Нечего повторять")
+
+    def _undo_redo(self, action, done_text, empty_text):
+        try:
+            description = action()
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"Не удалось: {e}")
+            return
+        text = f"{done_text}: {description}" if description else empty_text
+        self.alerts_list.insert(0, f"{datetime.now().strftime('%H:%M')}  {text}")
+
+    def show_operation_log(self):
+        win = Toplevel(self.root)
+        win.title("Журнал операций")
+        win.geometry("1000x600")
+        top = Frame(win)
+        top.pack(fill=X, padx=10, pady=10)
+        Label(top, text="С (ГГГГ-ММ-ДД ЧЧ:ММ):").pack(side=LEFT)
+        start_var = StringVar(value=(datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M"))
+        Entry(top, textvariable=start_var, width=18).pack(side=LEFT, padx=5)
+        Label(top, text="по:").pack(side=LEFT)
+        end_var = StringVar()
+        Entry(top, textvariable=end_var, width=18).pack(side=LEFT, padx=5)
+        columns = ("Время", "Пользователь", "Операция", "Изменений")
+        tree = ttk.Treeview(win, columns=columns, show="headings", height=15)
+        for col, width in zip(columns, (150, 120, 550, 90)):
+            tree.heading(col, text=col)
+            tree.column(col, width=width)
+        tree.pack(fill=BOTH, expand=True, padx=10)
+        details = Text(win, height=10)
+        details.pack(fill=X, padx=10, pady=10)
+        shown = []
+
+        def load():
+            try:
+                start = datetime.fromisoformat(start_var.get().strip()) if start_var.get().strip() else None
+                end = datetime.fromisoformat(end_var.get().strip()) if end_var.get().strip() else None
+            except ValueError:
+                messagebox.showerror("Ошибка", "Дата должна быть в формате ГГГГ-ММ-ДД ЧЧ:ММ", parent=win)
+                return
+            tree.delete(*tree.get_children())
+            shown[:] = operation_log.query(start, end, limit=OPLOG_VIEW_LIMIT)
+            for idx, entry in enumerate(shown):
+                tree.insert("", "end", iid=idx, values=(entry["время"], entry["пользователь"], entry["операция"],
+                                                        len(entry["изменения"])))
+
+        def on_select(event):
+            selection = tree.selection()
+            if selection:
+                details.delete("1.0", END)
+                details.insert("1.0", json.dumps(shown[int(selection[0])]["изменения"], ensure_ascii=False,
+                                                 indent=2))
+
+        tree.bind("<<TreeviewSelect>>", on_select)
+        Button(top, text="Показать", command=load).pack(side=LEFT, padx=5)
+        load()
 
     # === Список моделей картриджей с контекстным меню ===
     def show_cartridge_models_list(self):
@@ -337,10 +1955,10 @@ class CartridgeApp:
             tree.heading(col, text=col)
             tree.column(col, width=180)
         tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
-        for idx, model in enumerate(cartridge_models_data["модели_картриджей"]):
+        for model in cartridge_models_data["модели_картриджей"]:
             printers_display = ", ".join(model.get("принтеры", [])) if isinstance(model.get("принтеры"),
                                                                                   list) else model.get("принтер", "")
-            tree.insert("", "end", iid=idx, values=(
+            tree.insert("", "end", iid=model["id"], values=(
                 model.get("модель", ""),
                 printers_display,
                 model.get("тип", ""),
@@ -367,27 +1985,27 @@ class CartridgeApp:
         selection = tree.selection()
         if not selection:
             return
-        idx = int(selection[0])
-        model_data = cartridge_models_data["модели_картриджей"][idx]
+        model_data = models_by_id[selection[0]]
         menu.unpost()
-        self._open_cartridge_model_form(model_data, idx)
+        self._open_cartridge_model_form(model_data)
 
     def delete_cartridge_model(self, tree, menu):
         selection = tree.selection()
         if not selection:
             return
-        idx = int(selection[0])
-        model_name = cartridge_models_data["модели_картриджей"][idx]["модель"]
+        model_id = selection[0]
+        model_name = models_by_id[model_id]["модель"]
         if messagebox.askyesno("Удаление", f"Удалить модель картриджа '{model_name}'?"):
-            del cartridge_models_data["модели_картриджей"][idx]
+            with operation(f"Удаление модели {model_name}"):
+                delete_cartridge_model(model_id)
             save_json(CARTRIDGE_MODELS_FILE, cartridge_models_data)
             menu.unpost()
             self.show_cartridge_models_list()
 
-    def _open_cartridge_model_form(self, model_data=None, index=None):
+    def _open_cartridge_model_form(self, model_data=None):
         win = Toplevel(self.root)
         win.title("Редактирование модели картриджа" if model_data else "Добавление новой модели картриджа")
-        win.geometry("500x550")
+        win.geometry("500x700")
         printer_list = [p.get("модель", "") for p in printers_data["принтеры"]]
         Label(win, text="Совместимые принтеры (до 3):", font=("Arial", 10)).pack(anchor=W, padx=20, pady=(10, 0))
         printer_vars = []
@@ -420,29 +2038,52 @@ class CartridgeApp:
         type_combo = ttk.Combobox(win, textvariable=type_var,
                                   values=["Черный", "Цветной", "Cyan", "Magenta", "Yellow", "Другое"])
         type_combo.pack(fill=X, padx=20, pady=(0, 10))
+        purchase_fields = [("поставщик", "Поставщик:"), ("цена", "Цена за шт.:"),
+                           ("срок_поставки_дней", "Срок поставки, дней:"), ("кратность", "Кратность заказа, шт.:")]
+        purchase_entries = {}
+        for field, label in purchase_fields:
+            row = Frame(win)
+            row.pack(fill=X, padx=20, pady=2)
+            Label(row, text=label, width=20, anchor=W).pack(side=LEFT)
+            entry = Entry(row)
+            entry.pack(side=LEFT, fill=X, expand=True)
+            if model_data and model_data.get(field) not in (None, ""):
+                entry.insert(0, str(model_data[field]))
+            purchase_entries[field] = entry
 
         def save_model():
             model = model_entry.get().strip()
             if not model:
                 messagebox.showerror("Ошибка", "Введите название модели картриджа!")
                 return
-            for i, existing in enumerate(cartridge_models_data["модели_картриджей"]):
-                if existing["модель"].lower() == model.lower() and (index is None or i != index):
+            purchase = {"поставщик": purchase_entries["поставщик"].get().strip()}
+            try:
+                for field, convert in (("цена", float), ("срок_поставки_дней", int), ("кратность", int)):
+                    value = purchase_entries[field].get().strip().replace(",", ".")
+                    purchase[field] = convert(value) if value else None
+                    if purchase[field] is not None and purchase[field] < 0:
+                        raise ValueError
+            except ValueError:
+                messagebox.showerror("Ошибка", "Цена, срок поставки и кратность должны быть неотрицательными числами")
+                return
+            editing_id = model_data["id"] if model_data else None
+            for existing in cartridge_models_data["модели_картриджей"]:
+                if existing["модель"].lower() == model.lower() and existing["id"] != editing_id:
                     messagebox.showerror("Ошибка", f"Модель '{model}' уже существует!")
                     return
             printers_selected = [var.get().strip() for var in printer_vars if var.get().strip()]
             new_model = {
+                "id": editing_id or new_record_id(),
                 "модель": model,
                 "принтеры": printers_selected,
                 "описание": desc_text.get("1.0", END).strip(),
                 "тип": type_var.get().strip(),
+                **purchase,
                 "дата_добавления": model_data.get("дата_добавления",
                                                   datetime.now().isoformat()) if model_data else datetime.now().isoformat()
             }
-            if index is not None:
-                cartridge_models_data["модели_картриджей"][index] = new_model
-            else:
-                cartridge_models_data["модели_картриджей"].append(new_model)
+            with operation(f"{'Изменение' if model_data else 'Добавление'} модели {model}"):
+                save_cartridge_model(new_model)
             save_json(CARTRIDGE_MODELS_FILE, cartridge_models_data)
             logging.info(f"{'Обновлена' if model_data else 'Добавлена'} модель картриджа: {model}")
             win.destroy()
@@ -453,10 +2094,13 @@ class CartridgeApp:
 
     # === Отчёт "Статус принтеров" ===
     def show_printer_status_report(self):
-        self.clear_window()
-        Label(self.root, text="Статус принтеров", font=("Arial", 16, "bold")).pack(pady=10)
-        columns = ("Модель принтера", "Тип", "Картридж 1", "Картридж 2", "Картридж 3", "Картридж 4", "Общий статус")
-        tree = ttk.Treeview(self.root, columns=columns, show="headings", height=20)
+        self.views.show("printer_status")
+
+    def _build_printer_status_report(self, frame):
+        Label(frame, text="Статус принтеров", font=("Arial", 16, "bold")).pack(pady=10)
+        columns = ("Модель принтера", "Площадка", "Тип", "Картридж 1", "Картридж 2", "Картридж 3", "Картридж 4",
+                   "Общий статус", "Тонер (SNMP)")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", height=20)
         for col in columns:
             tree.heading(col, text=col)
             tree.column(col, width=140)
@@ -465,26 +2109,57 @@ class CartridgeApp:
         tree.tag_configure("red", background="#ffcccc")
         tree.tag_configure("orange", background="#ffebcc")
         tree.tag_configure("gray", background="#f0f0f0")
-        for p in printers_data["принтеры"]:
-            model = p.get("модель", "Без названия")
-            is_color = is_color_printer(p)
-            printer_type = "Цветной" if is_color else "Черно-белый"
-            cartridges_needed, overall, overall_color = get_printer_cartridge_status(p)
-            cart_statuses = ["—"] * 4
-            for i, cart in enumerate(cartridges_needed[:4]):
-                cart_statuses[i] = cart["статус"]
-            tree.insert("", "end", values=(
-                model,
-                printer_type,
-                cart_statuses[0],
-                cart_statuses[1],
-                cart_statuses[2],
-                cart_statuses[3],
-                overall
-            ), tags=(overall_color,))
-        btn_frame = Frame(self.root)
+        self.status_tree = tree
+        self._fill_printer_status_report()
+        btn_frame = Frame(frame)
         btn_frame.pack(pady=10)
-        Button(btn_frame, text="Назад", command=self.create_main_view).pack()
+        self.snmp_button = Button(btn_frame, text="Опросить принтеры (SNMP)", command=self.poll_printer_supplies)
+        self.snmp_button.pack(side=LEFT, padx=5)
+        self.snmp_force_button = Button(btn_frame, text="Опросить заново (без кэша)",
+                                        command=lambda: self.poll_printer_supplies(force=True))
+        self.snmp_force_button.pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Назад", command=self.create_main_view).pack(side=LEFT, padx=5)
+
+    def poll_printer_supplies(self, force=False):
+        """Опрашивает все принтеры с IP-адресом в фоновом потоке и обновляет отчёт по завершении.
+        Результаты моложе "кэш_секунд" берутся из кэша, если не force."""
+        addresses = [p.get("ip_адрес", "").strip() for p in printers_data["принтеры"]]
+        self.snmp_button.config(state=DISABLED, text="Идёт опрос...")
+        self.snmp_force_button.config(state=DISABLED)
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(supply_poller.poll_fleet, addresses, force)
+        executor.shutdown(wait=False)
+
+        def check():
+            if not future.done():
+                self.root.after(200, check)
+                return
+            self.snmp_button.config(state=NORMAL, text="Опросить принтеры (SNMP)")
+            self.snmp_force_button.config(state=NORMAL)
+            if future.exception():
+                logging.error(f"Ошибка SNMP-опроса: {future.exception()}")
+                messagebox.showerror("Ошибка", f"Не удалось опросить принтеры: {future.exception()}")
+                return
+            self._fill_printer_status_report()
+
+        self.root.after(200, check)
+
+    def _fill_printer_status_report(self):
+        self.status_tree.delete(*self.status_tree.get_children())
+        for p in printers_data["принтеры"]:
+            values, color = printer_status_row(p)
+            self.status_tree.insert("", "end", iid=p["id"], values=values, tags=(color,))
+
+    def _refresh_printer_status_report(self, changes):
+        if any(e.type in events.PRINTER_EVENTS or e.type in events.MODEL_EVENTS for e in changes):
+            self._fill_printer_status_report()
+            return
+        # Остатки изменились только у части моделей — пересчитываем принтеры, где они стоят
+        models = changed_models(changes)
+        for p in printers_data["принтеры"]:
+            if any(p.get(f"картридж_{i}") in models for i in range(1, 5)):
+                values, color = printer_status_row(p)
+                self.status_tree.item(p["id"], values=values, tags=(color,))
 
     # === Настройки запасов с переключателем фильтра ===
     def open_settings(self):
@@ -501,6 +2176,11 @@ class CartridgeApp:
             text="Показывать только модели из реестра картриджей",
             variable=filter_var
         ).pack(side=LEFT)
+        general_levels = "Общие уровни (все площадки)"
+        Label(filter_frame, text="Площадка:").pack(side=LEFT, padx=(20, 5))
+        site_var = StringVar(value=general_levels)
+        ttk.Combobox(filter_frame, textvariable=site_var, values=[general_levels] + get_sites(),
+                     state="readonly").pack(side=LEFT)
         canvas = Canvas(main_frame)
         scrollbar = ttk.Scrollbar(main_frame, orient=VERTICAL, command=canvas.yview)
         scrollable_frame = Frame(canvas)
@@ -518,7 +2198,11 @@ class CartridgeApp:
                     cart_to_printers.setdefault(cart_model, set()).add(p.get("модель", "Без названия"))
         entries = {}
 
+        def selected_site():
+            return None if site_var.get() == general_levels else site_var.get()
+
         def refresh_settings_list():
+            entries.clear()
             for widget in scrollable_frame.winfo_children():
                 if widget != filter_frame and isinstance(widget, Frame):
                     widget.destroy()
@@ -534,27 +2218,31 @@ class CartridgeApp:
                 printers_list = ", ".join(sorted(cart_to_printers.get(model, []))) or "—"
                 printer_label = Label(row, text=printers_list, width=40, anchor=W, fg="gray", font=("Arial", 9))
                 printer_label.pack(side=LEFT, padx=(10, 20))
-                var = StringVar(value=str(get_critical_level(model)))
+                var = StringVar(value=str(get_critical_level(model, selected_site())))
                 entry = Entry(row, textvariable=var, width=8, justify='center')
                 entry.pack(side=RIGHT)
                 entries[model] = var
 
         filter_var.trace("w", lambda *args: refresh_settings_list())
+        site_var.trace("w", lambda *args: refresh_settings_list())
         refresh_settings_list()
 
         def apply():
+            levels = {}
             for model, var in entries.items():
                 try:
                     val = int(var.get())
                     if val < 0:
                         raise ValueError
-                    settings_data["критические_уровни"][model] = val
+                    levels[model] = val
                 except ValueError:
                     messagebox.showerror("Ошибка", f"Некорректное значение для {model}")
                     return
+            site = selected_site()
+            with operation(f"Критические уровни ({site or 'общие'})"):
+                set_critical_levels(levels, site)
             save_json(SETTINGS_FILE, settings_data)
-            logging.info("Обновлены критические уровни")
-            update_stock_display(self.stock_tree, self.search_var.get())
+            logging.info(f"Обновлены критические уровни ({site or 'общие'})")
             win.destroy()
             messagebox.showinfo("Успех", "Настройки сохранены!")
 
@@ -563,6 +2251,229 @@ class CartridgeApp:
         Button(btn_frame, text="Применить", command=apply, bg="#4CAF50", fg="white", font=("Arial", 12),
                width=15).pack()
 
+    # === Площадки: перемещение и сводные остатки ===
+    def transfer_stock(self):
+        selection = self.stock_tree.selection()
+        if not selection:
+            return
+        model = self.stock_tree.item(selection[0])['values'][0]
+        win = Toplevel(self.root)
+        win.title(f"Перемещение: {model}")
+        win.geometry("350x300")
+        Label(win, text=f"Модель: {model}", font=("Arial", 10, "bold")).pack(pady=10)
+        sites = get_sites()
+        Label(win, text="Откуда:").pack(anchor=W, padx=20)
+        from_var = StringVar(value=self.current_site() or get_default_site())
+        ttk.Combobox(win, textvariable=from_var, values=sites, state="readonly").pack(fill=X, padx=20)
+        available_label = Label(win, text="", fg="gray")
+        available_label.pack(anchor=W, padx=20)
+        Label(win, text="Куда (можно ввести новую площадку):").pack(anchor=W, padx=20, pady=(10, 0))
+        to_var = StringVar()
+        ttk.Combobox(win, textvariable=to_var, values=sites).pack(fill=X, padx=20)
+        Label(win, text="Количество:").pack(anchor=W, padx=20, pady=(10, 0))
+        qty_var = StringVar(value="1")
+        Entry(win, textvariable=qty_var, justify='center').pack(fill=X, padx=20)
+
+        def update_available(*args):
+            available_label.config(text=f"На складе: {get_warehouse_stock(from_var.get()).get(model, 0)} шт., "
+                                        f"свободных: {stock_allocator.available(model, from_var.get())}")
+
+        from_var.trace("w", update_available)
+        update_available()
+
+        def apply():
+            to_site = to_var.get().strip()
+            if not to_site:
+                messagebox.showerror("Ошибка", "Укажите площадку назначения", parent=win)
+                return
+            try:
+                qty = int(qty_var.get())
+            except ValueError:
+                messagebox.showerror("Ошибка", "Введите корректное число", parent=win)
+                return
+            try:
+                with operation(f"Перемещение {model} × {qty}: {from_var.get()} → {to_site}"):
+                    transfer_cartridges(model, from_var.get(), to_site, qty)
+            except ValueError as e:
+                messagebox.showerror("Ошибка", str(e), parent=win)
+                return
+            save_json(CARTRIDGES_FILE, cartridges_data)
+            save_json(HISTORY_FILE, history_data)
+            save_json(SETTINGS_FILE, settings_data)
+            win.destroy()
+            messagebox.showinfo("Успех", f"Перемещено {qty} шт. '{model}': {from_var.get()} → {to_site}")
+
+        Button(win, text="Переместить", command=apply, bg="#4CAF50", fg="white", width=15).pack(pady=15)
+
+    def reserve_stock(self):
+        selection = self.stock_tree.selection()
+        if not selection:
+            return
+        model = self.stock_tree.item(selection[0])['values'][0]
+        # В резерв можно поставить картриджи только для принтеров с серийным номером, к которым модель подходит
+        printers = {get_printer_label(p): p for p in printers_data["принтеры"]
+                    if model in [p.get(f"картридж_{i}") for i in range(1, 5)] and
+                    p.get("серийный_номер", "") not in integrity.NO_SERIAL}
+        if not printers:
+            messagebox.showwarning("Резерв", f"Модель '{model}' не указана ни в одном принтере с серийным номером")
+            return
+        win = Toplevel(self.root)
+        win.title(f"Резерв: {model}")
+        win.geometry("400x250")
+        Label(win, text=f"Модель: {model}", font=("Arial", 10, "bold")).pack(pady=10)
+        Label(win, text="Принтер:").pack(anchor=W, padx=20)
+        printer_var = StringVar()
+        ttk.Combobox(win, textvariable=printer_var, values=sorted(printers), state="readonly").pack(fill=X, padx=20)
+        reserved_label = Label(win, text="", fg="gray")
+        reserved_label.pack(anchor=W, padx=20)
+        Label(win, text="Количество (0 — снять резерв):").pack(anchor=W, padx=20, pady=(10, 0))
+        qty_var = StringVar(value="1")
+        Entry(win, textvariable=qty_var, justify='center').pack(fill=X, padx=20)
+
+        def update_reserved(*args):
+            printer = printers.get(printer_var.get())
+            if printer:
+                sn = printer.get("серийный_номер", "")
+                reserved = stock_allocator.available(model, site_of(printer), sn) - \
+                    stock_allocator.available(model, site_of(printer))
+                reserved_label.config(text=f"Площадка: {site_of(printer)}, уже в резерве: {reserved} шт.")
+
+        printer_var.trace("w", update_reserved)
+
+        def apply():
+            printer = printers.get(printer_var.get())
+            if not printer:
+                messagebox.showerror("Ошибка", "Выберите принтер", parent=win)
+                return
+            try:
+                qty = int(qty_var.get())
+                if qty < 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Ошибка", "Введите корректное число", parent=win)
+                return
+            site = site_of(printer)
+            try:
+                with operation(f"Резерв {model} × {qty} для {get_printer_label(printer)}"):
+                    set_reservation(model, site, printer, qty)
+            except ValueError as e:
+                messagebox.showerror("Ошибка", str(e), parent=win)
+                return
+            save_json(CARTRIDGES_FILE, cartridges_data)
+            win.destroy()
+            messagebox.showinfo("Успех", f"В резерве для {get_printer_label(printer)}: {qty} шт. '{model}'")
+
+        Button(win, text="Сохранить", command=apply, bg="#4CAF50", fg="white", width=15).pack(pady=15)
+
+    def show_site_summary(self):
+        win = Toplevel(self.root)
+        win.title("Остатки по площадкам")
+        win.geometry("1000x500")
+        sites = get_sites()
+        columns = ("Модель",) + tuple(sites) + ("Всего",)
+        tree = ttk.Treeview(win, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=120 if col != "Модель" else 200)
+        tree.tag_configure("orange", background="#ffebcc")
+        tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        for row in get_site_stock_summary():
+            values = (row["модель"],) + tuple(row["по_площадкам"][site] for site in sites) + (row["всего"],)
+            tree.insert("", "end", values=values, tags=("orange",) if row["ниже_уровня"] else ())
+        Label(win, text="Оранжевым отмечены модели, запас которых ниже критического хотя бы на одной площадке",
+              fg="gray").pack(pady=(0, 10))
+
+    def show_stock_at_date(self):
+        win = Toplevel(self.root)
+        win.title("Остатки на дату")
+        win.geometry("1000x550")
+        top = Frame(win)
+        top.pack(fill=X, padx=10, pady=10)
+        now = datetime.now()
+        date_vars = {}
+        for name, low, high, value, width in (("день", 1, 31, now.day, 3), ("месяц", 1, 12, now.month, 3),
+                                              ("год", 2000, 2100, now.year, 5), ("час", 0, 23, now.hour, 3),
+                                              ("минута", 0, 59, now.minute, 3)):
+            Label(top, text=f"{name.capitalize()}:").pack(side=LEFT)
+            var = StringVar(value=str(value))
+            Spinbox(top, from_=low, to=high, textvariable=var, width=width, wrap=True).pack(side=LEFT, padx=(2, 8))
+            date_vars[name] = var
+        first = stock_history.first_date()
+        hint = f"Данные есть с {datetime.fromtimestamp(first):%d.%m.%Y %H:%M}" if first else "Данных пока нет"
+        Label(win, text=hint, fg="gray").pack(anchor=W, padx=10)
+        tree_frame = Frame(win)
+        tree_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
+
+        def show():
+            try:
+                when = datetime(*(int(date_vars[n].get()) for n in ("год", "месяц", "день", "час", "минута")))
+            except ValueError:
+                messagebox.showerror("Ошибка", "Некорректная дата", parent=win)
+                return
+            stock = stock_history.stock_at(when)
+            if stock is None:
+                messagebox.showwarning("Нет данных", f"На {when:%d.%m.%Y %H:%M} остатки неизвестны", parent=win)
+                return
+            for widget in tree_frame.winfo_children():
+                widget.destroy()
+            sites = sorted(set(get_sites()) | set(stock))
+            columns = ("Модель",) + tuple(sites) + ("Всего",)
+            tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+            for col in columns:
+                tree.heading(col, text=col)
+                tree.column(col, width=120 if col != "Модель" else 200)
+            tree.pack(fill=BOTH, expand=True)
+            models = sorted(set(get_cartridge_models_from_registry_only()) |
+                            {model for per_site in stock.values() for model in per_site})
+            for model in models:
+                counts = [stock.get(site, {}).get(model, 0) for site in sites]
+                tree.insert("", "end", values=(model, *counts, sum(counts)))
+
+        Button(top, text="Показать", command=show).pack(side=LEFT, padx=10)
+        show()
+
+    def show_data_integrity(self):
+        win = Toplevel(self.root)
+        win.title("Проверка данных")
+        win.geometry("1000x550")
+        summary_var = StringVar()
+        Label(win, textvariable=summary_var, justify=LEFT, anchor=W).pack(fill=X, padx=10, pady=(10, 0))
+        columns = ("Проверка", "Запись", "Поле", "Значение", "Исправление")
+        tree = ttk.Treeview(win, columns=columns, show="headings")
+        for col, width in zip(columns, (300, 120, 140, 200, 200)):
+            tree.heading(col, text=col)
+            tree.column(col, width=width)
+        tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        state = {"issues": []}
+
+        def run_check():
+            state["issues"] = check_data_integrity()
+            tree.delete(*tree.get_children())
+            summary = integrity.summarize(state["issues"])
+            summary_var.set("\n".join(f"{integrity.CHECKS[code]}: {total} (исправимо: {fixable})"
+                                       for code, (total, fixable) in summary.items()) or "Проблем не найдено")
+            for issue in state["issues"][:INTEGRITY_VIEW_LIMIT]:
+                fix = issue["исправление"]
+                tree.insert("", "end", values=(integrity.CHECKS[issue["проверка"]],
+                                               f"{issue['вид']} {issue['запись'].get('id', '')[:8]}",
+                                               issue["поле"], issue["значение"],
+                                               "—" if fix is None else (fix if isinstance(fix, str) else
+                                                                        ", ".join(map(str, fix.values())))))
+
+        def repair():
+            if not messagebox.askyesno("Исправление", "Исправить все проблемы, которые исправляются автоматически?\n"
+                                                      "Исправление можно будет отменить одним шагом.", parent=win):
+                return
+            fixed = repair_data_integrity(state["issues"])
+            run_check()
+            messagebox.showinfo("Исправление", f"Исправлено записей: {fixed}", parent=win)
+
+        buttons = Frame(win)
+        buttons.pack(pady=(0, 10))
+        Button(buttons, text="Проверить снова", command=run_check).pack(side=LEFT, padx=5)
+        Button(buttons, text="Исправить", command=repair, bg="#4CAF50", fg="white").pack(side=LEFT, padx=5)
+        run_check()
+
     # === Остальные методы (без изменений) ===
     def edit_stock_quantity(self):
         selection = self.stock_tree.selection()
@@ -571,10 +2482,14 @@ class CartridgeApp:
         item = self.stock_tree.item(selection[0])
         model = item['values'][0]
         current_qty = item['values'][1]
+        site = self.current_site()
+        if site is None:
+            messagebox.showwarning("Внимание", "Выберите площадку: количество меняется на складе одной площадки")
+            return
         win = Toplevel(self.root)
         win.title(f"Изменение количества: {model}")
         win.geometry("300x200")
-        Label(win, text=f"Модель: {model}", font=("Arial", 10, "bold")).pack(pady=10)
+        Label(win, text=f"Модель: {model} ({site})", font=("Arial", 10, "bold")).pack(pady=10)
         Label(win, text=f"Текущее количество: {current_qty} шт.").pack(pady=5)
         Label(win, text="Новое количество:").pack(pady=5)
         qty_var = StringVar(value=str(current_qty))
@@ -588,34 +2503,9 @@ class CartridgeApp:
                 new_qty = int(qty_var.get())
                 if new_qty < 0:
                     raise ValueError
-                current_cartridges = [c for c in cartridges_data["картриджи"] if
-                                      c["модель"] == model and c["статус"] == "на складе"]
-                current_count = len(current_cartridges)
-                if new_qty > current_count:
-                    to_add = new_qty - current_count
-                    for i in range(to_add):
-                        new_cartridge = {
-                            "модель": model,
-                            "серийный_номер": f"AUTO_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{i}",
-                            "статус": "на складе",
-                            "дата_поступления": datetime.now().isoformat(),
-                            "остаточный_ресурс": 100,
-                            "принтер": "",
-                            "комментарий": "Добавлено автоматически"
-                        }
-                        cartridges_data["картриджи"].append(new_cartridge)
-                elif new_qty < current_count:
-                    to_remove = current_count - new_qty
-                    removed = 0
-                    for i in range(len(cartridges_data["картриджи"]) - 1, -1, -1):
-                        if removed >= to_remove:
-                            break
-                        c = cartridges_data["картриджи"][i]
-                        if c["модель"] == model and c["статус"] == "на складе":
-                            del cartridges_data["картриджи"][i]
-                            removed += 1
+                with operation(f"Количество {model} ({site}): {current_qty} → {new_qty}"):
+                    set_stock_quantity(model, new_qty, site)
                 save_json(CARTRIDGES_FILE, cartridges_data)
-                update_stock_display(self.stock_tree, self.search_var.get())
                 win.destroy()
                 messagebox.showinfo("Успех", f"Количество картриджей '{model}' изменено на {new_qty}")
             except ValueError:
@@ -630,8 +2520,10 @@ class CartridgeApp:
             return
         item = self.stock_tree.item(selection[0])
         model = item['values'][0]
+        site = self.current_site()
         cartridges_on_stock = [c for c in cartridges_data["картриджи"] if
-                               c["модель"] == model and c["статус"] == "на складе"]
+                               c["модель"] == model and c["статус"] == "на складе" and
+                               (site is None or site_of(c) == site)]
         if not cartridges_on_stock:
             messagebox.showwarning("Внимание", f"Не найдены картриджи модели '{model}' на складе")
             return
@@ -642,24 +2534,27 @@ class CartridgeApp:
         win.title(f"Редактирование картриджей: {model}")
         win.geometry("800x500")
         Label(win, text=f"Картриджи модели '{model}' на складе", font=("Arial", 12, "bold")).pack(pady=10)
-        columns = ("Серийный номер", "Остаточный ресурс", "Дата поступления", "Комментарий")
+        columns = ("Серийный номер", "Площадка", "Остаточный ресурс", "Дата поступления", "Комментарий")
         tree = ttk.Treeview(win, columns=columns, show="headings", height=15)
         for col in columns:
             tree.heading(col, text=col)
             tree.column(col, width=150)
         tree.pack(fill=BOTH, expand=True, padx=20, pady=10)
-        for idx, cart in enumerate(cartridges):
-            tree.insert("", "end", iid=idx, values=(
+        for cart in cartridges:
+            tree.insert("", "end", iid=cart["id"], values=(
                 cart.get("серийный_номер", "N/A"),
+                site_of(cart),
                 cart.get("остаточный_ресурс", 100),
                 cart.get("дата_поступления", ""),
                 cart.get("комментарий", "")
             ))
         context_menu = Menu(win, tearoff=0)
         context_menu.add_command(label="Редактировать картридж",
-                                 command=lambda: self.edit_single_cartridge(tree, cartridges, context_menu))
+                                 command=lambda: self.edit_single_cartridge(tree, context_menu))
         context_menu.add_command(label="Удалить картридж",
-                                 command=lambda: self.delete_single_cartridge(tree, cartridges, context_menu))
+                                 command=lambda: self.delete_single_cartridge(tree, context_menu))
+        context_menu.add_command(label="Списать со склада",
+                                 command=lambda: self.write_off_stock_cartridges(tree, context_menu))
 
         def on_right_click(event):
             item = tree.identify_row(event.y)
@@ -674,16 +2569,15 @@ class CartridgeApp:
                command=lambda: self.add_cartridge_of_model(model, win)).pack(side=LEFT, padx=5)
         Button(btn_frame, text="Закрыть", command=win.destroy).pack(side=LEFT, padx=5)
 
-    def edit_single_cartridge(self, tree, cartridges, menu):
+    def edit_single_cartridge(self, tree, menu):
         selection = tree.selection()
         if not selection:
             return
-        idx = int(selection[0])
-        cartridge = cartridges[idx]
+        cartridge = cartridges_by_id[selection[0]]
         menu.unpost()
-        self.show_edit_cartridge_window(cartridge, tree, cartridges)
+        self.show_edit_cartridge_window(cartridge)
 
-    def show_edit_cartridge_window(self, cartridge, tree, cartridges):
+    def show_edit_cartridge_window(self, cartridge):
         win = Toplevel(self.root)
         win.title("Редактирование картриджа")
         win.geometry("400x300")
@@ -699,53 +2593,73 @@ class CartridgeApp:
             entries[field] = entry
 
         def save_changes():
+            changes = {}
             for field, entry in entries.items():
                 if field == "остаточный_ресурс":
                     try:
-                        cartridge[field] = int(entry.get())
+                        changes[field] = int(entry.get())
                     except ValueError:
                         messagebox.showerror("Ошибка", "Остаточный ресурс должен быть числом")
                         return
                 else:
-                    cartridge[field] = entry.get().strip()
+                    changes[field] = entry.get().strip()
+            sn = changes["серийный_номер"] = changes["серийный_номер"] or "N/A"
+            other = find_cartridge_by_serial(sn)
+            if other is not None and other is not cartridge:
+                messagebox.showerror("Ошибка", f"Картридж с серийным номером {sn} уже существует!", parent=win)
+                return
+            with operation(f"Правка картриджа {cartridge['модель']} (SN: {cartridge.get('серийный_номер', 'N/A')})"):
+                update_cartridge(cartridge, changes)
             save_json(CARTRIDGES_FILE, cartridges_data)
-            update_stock_display(self.stock_tree, self.search_var.get())
             win.destroy()
             messagebox.showinfo("Успех", "Картридж успешно обновлен!")
 
         Button(win, text="Сохранить", command=save_changes, bg="#4CAF50", fg="white").pack(pady=10)
 
-    def delete_single_cartridge(self, tree, cartridges, menu):
+    def delete_single_cartridge(self, tree, menu):
         selection = tree.selection()
         if not selection:
             return
-        idx = int(selection[0])
-        cartridge = cartridges[idx]
+        cartridge = cartridges_by_id[selection[0]]
         sn = cartridge.get("серийный_номер", "N/A")
         if messagebox.askyesno("Удаление", f"Удалить картридж с серийным номером {sn}?"):
-            for i, c in enumerate(cartridges_data["картриджи"]):
-                if (c["модель"] == cartridge["модель"] and c.get("серийный_номер") == cartridge.get("серийный_номер")):
-                    del cartridges_data["картриджи"][i]
-                    break
+            with operation(f"Удаление картриджа {cartridge['модель']} (SN: {sn})"):
+                remove_cartridges([cartridge])
             save_json(CARTRIDGES_FILE, cartridges_data)
             menu.unpost()
-            update_stock_display(self.stock_tree, self.search_var.get())
             messagebox.showinfo("Успех", "Картридж удален!")
 
+    def write_off_stock_cartridges(self, tree, menu):
+        """Списывает выбранные картриджи прямо со склада (переход "на складе" → "списан")."""
+        selection = tree.selection()
+        menu.unpost()
+        if not selection:
+            return
+        cartridges = [cartridges_by_id[iid] for iid in selection]
+        if not messagebox.askyesno("Списание", f"Списать со склада картриджей: {len(cartridges)}?"):
+            return
+        with operation(f"Списание со склада ({len(cartridges)} шт.)"):
+            for cartridge in cartridges:
+                change_cartridge_state(cartridge, "списан")
+            offload_terminal_cartridges()
+        save_json(CARTRIDGES_FILE, cartridges_data)
+        tree.delete(*selection)
+
     def delete_stock_record(self):
         selection = self.stock_tree.selection()
         if not selection:
             return
         item = self.stock_tree.item(selection[0])
         model = item['values'][0]
-        if messagebox.askyesno("Удаление", f"Удалить ВСЕ картриджи модели '{model}' со склада?"):
-            cartridges_data["картриджи"] = [
-                c for c in cartridges_data["картриджи"]
-                if not (c["модель"] == model and c["статус"] == "на складе")
-            ]
+        site = self.current_site()
+        where = f"со склада площадки '{site}'" if site else "со складов всех площадок"
+        if messagebox.askyesno("Удаление", f"Удалить ВСЕ картриджи модели '{model}' {where}?"):
+            with operation(f"Удаление всех картриджей {model} {where}"):
+                remove_cartridges([c for c in cartridges_data["картриджи"]
+                                   if c["модель"] == model and c["статус"] == "на складе" and
+                                   (site is None or site_of(c) == site)])
             save_json(CARTRIDGES_FILE, cartridges_data)
-            update_stock_display(self.stock_tree, self.search_var.get())
-            messagebox.showinfo("Успех", f"Все картриджи модели '{model}' удалены со склада!")
+            messagebox.showinfo("Успех", f"Все картриджи модели '{model}' удалены {where}!")
 
     def add_cartridge_of_model(self, model, parent_win):
         win = Toplevel(parent_win)
@@ -776,23 +2690,22 @@ class CartridgeApp:
             except ValueError:
                 messagebox.showerror("Ошибка", "Остаточный ресурс должен быть числом от 0 до 100")
                 return
-            if sn:
-                for c in cartridges_data["картриджи"]:
-                    if c.get("серийный_номер") == sn:
-                        messagebox.showerror("Ошибка", f"Картридж с серийным номером {sn} уже существует!")
-                        return
+            if sn and find_cartridge_by_serial(sn):
+                messagebox.showerror("Ошибка", f"Картридж с серийным номером {sn} уже существует!")
+                return
             new_cartridge = {
                 "модель": model,
                 "серийный_номер": sn or "N/A",
                 "статус": "на складе",
+                "площадка": self.current_site() or get_default_site(),
                 "дата_поступления": datetime.now().isoformat(),
                 "остаточный_ресурс": resource_int,
                 "комментарий": comment,
                 "принтер": ""
             }
-            cartridges_data["картриджи"].append(new_cartridge)
+            with operation(f"Добавление картриджа {model} (SN: {new_cartridge['серийный_номер']})"):
+                add_cartridge(new_cartridge)
             save_json(CARTRIDGES_FILE, cartridges_data)
-            update_stock_display(self.stock_tree, self.search_var.get())
             win.destroy()
             parent_win.destroy()
             messagebox.showinfo("Успех", "Картридж добавлен на склад!")
@@ -800,34 +2713,24 @@ class CartridgeApp:
         Button(win, text="Сохранить", command=save_cartridge, bg="#4CAF50", fg="white").pack(pady=10)
 
     def show_printer_list(self):
-        self.clear_window()
-        Label(self.root, text="Список принтеров", font=("Arial", 16, "bold")).pack(pady=10)
-        columns = ("Модель", "Серийный", "IP", "Закреплён за", "Картридж 1", "Картридж 2", "Картридж 3", "Картридж 4",
-                   "Комментарий")
-        tree = ttk.Treeview(self.root, columns=columns, show="headings", height=20)
+        self.views.show("printer_list")
+
+    def _build_printer_list(self, frame):
+        Label(frame, text="Список принтеров", font=("Arial", 16, "bold")).pack(pady=10)
+        columns = ("Модель", "Серийный", "IP", "Площадка", "Закреплён за", "Картридж 1", "Картридж 2", "Картридж 3",
+                   "Картридж 4", "Комментарий")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", height=20)
         column_widths = {
-            "Модель": 150, "Серийный": 120, "IP": 100, "Закреплён за": 120,
+            "Модель": 150, "Серийный": 120, "IP": 100, "Площадка": 120, "Закреплён за": 120,
             "Картридж 1": 120, "Картридж 2": 120, "Картридж 3": 120, "Картридж 4": 120, "Комментарий": 200
         }
         for col in columns:
             tree.heading(col, text=col)
             tree.column(col, width=column_widths[col])
-        scroll_x = ttk.Scrollbar(self.root, orient=HORIZONTAL, command=tree.xview)
+        scroll_x = ttk.Scrollbar(frame, orient=HORIZONTAL, command=tree.xview)
         tree.configure(xscrollcommand=scroll_x.set)
         scroll_x.pack(side=BOTTOM, fill=X)
         tree.pack(fill=BOTH, expand=True, padx=20, pady=10)
-        for idx, p in enumerate(printers_data["принтеры"]):
-            tree.insert("", "end", iid=idx, values=(
-                p.get("модель", ""),
-                p.get("серийный_номер", ""),
-                p.get("ip_адрес", ""),
-                p.get("закреплён_за", ""),
-                p.get("картридж_1", ""),
-                p.get("картридж_2", ""),
-                p.get("картридж_3", ""),
-                p.get("картридж_4", ""),
-                p.get("комментарий", "")
-            ))
         context_menu = Menu(self.root, tearoff=0)
         context_menu.add_command(label="Редактировать", command=lambda: self.edit_selected_printer(tree, context_menu))
         context_menu.add_command(label="Удалить", command=lambda: self.delete_selected_printer(tree, context_menu))
@@ -839,46 +2742,81 @@ class CartridgeApp:
                 context_menu.post(event.x_root, event.y_root)
 
         tree.bind("<Button-3>", on_right_click)
-        btn_frame = Frame(self.root)
+        btn_frame = Frame(frame)
         btn_frame.pack(pady=10)
         Button(btn_frame, text="Добавить принтер", command=self.show_printer_form).pack(side=LEFT, padx=5)
         Button(btn_frame, text="Назад", command=self.create_main_view).pack(side=LEFT, padx=5)
         self.printer_tree = tree
         self.context_menu = context_menu
+        self._fill_printer_list()
+
+    @staticmethod
+    def _printer_list_row(p):
+        return (
+            p.get("модель", ""),
+            p.get("серийный_номер", ""),
+            p.get("ip_адрес", ""),
+            site_of(p),
+            p.get("закреплён_за", ""),
+            p.get("картридж_1", ""),
+            p.get("картридж_2", ""),
+            p.get("картридж_3", ""),
+            p.get("картридж_4", ""),
+            p.get("комментарий", "")
+        )
+
+    def _fill_printer_list(self):
+        self.printer_tree.delete(*self.printer_tree.get_children())
+        for p in printers_data["принтеры"]:
+            self.printer_tree.insert("", "end", iid=p["id"], values=self._printer_list_row(p))
+
+    def _refresh_printer_list(self, changes):
+        for e in changes:
+            printer_id = e.record["id"]
+            if printer_id not in printers_by_id:
+                if self.printer_tree.exists(printer_id):
+                    self.printer_tree.delete(printer_id)
+            elif self.printer_tree.exists(printer_id):
+                self.printer_tree.item(printer_id, values=self._printer_list_row(e.record))
+            else:
+                self.printer_tree.insert("", "end", iid=printer_id, values=self._printer_list_row(e.record))
 
     def edit_selected_printer(self, tree, menu):
         selection = tree.selection()
         if not selection:
             return
-        idx = int(selection[0])
-        printer = printers_data["принтеры"][idx]
+        printer = printers_by_id[selection[0]]
         menu.unpost()
-        self.show_printer_form(printer_data=printer, index=idx)
+        self.show_printer_form(printer_data=printer)
 
     def delete_selected_printer(self, tree, menu):
         selection = tree.selection()
         if not selection:
             return
-        idx = int(selection[0])
-        model = printers_data["принтеры"][idx].get("модель", "Без названия")
+        printer_id = selection[0]
+        model = printers_by_id[printer_id].get("модель", "Без названия")
         if messagebox.askyesno("Удаление", f"Удалить принтер {model}?"):
-            del printers_data["принтеры"][idx]
+            with operation(f"Удаление принтера {model}"):
+                released = release_reservations(delete_printer(printer_id).get("серийный_номер", ""))
             save_json(PRINTERS_FILE, printers_data)
+            if released:
+                save_json(CARTRIDGES_FILE, cartridges_data)
             menu.unpost()
-            self.show_printer_list()
 
-    def show_printer_form(self, printer_data=None, index=None):
-        self.clear_window()
-        self.editing_printer_index = index
+    def show_printer_form(self, printer_data=None):
+        self.views.show_transient("printer_form", lambda frame: self._build_printer_form(frame, printer_data))
+
+    def _build_printer_form(self, frame, printer_data=None):
+        self.editing_printer_id = printer_data["id"] if printer_data else None
         self.root.state('zoomed')
         title = "Редактирование принтера" if printer_data else "Добавление нового принтера"
-        Label(self.root, text=title, font=("Arial", 16, "bold")).pack(pady=10)
-        fields = ["модель", "серийный_номер", "ip_адрес", "закреплён_за", "картридж_1", "картридж_2", "картридж_3",
-                  "картридж_4", "комментарий"]
-        labels = ["Модель", "Серийный номер", "IP-адрес", "Закреплён за", "Картридж 1", "Картридж 2", "Картридж 3",
-                  "Картридж 4", "Комментарий"]
+        Label(frame, text=title, font=("Arial", 16, "bold")).pack(pady=10)
+        fields = ["модель", "серийный_номер", "ip_адрес", "площадка", "закреплён_за", "картридж_1", "картридж_2",
+                  "картридж_3", "картридж_4", "комментарий"]
+        labels = ["Модель", "Серийный номер", "IP-адрес", "Площадка", "Закреплён за", "Картридж 1", "Картридж 2",
+                  "Картридж 3", "Картридж 4", "Комментарий"]
         self.printer_entries = {}
-        form_frame = Frame(self.root)
+        form_frame = Frame(frame)
         form_frame.pack(pady=20, padx=50, fill=BOTH, expand=True)
         for f, lbl in zip(fields, labels):
             row = Frame(form_frame)
@@ -886,6 +2824,8 @@ class CartridgeApp:
             if f.startswith("картридж_"):
                 entry = ttk.Combobox(row, font=("Arial", 12), width=47,
                                      values=get_cartridge_models_from_registry_only())
+            elif f == "площадка":
+                entry = ttk.Combobox(row, font=("Arial", 12), width=47, values=get_sites())
             else:
                 entry = Entry(row, font=("Arial", 12), width=50)
             entry.pack(side=LEFT, padx=10, fill=X, expand=True)
@@ -895,7 +2835,7 @@ class CartridgeApp:
             for f in fields:
                 if f in printer_data:
                     self.printer_entries[f].insert(0, printer_data.get(f, ""))
-        btn_frame = Frame(self.root)
+        btn_frame = Frame(frame)
         btn_frame.pack(pady=20)
         Button(btn_frame, text="Сохранить", command=self.save_printer, bg="#4CAF50", fg="white", font=("Arial", 12),
                width=15).pack(side=LEFT, padx=10)
@@ -909,13 +2849,18 @@ class CartridgeApp:
         if not data.get("модель") or not data.get("серийный_номер"):
             messagebox.showerror("Ошибка", "Модель и серийный номер обязательны!")
             return
-        if self.editing_printer_index is not None:
-            printers_data["принтеры"][self.editing_printer_index] = data
-            action = "обновлён"
-        else:
-            printers_data["принтеры"].append(data)
-            action = "добавлен"
+        data["площадка"] = data.get("площадка") or get_default_site()
+        if register_site(data["площадка"]):
+            save_json(SETTINGS_FILE, settings_data)
+        action = "обновлён" if self.editing_printer_id is not None else "добавлен"
+        data["id"] = self.editing_printer_id or new_record_id()
+        old_sn = printers_by_id[data["id"]].get("серийный_номер", "") if data["id"] in printers_by_id else ""
+        with operation(f"Принтер {action}: {get_printer_label(data)}"):
+            save_printer_record(data)
+            released = release_reservations(old_sn) if old_sn != data["серийный_номер"] else 0
         save_json(PRINTERS_FILE, printers_data)
+        if released:
+            save_json(CARTRIDGES_FILE, cartridges_data)
         logging.info(f"Принтер {action}: {data['модель']} ({data.get('серийный_номер', 'N/A')})")
         messagebox.showinfo("Успех", f"Принтер успешно {action}!")
         self.create_main_view()
@@ -926,51 +2871,138 @@ class CartridgeApp:
     def confirm_installation(self):
         model = self.model_var.get().strip()
         sn = self.sn_entry.get().strip()
-        if not model:
-            messagebox.showerror("Ошибка", "Выберите модель картриджа!")
-            return
-        available_cartridges = [c for c in cartridges_data["картриджи"] if
-                                c["модель"] == model and c["статус"] == "на складе"]
-        if not available_cartridges:
-            messagebox.showerror("Ошибка", f"На складе нет картриджей модели '{model}'!")
+        printer = self.printers_by_label.get(self.printer_var.get())
+        if not printer:
+            messagebox.showerror("Ошибка", "Выберите принтер!")
             return
-        cartridge_to_install = None
         if sn:
-            for c in available_cartridges:
-                if c.get("серийный_номер") == sn:
-                    cartridge_to_install = c
-                    break
-            if not cartridge_to_install:
+            cartridge_to_install = find_cartridge_by_serial(sn)
+            if not cartridge_to_install or cartridge_to_install["статус"] != "на складе" or (
+                    model and cartridge_to_install["модель"] != model):
                 messagebox.showerror("Ошибка", f"Картридж с серийным номером {sn} не найден на складе!")
                 return
+            reserved_for = cartridge_to_install.get(RESERVE_FIELD)
+            if reserved_for and reserved_for != printer.get("серийный_номер"):
+                messagebox.showerror("Ошибка", f"Картридж {sn} зарезервирован за другим принтером ({reserved_for})")
+                return
+            model = cartridge_to_install["модель"]
         else:
-            cartridge_to_install = available_cartridges[0]
+            if not model:
+                messagebox.showerror("Ошибка", "Выберите модель картриджа!")
+                return
+            # Картридж берётся со склада площадки принтера: сначала закреплённый за ним, затем по политике выдачи
+            site = site_of(printer)
+            chosen = stock_allocator.allocate(model, site, printer.get("серийный_номер", ""))
+            if not chosen:
+                messagebox.showerror("Ошибка", f"На складе площадки '{site}' нет свободных картриджей модели '{model}'!")
+                return
+            cartridge_to_install = chosen[0]
             sn = cartridge_to_install.get("серийный_номер", "N/A")
-        now = datetime.now().isoformat()
-        cartridge_to_install["статус"] = "в использовании"
-        cartridge_to_install["дата_установки"] = now
-        cartridge_to_install["принтер"] = "N/A"
-        history_data["записи"].append({
-            "модель_картриджа": model,
-            "серийный_номер": sn,
-            "принтер": "N/A",
-            "дата_установки": now,
-            "остаток_при_установке": cartridge_to_install.get("остаточный_ресурс", 100)
-        })
+        try:
+            with operation(f"Установка {model} (SN: {sn})"):
+                record_installation(cartridge_to_install, printer)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"Установка невозможна: {e}")
+            return
         save_json(CARTRIDGES_FILE, cartridges_data)
         save_json(HISTORY_FILE, history_data)
-        logging.info(f"Установлен картридж: {model}, SN: {sn}")
         self.model_var.set("")
         self.sn_entry.delete(0, END)
-        update_stock_display(self.stock_tree, self.search_var.get())
-        show_critical_alerts()
         messagebox.showinfo("Успех",
                             f"Картридж {model} (SN: {sn}) успешно установлен!\nКоличество на складе уменьшено.")
 
+    # === Режим быстрого сканирования ===
+    def show_scan_mode(self):
+        win = Toplevel(self.root)
+        win.title("Быстрая установка по сканеру")
+        win.geometry("800x550")
+        Label(win, text="Принтер:").pack(anchor=W, padx=10, pady=(10, 0))
+        printer_var = StringVar()
+        ttk.Combobox(win, textvariable=printer_var, values=sorted(self.printers_by_label),
+                     state="readonly").pack(fill=X, padx=10)
+        Label(win, text="Отсканируйте серийный номер:", font=("Arial", 12, "bold")).pack(anchor=W, padx=10,
+                                                                                      pady=(10, 0))
+        scan_entry = Entry(win, font=("Arial", 16))
+        scan_entry.pack(fill=X, padx=10, pady=(0, 5))
+        status_label = Label(win, text="", font=("Arial", 11))
+        status_label.pack(anchor=W, padx=10)
+        columns = ("Серийный", "Модель", "Принтер", "Состояние")
+        tree = ttk.Treeview(win, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=180)
+        tree.pack(fill=BOTH, expand=True, padx=10, pady=5)
+        queue = []  # (картридж, принтер, iid строки)
+        pending_commit = [None]
+
+        def commit():
+            if pending_commit[0]:
+                win.after_cancel(pending_commit[0])
+                pending_commit[0] = None
+            if not queue:
+                return
+            installed = 0
+            with operation(f"Установка по сканеру ({len(queue)} шт.)"):
+                for cartridge, printer, iid in queue:
+                    try:
+                        record_installation(cartridge, printer)
+                        tree.set(iid, "Состояние", "✅ установлен")
+                        installed += 1
+                    except ValueError as e:
+                        tree.set(iid, "Состояние", f"❌ {e}")
+            queue.clear()
+            # Одна запись файлов на весь пакет
+            save_json(CARTRIDGES_FILE, cartridges_data)
+            save_json(HISTORY_FILE, history_data)
+            status_label.config(text=f"Записано установок: {installed}", fg="green")
+            logging.info(f"Пакетная установка по сканеру: {installed} шт.")
+
+        def on_scan(event=None):
+            sn = scan_entry.get().strip()
+            scan_entry.delete(0, END)
+            if not sn:
+                return
+            cartridge = find_cartridge_by_serial(sn)
+            if cartridge is None:
+                status_label.config(text=f"❌ {sn}: не найден", fg="red")
+                return
+            if cartridge["статус"] != "на складе" or any(c is cartridge for c, _, _ in queue):
+                status_label.config(text=f"❌ {sn}: уже установлен ({cartridge['статус']})", fg="red")
+                return
+            printer = self.printers_by_label.get(printer_var.get())
+            if printer is None:
+                status_label.config(text="❌ Сначала выберите принтер", fg="red")
+                return
+            if cartridge.get(RESERVE_FIELD) and cartridge[RESERVE_FIELD] != printer.get("серийный_номер"):
+                status_label.config(text=f"❌ {sn}: зарезервирован за принтером {cartridge[RESERVE_FIELD]}", fg="red")
+                return
+            iid = tree.insert("", 0, values=(sn, cartridge["модель"], printer_var.get(), "в очереди"))
+            queue.append((cartridge, printer, iid))
+            status_label.config(text=f"✔ {sn}: {cartridge['модель']} (в очереди: {len(queue)})", fg="black")
+            if len(queue) >= SCAN_BATCH_SIZE:
+                commit()
+            else:
+                # Пакет записывается после паузы в сканировании
+                if pending_commit[0]:
+                    win.after_cancel(pending_commit[0])
+                pending_commit[0] = win.after(SCAN_COMMIT_DELAY_MS, commit)
+
+        def on_close():
+            commit()
+            win.destroy()
+
+        scan_entry.bind("<Return>", on_scan)
+        scan_entry.focus_set()
+        btn_frame = Frame(win)
+        btn_frame.pack(pady=10)
+        Button(btn_frame, text="Записать сейчас", command=commit).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Закрыть", command=on_close).pack(side=LEFT, padx=5)
+        win.protocol("WM_DELETE_WINDOW", on_close)
+
     def add_cartridge_to_warehouse(self):
         win = Toplevel(self.root)
         win.title("Добавить картридж на склад")
-        win.geometry("500x200")
+        win.geometry("500x260")
         Label(win, text="Модель:").pack(anchor=W, padx=20)
         model_var = StringVar()
         combo = ttk.Combobox(win, textvariable=model_var, values=get_cartridge_models_from_registry_only(), width=50)
@@ -978,25 +3010,32 @@ class CartridgeApp:
         Label(win, text="Серийный номер (опционально):").pack(anchor=W, padx=20)
         sn_entry = Entry(win, width=50)
         sn_entry.pack(fill=X, padx=20, pady=(0, 10))
+        Label(win, text="Площадка:").pack(anchor=W, padx=20)
+        site_var = StringVar(value=self.current_site() or get_default_site())
+        ttk.Combobox(win, textvariable=site_var, values=get_sites(), width=50).pack(fill=X, padx=20, pady=(0, 10))
 
         def save():
             model = model_var.get().strip()
             sn = sn_entry.get().strip()
+            site = site_var.get().strip() or get_default_site()
             if not model:
                 messagebox.showerror("Ошибка", "Укажите модель!")
                 return
+            if register_site(site):
+                save_json(SETTINGS_FILE, settings_data)
             new = {
                 "модель": model,
                 "серийный_номер": sn or "N/A",
                 "статус": "на складе",
+                "площадка": site,
                 "дата_поступления": datetime.now().isoformat(),
                 "остаточный_ресурс": 100,
                 "принтер": ""
             }
-            cartridges_data["картриджи"].append(new)
+            with operation(f"Добавление картриджа {model} (SN: {new['серийный_номер']})"):
+                add_cartridge(new)
             save_json(CARTRIDGES_FILE, cartridges_data)
-            logging.info(f"Добавлен на склад: {model}, SN: {sn}")
-            update_stock_display(self.stock_tree, self.search_var.get())
+            logging.info(f"Добавлен на склад: {model}, SN: {sn}, площадка: {site}")
             win.destroy()
             messagebox.showinfo("Успех", "Картридж добавлен на склад!")
 
@@ -1020,12 +3059,170 @@ class CartridgeApp:
                 rec["остаток_при_установке"]
             ))
 
+    # === Глобальный поиск по моделям, серийным номерам и принтерам ===
+    def show_global_search(self):
+        win = Toplevel(self.root)
+        win.title("Глобальный поиск")
+        win.geometry("900x500")
+        query_var = StringVar()
+        entry = Entry(win, textvariable=query_var, font=("Arial", 12))
+        entry.pack(fill=X, padx=10, pady=10)
+        entry.focus()
+        columns = ("Тип", "Запись", "Подробности")
+        tree = ttk.Treeview(win, columns=columns, show="headings")
+        tree.heading("Тип", text="Тип")
+        tree.column("Тип", width=100)
+        tree.heading("Запись", text="Запись")
+        tree.column("Запись", width=250)
+        tree.heading("Подробности", text="Подробности")
+        tree.column("Подробности", width=500)
+        tree.pack(fill=BOTH, expand=True, padx=10, pady=(0, 10))
+
+        def describe(kind, record):
+            if kind == "модель":
+                return record.get("модель", ""), f"{record.get('тип', '')} {record.get('описание', '')}".strip()
+            if kind == "принтер":
+                details = ", ".join(v for v in (record.get("ip_адрес", ""), record.get("закреплён_за", ""),
+                                                record.get("комментарий", "")) if v)
+                return get_printer_label(record), details
+            details = ", ".join(v for v in (record.get("статус", ""), record.get("принтер", ""),
+                                            record.get("комментарий", "")) if v)
+            return f"{record['модель']} (SN: {record.get('серийный_номер', 'N/A')})", details
+
+        def on_change(*args):
+            tree.delete(*tree.get_children())
+            for kind, record in global_search(query_var.get(), limit=50):
+                title, details = describe(kind, record)
+                tree.insert("", "end", values=(kind, title, details))
+
+        query_var.trace("w", on_change)
+
+    # === Картриджи вне склада: снятие, заправка, списание ===
+    def show_cartridge_lifecycle(self):
+        win = Toplevel(self.root)
+        win.title("Картриджи вне склада")
+        win.geometry("900x500")
+        columns = ("Модель", "Серийный", "Статус", "Принтер", "Заправок")
+        tree = ttk.Treeview(win, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=160)
+        tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        tree.tag_configure("пустой", background="#ffebcc")
+        tree.tag_configure("на заправке", background="#e3f2fd")
+
+        def refresh():
+            tree.delete(*tree.get_children())
+            for c in cartridges_data["картриджи"]:
+                if c["статус"] == "на складе":
+                    continue
+                tree.insert("", "end", iid=c["id"], values=(
+                    c["модель"],
+                    c.get("серийный_номер", "N/A"),
+                    c["статус"],
+                    c.get("принтер", ""),
+                    c.get("количество_заправок", 0)
+                ), tags=(c["статус"],))
+
+        def apply_transition(new_status):
+            selection = tree.selection()
+            if not selection:
+                return
+            errors = []
+            with operation(f"Картриджи → {new_status} ({len(selection)} шт.)"):
+                for iid in selection:
+                    cartridge = cartridges_by_id[iid]
+                    try:
+                        change_cartridge_state(cartridge, new_status)
+                    except ValueError as e:
+                        errors.append(f"{cartridge.get('серийный_номер', 'N/A')}: {e}")
+                offload_terminal_cartridges()
+            save_json(CARTRIDGES_FILE, cartridges_data)
+            refresh()
+            if errors:
+                messagebox.showerror("Ошибка", "\n".join(errors), parent=win)
+
+        refresh()
+        btn_frame = Frame(win)
+        btn_frame.pack(pady=10)
+        Button(btn_frame, text="Снять (пустой)", command=lambda: apply_transition("пустой")).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Отправить на заправку",
+               command=lambda: apply_transition("на заправке")).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Вернуть с заправки на склад",
+               command=lambda: apply_transition("на складе")).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Списать", command=lambda: apply_transition("списан")).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Закрыть", command=win.destroy).pack(side=LEFT, padx=5)
+
+    # === Заказ на закупку ===
+    def show_reorder_plan(self):
+        win = Toplevel(self.root)
+        win.title("Заказ на закупку")
+        win.geometry("1100x550")
+        top = Frame(win)
+        top.pack(fill=X, padx=10, pady=10)
+        Label(top, text="Бюджет:").pack(side=LEFT)
+        budget_var = StringVar(value=str(settings_data.get("закупка", {}).get("бюджет") or ""))
+        Entry(top, textvariable=budget_var, width=12).pack(side=LEFT, padx=5)
+        Label(top, text=f"Площадка: {self.site_var.get()}").pack(side=LEFT, padx=10)
+        total_label = Label(top, text="", font=("Arial", 10, "bold"))
+        total_label.pack(side=RIGHT)
+        columns = ("Поставщик", "Модель", "Остаток", "На заправке", "Расход/нед.", "Срок, дн.", "Целевой запас",
+                   "К заказу", "Цена", "Сумма")
+        tree = ttk.Treeview(win, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=100 if col not in ("Поставщик", "Модель") else 160)
+        tree.tag_configure("orange", background="#ffebcc")
+        tree.pack(fill=BOTH, expand=True, padx=10)
+        plan = []
+
+        def calculate():
+            text = budget_var.get().strip().replace(",", ".")
+            try:
+                budget = float(text) if text else None
+            except ValueError:
+                messagebox.showerror("Ошибка", "Бюджет должен быть числом", parent=win)
+                return
+            plan[:] = get_reorder_plan(budget, self.current_site())
+            tree.delete(*tree.get_children())
+            grand_total = 0
+            for supplier, (rows, total) in group_by_supplier(plan).items():
+                for r in rows:
+                    tree.insert("", "end", values=(
+                        supplier, r["модель"], r["остаток"], r["на_заправке"], r["расход_в_неделю"],
+                        r["срок_поставки_дней"], r["целевой_запас"], r["к_заказу"], r["цена"], r["сумма"]
+                    ), tags=("orange",) if r["урезано_бюджетом"] else ())
+                tree.insert("", "end", values=(supplier, "Итого", "", "", "", "", "", "", "", total))
+                grand_total += total
+            total_label.config(text=f"Всего: {grand_total:.2f}")
+
+        def export(kind):
+            if not plan:
+                return
+            path = filedialog.asksaveasfilename(parent=win, initialdir=DATA_DIR, defaultextension=f".{kind}",
+                                                filetypes=[(kind.upper(), f"*.{kind}")])
+            if not path:
+                return
+            (export_plan_csv if kind == "csv" else render_purchase_order)(plan, path)
+            logging.info(f"Заказ на закупку экспортирован: {path}")
+            messagebox.showinfo("Экспорт", "Заказ на закупку сохранён!", parent=win)
+
+        btn_frame = Frame(win)
+        btn_frame.pack(pady=10)
+        Button(btn_frame, text="Рассчитать", command=calculate, bg="#4CAF50", fg="white").pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Экспорт в CSV", command=lambda: export("csv")).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Экспорт в PDF", command=lambda: export("pdf")).pack(side=LEFT, padx=5)
+        Button(btn_frame, text="Закрыть", command=win.destroy).pack(side=LEFT, padx=5)
+        Label(win, text="Оранжевым отмечены позиции, урезанные из-за бюджета", fg="gray").pack(pady=(0, 10))
+        calculate()
+
     def export_csv(self):
         path = filedialog.asksaveasfilename(initialdir=DATA_DIR, defaultextension=".csv", filetypes=[("CSV", "*.csv")])
         if not path:
             return
-        stock_data = get_stock_with_status()
-        with open(path, 'w', newline='', encoding='utf-8') as f:
+        stock_data = get_stock_with_status(self.current_site())
+        # С BOM Excel открывает файл в UTF-8, а не в системной кодировке
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
             writer = csv.writer(f)
             writer.writerow(["Модель", "Остаток", "Критический уровень", "Статус"])
             for item in stock_data:
@@ -1038,50 +3235,42 @@ class CartridgeApp:
         path = filedialog.asksaveasfilename(initialdir=DATA_DIR, defaultextension=".pdf", filetypes=[("PDF", "*.pdf")])
         if not path:
             return
-        pdf = FPDF()
-        pdf.add_page()
-        font_path = os.path.join(ASSETS_DIR, "ChakraPetch-Regular.ttf")
-        if os.path.exists(font_path):
-            pdf.add_font("ChakraPetch", "", font_path, uni=True)
-            pdf.set_font("ChakraPetch", size=16)
-        else:
-            pdf.set_font("Arial", size=16)
-            logging.warning("Шрифт ChakraPetch-Regular.ttf не найден, используется стандартный шрифт")
-        pdf.cell(200, 10, txt="Signatum — Список картриджей к закупке", ln=True, align='C')
-        if os.path.exists(font_path):
-            pdf.set_font("ChakraPetch", size=12)
-        else:
-            pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt=f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}", ln=True, align='C')
+        subtitle = [f"Площадка: {self.site_var.get()}"]
         if self.search_var.get():
-            pdf.cell(200, 10, txt=f"Фильтр: {self.search_var.get()}", ln=True, align='C')
-        pdf.ln(10)
-        stock_data = get_stock_with_status()
-        if os.path.exists(font_path):
-            pdf.set_font("ChakraPetch", size=10)
-        else:
-            pdf.set_font("Arial", size=10)
-        col_width = 45
-        pdf.cell(col_width, 10, "Модель", border=1)
-        pdf.cell(col_width, 10, "Остаток", border=1)
-        pdf.cell(col_width, 10, "Крит. уровень", border=1)
-        pdf.cell(col_width, 10, "Статус", border=1)
-        pdf.ln()
-        for item in stock_data:
-            if self.search_var.get() and self.search_var.get().lower() not in item["модель"].lower():
-                continue
-            pdf.cell(col_width, 10, item["модель"], border=1)
-            pdf.cell(col_width, 10, str(item["количество"]), border=1)
-            pdf.cell(col_width, 10, str(item["критический_уровень"]), border=1)
-            pdf.cell(col_width, 10, item["статус"], border=1)
-            pdf.ln()
-        pdf.output(path)
+            subtitle.append(f"Фильтр: {self.search_var.get()}")
+        rows = [_stock_row(item) for item in get_stock_with_status(self.current_site())
+                if not self.search_var.get() or self.search_var.get().lower() in item["модель"].lower()]
+        render_stock_report(rows, path, subtitle_lines=subtitle)
         messagebox.showinfo("Экспорт", "Данные экспортированы в PDF!")
 
+    def export_xlsx(self):
+        path = filedialog.asksaveasfilename(initialdir=DATA_DIR, defaultextension=".xlsx",
+                                            filetypes=[("Книга Excel", "*.xlsx")])
+        if not path:
+            return
+        export_workbook(path, self.current_site())
+        messagebox.showinfo("Экспорт", "Данные экспортированы в Excel!")
+
+    def import_xlsx(self):
+        path = filedialog.askopenfilename(initialdir=DATA_DIR, filetypes=[("Книга Excel", "*.xlsx")])
+        if not path:
+            return
+        try:
+            result = import_workbook(path)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile, ET.ParseError) as e:
+            messagebox.showerror("Ошибка", f"Не удалось прочитать книгу: {e}")
+            return
+        errors = result["ошибки"]
+        if errors:
+            more = f"\n… и ещё {len(errors) - IMPORT_ERRORS_SHOWN}" if len(errors) > IMPORT_ERRORS_SHOWN else ""
+            messagebox.showerror("Импорт отменён", "\n".join(errors[:IMPORT_ERRORS_SHOWN]) + more)
+            return
+        messagebox.showinfo("Импорт", f"Добавлено записей: {result['добавлено']}, обновлено: {result['обновлено']}")
+
     def open_global_settings(self):
         win = Toplevel(self.root)
         win.title("Глобальные настройки")
-        win.geometry("500x150")
+        win.geometry("500x520")
         Label(win, text=f"Текущая папка данных:\n{DATA_DIR}", wraplength=480, justify=LEFT).pack(pady=10)
 
         def change_folder():
@@ -1095,9 +3284,50 @@ class CartridgeApp:
 
         Button(win, text="Изменить папку данных", command=change_folder).pack(pady=10)
 
+        Label(win, text="Порядок выдачи картриджей со склада:", font=("Arial", 10, "bold")).pack(anchor=W, padx=10)
+        policy_names = {title: policy for policy, title in ALLOCATION_POLICIES.items()}
+        policy_var = StringVar(value=ALLOCATION_POLICIES[stock_allocator.policy])
+        policy_combo = ttk.Combobox(win, textvariable=policy_var, values=list(policy_names), state="readonly")
+        policy_combo.pack(fill=X, padx=10)
+
+        def change_policy(event=None):
+            set_allocation_policy(policy_names[policy_var.get()])
+            save_json(SETTINGS_FILE, settings_data)
+            logging.info(f"Порядок выдачи со склада: {policy_var.get()}")
+
+        policy_combo.bind("<<ComboboxSelected>>", change_policy)
+
+        Label(win, text="Определение типа картриджа (по шаблону в строке, регулярные выражения):",
+              font=("Arial", 10, "bold")).pack(anchor=W, padx=10, pady=(10, 0))
+        Label(win, text="Сначала проверяется поле «Тип» модели, затем её название", fg="gray").pack(anchor=W, padx=10)
+        rule_texts = {}
+        for cartridge_type, patterns in get_cartridge_type_rules().items():
+            Label(win, text=f"{cartridge_type}:").pack(anchor=W, padx=10)
+            text = Text(win, height=4, width=50)
+            text.insert("1.0", "\n".join(patterns))
+            text.pack(fill=X, padx=10)
+            rule_texts[cartridge_type] = text
+
+        def save_rules():
+            rules = {t: [line.strip() for line in text.get("1.0", END).splitlines() if line.strip()]
+                     for t, text in rule_texts.items()}
+            try:
+                set_cartridge_type_rules(rules)
+            except ValueError as e:
+                messagebox.showerror("Ошибка", f"Правила не сохранены: {e}", parent=win)
+                return
+            save_json(SETTINGS_FILE, settings_data)
+            logging.info("Изменены правила определения типа картриджей")
+            if hasattr(self, "status_tree") and self.status_tree.winfo_exists():
+                self._fill_printer_status_report()
+            messagebox.showinfo("Сохранено", "Правила сохранены", parent=win)
+
+        Button(win, text="Сохранить правила", command=save_rules).pack(pady=10)
+
 
 # === Запуск ===
 if __name__ == "__main__":
+    startup()
     root = Tk()
     app = CartridgeApp(root)
     root.mainloop()
\ No newline at end of file
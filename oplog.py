@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+
+
+class OperationLog:
+    """Журнал операций в формате JSON Lines: по строке на операцию, строки идут по возрастанию "отметка".
+
+    Выборка по интервалу времени ищет начало двоичным поиском по смещениям в файле
+    и читает только нужный участок, не загружая журнал целиком.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def append(self, user, description, changes, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        entry = {
+            "отметка": timestamp,
+            "время": datetime.fromtimestamp(timestamp).isoformat(timespec="seconds"),
+            "пользователь": user,
+            "операция": description,
+            "изменения": changes
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    def query(self, start=None, end=None, limit=None):
+        """Записи с start <= отметка < end (границы — timestamp или datetime; None — без границы)."""
+        if not os.path.exists(self.path):
+            return []
+        start, end = to_timestamp(start), to_timestamp(end)
+        result = []
+        with open(self.path, 'rb') as f:
+            f.seek(first_offset_at(f, start) if start is not None else 0)
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if end is not None and entry["отметка"] >= end:
+                    break
+                result.append(entry)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def tail(self, limit=200):
+        """Последние limit записей (новые в конце)."""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in deque(f, maxlen=limit) if line.strip()]
+
+
+def first_offset_at(f, timestamp):
+    """Смещение первой строки файла (открытого в режиме 'rb') с отметкой >= timestamp."""
+    f.seek(0, os.SEEK_END)
+    lo, hi = 0, f.tell()
+    # Инвариант: строки, начинающиеся раньше lo, старше timestamp; строка, начинающаяся с hi и дальше, — нет
+    while lo < hi:
+        mid = (lo + hi) // 2
+        line_start, entry = _line_at(f, mid)
+        if entry is None or line_start >= hi:
+            hi = mid
+        elif entry["отметка"] < timestamp:
+            lo = f.tell()
+        else:
+            hi = line_start
+    return lo
+
+
+def last_entry_at(f, timestamp):
+    """Последняя запись файла (открытого в режиме 'rb') с отметкой <= timestamp или None."""
+    f.seek(0, os.SEEK_END)
+    lo, hi = 0, f.tell()
+    best = None
+    # Как в first_offset_at; последняя подходящая строка — та, что заканчивается в итоговой точке lo
+    while lo < hi:
+        mid = (lo + hi) // 2
+        line_start, entry = _line_at(f, mid)
+        if entry is None or line_start >= hi:
+            hi = mid
+        elif entry["отметка"] <= timestamp:
+            best = entry
+            lo = f.tell()
+        else:
+            hi = line_start
+    return best
+
+
+def _line_at(f, offset):
+    """Первая полная строка, начинающаяся не раньше offset: (смещение, запись) или (смещение, None) в конце файла."""
+    f.seek(offset)
+    if offset > 0:
+        f.seek(offset - 1)
+        f.readline()  # дочитываем строку, внутри которой оказались
+    line_start = f.tell()
+    line = f.readline()
+    while line and not line.strip():
+        line_start = f.tell()
+        line = f.readline()
+    return line_start, (json.loads(line) if line else None)
+
+
+def to_timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
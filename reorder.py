@@ -0,0 +1,193 @@
+import argparse
+import csv
+import heapq
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+from config import resolve_data_dir
+
+
+# Параметры планирования по умолчанию; переопределяются в settings.json, раздел "закупка"
+REORDER_DEFAULTS = {
+    "период_анализа_дней": 180,  # за сколько дней истории считается расход
+    "срок_поставки_дней": 14,  # если у модели не задан свой
+    "период_пересмотра_дней": 7,  # как часто формируется заказ (ночной запуск — хоть каждый день)
+    "уровень_сервиса": 0.95,  # вероятность не остаться без картриджа за время поставки
+    "бюджет": None
+}
+NO_SUPPLIER = "Поставщик не указан"
+
+
+def weekly_consumption(history_records, models, days, now=None):
+    """Установки по моделям, разложенные по неделям анализируемого периода: модель -> [кол-во за неделю]."""
+    now = now or datetime.now()
+    start = now - timedelta(days=days)
+    weeks = max(1, math.ceil(days / 7))
+    columns = {model: [0] * weeks for model in models}
+    for rec in history_records:
+        series = columns.get(rec.get("модель_картриджа"))
+        if series is None:
+            continue
+        try:
+            installed = datetime.fromisoformat(rec["дата_установки"])
+        except (KeyError, ValueError):
+            continue
+        if start <= installed <= now:
+            series[min(weeks - 1, (installed - start).days // 7)] += 1
+    return columns
+
+
+def plan_orders(models, stock, pipeline, history_records, critical_levels, settings=None, budget=None, now=None,
+                consumption=None):
+    """Считает заказ по всем моделям сразу.
+
+    models — записи реестра (модель, поставщик, цена, срок_поставки_дней, кратность),
+    stock / pipeline — остатки на складе и картриджи на заправке по моделям,
+    critical_levels — модель -> критический уровень (нижняя граница целевого запаса),
+    consumption — готовый недельный расход в виде weekly_consumption (тогда history_records не читается).
+
+    Целевой запас = расход за (срок поставки + период пересмотра) + страховой запас по разбросу
+    недельного расхода. Если заказ не укладывается в бюджет, единицы распределяются по одной
+    туда, где запаса хватает на меньшее число дней.
+    Возвращает список строк плана (по строке на модель).
+    """
+    cfg = {**REORDER_DEFAULTS, **(settings or {})}
+    if budget is None:
+        budget = cfg["бюджет"]
+    names = [m["модель"] for m in models]
+    series = consumption if consumption is not None else \
+        weekly_consumption(history_records, names, cfg["период_анализа_дней"], now)
+    z = NormalDist().inv_cdf(cfg["уровень_сервиса"])
+    review = cfg["период_пересмотра_дней"]
+
+    # Столбцы расчёта: по элементу на модель
+    lead = [float(m.get("срок_поставки_дней") or cfg["срок_поставки_дней"]) for m in models]
+    price = [float(m.get("цена") or 0) for m in models]
+    pack = [max(1, int(m.get("кратность") or 1)) for m in models]
+    position = [stock.get(n, 0) + pipeline.get(n, 0) for n in names]
+    weekly_mean = [sum(series[n]) / len(series[n]) for n in names]
+    weekly_std = [_std(series[n], mean) for n, mean in zip(names, weekly_mean)]
+    daily = [mean / 7 for mean in weekly_mean]
+    safety = [z * std * math.sqrt((lt + review) / 7) for std, lt in zip(weekly_std, lead)]
+    target = [max(critical_levels.get(n, 0), math.ceil(d * (lt + review) + s))
+              for n, d, lt, s in zip(names, daily, lead, safety)]
+    need = [_round_up(max(0, t - pos), p) for t, pos, p in zip(target, position, pack)]
+
+    cost = sum(q * c for q, c in zip(need, price))
+    order = need
+    if budget is not None and cost > budget:
+        order = _fit_budget(need, position, daily, price, pack, budget)
+
+    plan = []
+    for i, name in enumerate(names):
+        plan.append({
+            "модель": name,
+            "поставщик": models[i].get("поставщик") or NO_SUPPLIER,
+            "остаток": stock.get(name, 0),
+            "на_заправке": pipeline.get(name, 0),
+            "расход_в_неделю": round(weekly_mean[i], 2),
+            "срок_поставки_дней": lead[i],
+            "целевой_запас": target[i],
+            "потребность": need[i],
+            "к_заказу": order[i],
+            "цена": price[i],
+            "сумма": round(order[i] * price[i], 2),
+            "хватит_дней": round(position[i] / daily[i]) if daily[i] else None,
+            "урезано_бюджетом": order[i] < need[i]
+        })
+    return plan
+
+
+def _std(values, mean):
+    if len(values) < 2:
+        return 0.0
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+
+def _round_up(qty, pack):
+    return -(-qty // pack) * pack
+
+
+def _fit_budget(need, position, daily, price, pack, budget):
+    """Распределяет бюджет упаковками: каждая следующая уходит модели с наименьшим запасом в днях."""
+    order = [0] * len(need)
+    heap = []
+    for i, qty in enumerate(need):
+        if qty > 0:
+            heapq.heappush(heap, (_cover_days(position[i], daily[i]), i))
+    left = budget
+    while heap:
+        _, i = heapq.heappop(heap)
+        pack_cost = pack[i] * price[i]
+        if pack_cost > left:
+            continue  # эта упаковка не влезает, но более дешёвые других моделей ещё могут
+        order[i] += pack[i]
+        left -= pack_cost
+        if order[i] < need[i]:
+            heapq.heappush(heap, (_cover_days(position[i] + order[i], daily[i]), i))
+    return order
+
+
+def _cover_days(qty, daily):
+    # Модели без расхода, но ниже критического уровня, идут после тех, где расход есть
+    return qty / daily if daily else float("inf")
+
+
+def group_by_supplier(plan):
+    """Строки с ненулевым заказом, сгруппированные по поставщику: {поставщик: (строки, сумма)}."""
+    groups = {}
+    for row in plan:
+        if row["к_заказу"] > 0:
+            groups.setdefault(row["поставщик"], []).append(row)
+    return {supplier: (rows, round(sum(r["сумма"] for r in rows), 2)) for supplier, rows in sorted(groups.items())}
+
+
+def export_plan_csv(plan, path):
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Поставщик", "Модель", "Остаток", "На заправке", "Расход в неделю", "Срок поставки, дн.",
+                         "Целевой запас", "К заказу", "Цена", "Сумма", "Урезано бюджетом"])
+        for supplier, (rows, total) in group_by_supplier(plan).items():
+            for r in rows:
+                writer.writerow([supplier, r["модель"], r["остаток"], r["на_заправке"], r["расход_в_неделю"],
+                                 r["срок_поставки_дней"], r["целевой_запас"], r["к_заказу"], r["цена"], r["сумма"],
+                                 "да" if r["урезано_бюджетом"] else ""])
+            writer.writerow([supplier, "Итого", "", "", "", "", "", "", "", total, ""])
+
+
+# === Запуск из командной строки (ночной пакетный расчёт) ===
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Signatum: расчёт заказа картриджей")
+    parser.add_argument("--data-dir", help="папка данных Signatum (по умолчанию — SIGNATUM_DATA_DIR или config.json)")
+    parser.add_argument("--budget", type=float, help="бюджет закупки")
+    parser.add_argument("--site", help="площадка (по умолчанию — все)")
+    parser.add_argument("--csv", help="куда сохранить заказ в CSV")
+    parser.add_argument("--pdf", help="куда сохранить заказ в PDF")
+    args = parser.parse_args(argv)
+    data_dir = resolve_data_dir(parser, args)
+    os.environ["SIGNATUM_DATA_DIR"] = data_dir
+    import main as app  # данные только читаются; запуск программы (startup) не выполняется
+    from reports import render_purchase_order
+
+    plan = app.get_reorder_plan(args.budget, args.site)
+    groups = group_by_supplier(plan)
+    for supplier, (rows, total) in groups.items():
+        print(f"{supplier}: {sum(r['к_заказу'] for r in rows)} шт. на {total:.2f}")
+        for r in rows:
+            mark = " (урезано бюджетом)" if r["урезано_бюджетом"] else ""
+            print(f"  {r['модель']}: {r['к_заказу']} × {r['цена']:.2f} = {r['сумма']:.2f}{mark}")
+    if not groups:
+        print("Заказывать нечего")
+    if args.csv:
+        export_plan_csv(plan, args.csv)
+    if args.pdf:
+        render_purchase_order(plan, args.pdf)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
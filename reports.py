@@ -0,0 +1,183 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from fpdf import FPDF
+
+from config import resolve_data_dir
+from reorder import group_by_supplier
+
+# Этот модуль не импортирует main.py: рабочие процессы пакетного запуска получают только готовые данные
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "font", "ChakraPetch-Regular.ttf")
+REPORT_KINDS = ("остатки", "принтеры", "закупка")
+MANIFEST_FILENAME = "manifest.json"
+SNAPSHOT_FILENAME = "snapshot.json"
+
+
+# === Отрисовка PDF ===
+
+def _new_pdf(title, subtitle_lines=()):
+    pdf = FPDF()
+    pdf.add_page()
+    font = "ChakraPetch" if os.path.exists(FONT_PATH) else "Arial"
+    if font == "ChakraPetch":
+        pdf.add_font("ChakraPetch", "", FONT_PATH, uni=True)
+    else:
+        logging.warning("Шрифт ChakraPetch-Regular.ttf не найден, используется стандартный шрифт")
+    pdf.set_font(font, size=16)
+    pdf.cell(190, 10, txt=title, ln=True, align='C')
+    pdf.set_font(font, size=12)
+    pdf.cell(190, 10, txt=f"Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}", ln=True, align='C')
+    for line in subtitle_lines:
+        pdf.cell(190, 10, txt=line, ln=True, align='C')
+    pdf.ln(10)
+    return pdf, font
+
+
+def _table(pdf, font, headers, widths, rows, size=10):
+    pdf.set_font(font, size=size)
+    for header, width in zip(headers, widths):
+        pdf.cell(width, 10, header, border=1)
+    pdf.ln()
+    for row in rows:
+        for value, width in zip(row, widths):
+            pdf.cell(width, 10, str(value), border=1)
+        pdf.ln()
+
+
+def render_stock_report(rows, path, title="Signatum — Список картриджей к закупке", subtitle_lines=()):
+    """rows — [(модель, остаток, критический уровень, статус)]."""
+    pdf, font = _new_pdf(title, subtitle_lines)
+    _table(pdf, font, ("Модель", "Остаток", "Крит. уровень", "Статус"), (45, 45, 45, 45), rows)
+    pdf.output(path)
+
+
+def render_printer_status_report(rows, path, title="Signatum — Статус принтеров", subtitle_lines=()):
+    """rows — строки отчёта "Статус принтеров" без цвета: (модель, площадка, тип, картридж 1-4, статус, тонер)."""
+    pdf, font = _new_pdf(title, subtitle_lines)
+    pdf.set_auto_page_break(True, margin=10)
+    headers = ("Модель", "Площадка", "Тип", "Картр. 1", "Картр. 2", "Картр. 3", "Картр. 4", "Статус", "Тонер")
+    widths = (30, 22, 20, 20, 20, 20, 20, 20, 18)
+    # Значки статусов из интерфейса в шрифт PDF не входят
+    clean = [[re.sub(r"[^\w\s().,%≈/-]", "", str(v)).strip() for v in row] for row in rows]
+    _table(pdf, font, headers, widths, clean, size=7)
+    pdf.output(path)
+
+
+def render_purchase_order(plan, path, title="Signatum — Заказ на закупку картриджей"):
+    """plan — строки reorder.plan_orders; позиции группируются по поставщикам с итогами."""
+    pdf, font = _new_pdf(title)
+    grand_total = 0
+    widths = (80, 25, 40, 45)
+    for supplier, (rows, total) in group_by_supplier(plan).items():
+        pdf.set_font(font, size=12)
+        pdf.cell(190, 10, txt=supplier, ln=True)
+        _table(pdf, font, ("Модель", "Кол-во", "Цена", "Сумма"), widths,
+               [(r["модель"], r["к_заказу"], f"{r['цена']:.2f}", f"{r['сумма']:.2f}") for r in rows])
+        pdf.cell(sum(widths[:3]), 10, "Итого по поставщику", border=1)
+        pdf.cell(widths[3], 10, f"{total:.2f}", border=1)
+        pdf.ln(15)
+        grand_total += total
+    pdf.set_font(font, size=12)
+    pdf.cell(190, 10, txt=f"Всего к оплате: {grand_total:.2f}", ln=True)
+    pdf.output(path)
+
+
+# === Пакетный запуск в пуле процессов ===
+
+_snapshot = None  # данные, загруженные рабочим процессом один раз при старте
+
+
+def _init_worker(snapshot_path):
+    global _snapshot
+    with open(snapshot_path, 'r', encoding='utf-8') as f:
+        _snapshot = json.load(f)
+
+
+def _render_job(kind, site, path):
+    start = time.perf_counter()
+    data = _snapshot["площадки"][site]
+    subtitle = [f"Площадка: {site}"]
+    if kind == "остатки":
+        render_stock_report(data["остатки"], path, subtitle_lines=subtitle)
+    elif kind == "принтеры":
+        render_printer_status_report(data["принтеры"], path, subtitle_lines=subtitle)
+    else:
+        render_purchase_order(data["закупка"], path, title=f"Signatum — Заказ на закупку ({site})")
+    return {"вид": kind, "площадка": site, "файл": os.path.basename(path), "байт": os.path.getsize(path),
+            "секунд": round(time.perf_counter() - start, 3)}
+
+
+def report_filename(kind, site):
+    safe_site = re.sub(r"[^\w-]+", "_", site)
+    return f"{kind}_{safe_site}.pdf"
+
+
+def run_batch(snapshot, output_dir, kinds=REPORT_KINDS, workers=None):
+    """Строит отчёты всех видов kinds для всех площадок снимка в пуле из workers процессов.
+
+    snapshot — {"создан", "площадки": {площадка: {"остатки", "принтеры", "закупка"}}}. Снимок один раз
+    записывается в output_dir и читается каждым рабочим процессом при старте. Результаты
+    и ошибки перечисляются в manifest.json. Возвращает манифест.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    snapshot_path = os.path.join(output_dir, SNAPSHOT_FILENAME)
+    with open(snapshot_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    jobs = [(kind, site, os.path.join(output_dir, report_filename(kind, site)))
+            for site in sorted(snapshot["площадки"]) for kind in kinds]
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    reports, errors = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot_path,)) as pool:
+        futures = {pool.submit(_render_job, *job): job for job in jobs}
+        for future in as_completed(futures):
+            kind, site, path = futures[future]
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                errors.append({"вид": kind, "площадка": site, "файл": os.path.basename(path), "ошибка": str(e)})
+    reports.sort(key=lambda r: r["файл"])
+    manifest = {
+        "создан": datetime.now().isoformat(timespec="seconds"),
+        "данные_на": snapshot.get("создан"),
+        "процессов": workers,
+        "секунд": round(time.perf_counter() - start, 3),
+        "отчёты": reports,
+        "ошибки": errors
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+# === Запуск из командной строки (ночной пакет отчётов) ===
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Signatum: пакетное построение PDF-отчётов по площадкам")
+    parser.add_argument("output_dir", help="папка для отчётов и manifest.json")
+    parser.add_argument("--data-dir", help="папка данных Signatum (по умолчанию — SIGNATUM_DATA_DIR или config.json)")
+    parser.add_argument("--workers", type=int, help="число процессов (по умолчанию — по числу ядер)")
+    parser.add_argument("--kinds", nargs="+", choices=REPORT_KINDS, default=list(REPORT_KINDS))
+    parser.add_argument("--budget", type=float, help="бюджет для списков закупки")
+    args = parser.parse_args(argv)
+    data_dir = resolve_data_dir(parser, args)
+    os.environ["SIGNATUM_DATA_DIR"] = data_dir
+    import main as app  # только в главном процессе и только чтение: рабочие получают готовый снимок
+
+    manifest = run_batch(app.build_report_snapshot(args.budget), args.output_dir, args.kinds, args.workers)
+    print(f"Отчётов: {len(manifest['отчёты'])}, ошибок: {len(manifest['ошибки'])}, "
+          f"{manifest['секунд']} с на {manifest['процессов']} процессах")
+    for error in manifest["ошибки"]:
+        print(f"  {error['файл']}: {error['ошибка']}")
+    return 1 if manifest["ошибки"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import re
+import heapq
+from bisect import bisect_left
+
+# Токены: буквы/цифры/подчёркивание, в нижнем регистре
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Списки триграмм длиннее этого порога при нечётком поиске не просматриваются
+FUZZY_SCAN_LIMIT = 5000
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _last_row(a, b, max_dist):
+    """Последняя строка таблицы Дамерау-Левенштейна для a и b: в столбце j — расстояние от a до b[:j]
+    (больше max_dist — как max_dist + 1). None, если все значения строки на каком-то шаге превысили max_dist.
+    Считается только полоса |i - j| <= max_dist: за её пределами расстояние заведомо больше."""
+    over = max_dist + 1
+    prev2 = None
+    prev = [min(j, over) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        cur = [min(i, over)] + [over] * len(b)
+        for j in range(max(1, i - max_dist), min(len(b), i + max_dist) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_dist:
+            return None
+        prev2, prev = prev, cur
+    return prev
+
+
+def bounded_edit_distance(a, b, max_dist):
+    """Расстояние Дамерау-Левенштейна (перестановка соседних символов — одна правка) с отсечением:
+    возвращает max_dist + 1, если расстояние больше max_dist."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    row = _last_row(a, b, max_dist)
+    return max_dist + 1 if row is None else min(row[-1], max_dist + 1)
+
+
+def bounded_prefix_distance(term, token, max_dist):
+    """Наименьшее расстояние bounded_edit_distance между term и началом token любой длины
+    (то есть правка может прийтись и на последние символы term, и на место обрезки token).
+    Все длины начала берутся из одной таблицы: её столбцы для token[:j] не зависят от остатка token."""
+    if max_dist == 1:
+        return _one_edit_prefix_distance(term, token)
+    row = _last_row(term, token[:len(term) + max_dist], max_dist)
+    if row is None:
+        return max_dist + 1
+    return min(min(row[max(0, len(term) - max_dist):]), max_dist + 1)
+
+
+def _one_edit_prefix_distance(term, token):
+    """bounded_prefix_distance для max_dist = 1 без таблицы: правка может стоять на первом несовпадении."""
+    k = 0
+    n = min(len(term), len(token))
+    while k < n and term[k] == token[k]:
+        k += 1
+    if k == len(term):
+        return 0
+    rest = term[k + 1:]
+    if (token.startswith(rest, k + 1)  # замена
+            or token.startswith(rest, k)  # лишняя буква в term
+            or token.startswith(term[k:], k + 1)  # пропущенная буква
+            or (len(term) > k + 1 and token[k:k + 2] == term[k + 1] + term[k] and
+                token.startswith(term[k + 2:], k + 2))):  # перестановка соседних
+        return 1
+    return 2
+
+
+class SearchIndex:
+    """Инкрементальный поисковый индекс: точное совпадение, префиксы и нечёткий поиск по триграммам."""
+
+    def __init__(self):
+        self.docs = {}  # doc_id -> (токены, payload)
+        self.postings = {}  # токен -> множество doc_id
+        self.trigram_index = {}  # триграмма -> множество токенов
+        self._vocabulary = []  # отсортированные токены для префиксного поиска
+        self._new_tokens = []  # токены, ещё не влитые в _vocabulary
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id, text, payload=None):
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        tokens = set(tokenize(text))
+        self.docs[doc_id] = (tokens, payload)
+        for token in tokens:
+            docs = self.postings.get(token)
+            if docs is None:
+                self.postings[token] = {doc_id}
+                self._new_tokens.append(token)
+                for tri in trigrams(token):
+                    self.trigram_index.setdefault(tri, set()).add(token)
+            else:
+                docs.add(doc_id)
+
+    def remove(self, doc_id):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        for token in entry[0]:
+            docs = self.postings[token]
+            docs.discard(doc_id)
+            if not docs:
+                # Из _vocabulary токен уходит при следующем слиянии
+                del self.postings[token]
+                for tri in trigrams(token):
+                    tokens = self.trigram_index[tri]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.trigram_index[tri]
+
+    def clear(self):
+        self.docs.clear()
+        self.postings.clear()
+        self.trigram_index.clear()
+        self._vocabulary.clear()
+        self._new_tokens.clear()
+
+    def prepare(self):
+        """Готовит индекс к поиску после массовой загрузки (сортирует словарь заранее)."""
+        self._sorted_vocabulary()
+
+    def _sorted_vocabulary(self):
+        if self._new_tokens or len(self._vocabulary) > 2 * len(self.postings) + 64:
+            # Сортировка отсортированного списка с небольшим хвостом почти линейна
+            merged = set(self._vocabulary)
+            merged.update(self._new_tokens)
+            self._vocabulary = sorted(t for t in merged if t in self.postings)
+            self._new_tokens = []
+        return self._vocabulary
+
+    def _prefix_tokens(self, prefix, limit):
+        """Токены, начинающиеся с prefix (не больше limit), и признак усечения списка."""
+        vocabulary = self._sorted_vocabulary()
+        result = {}
+        for i in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            token = vocabulary[i]
+            if not token.startswith(prefix):
+                break
+            if len(result) >= limit:
+                return result, True
+            if token in self.postings:
+                result[token] = 3.0 if token == prefix else 2.0
+        return result, False
+
+    def _fuzzy_tokens(self, term):
+        """Токены словаря, начало которых отличается от term на одну правку."""
+        query_tris = trigrams(term)
+        # Перестановка соседних букв портит до четырёх триграмм, и ещё одну — конец слова
+        # при совпадении по префиксу
+        min_shared = len(query_tris) - 5
+        if min_shared <= 0:
+            candidates = self._short_term_candidates(term)
+        else:
+            # Кандидат обязан содержать одну из шести самых редких триграмм запроса (испорчено не больше пяти);
+            # прочие списки просматриваются, только если они короче FUZZY_SCAN_LIMIT, а непросмотренные
+            # считаются совпавшими
+            rare = sorted(query_tris, key=lambda tri: len(self.trigram_index.get(tri, ())))
+            scanned = [tri for tri in rare if len(self.trigram_index.get(tri, ())) <= FUZZY_SCAN_LIMIT]
+            if len(scanned) < 6:
+                scanned = rare[:6]
+            assumed = len(query_tris) - len(scanned)
+            counts = {}
+            for tri in scanned:
+                for token in self.trigram_index.get(tri, ()):
+                    counts[token] = counts.get(token, 0) + 1
+            candidates = [token for token, shared in counts.items() if shared + assumed >= min_shared]
+        return {token: 0.75 for token in candidates if bounded_prefix_distance(term, token, 1) <= 1}
+
+    def _short_term_candidates(self, term):
+        """Кандидаты для короткого term, у которого триграммы ничего не гарантируют. При одной правке
+        первая или вторая буква токена — это term[0] или term[1]; такие токены дают триграммы начала
+        слова "  x" и " yx"."""
+        letters = {term[0], term[1]}
+        candidates = set()
+        for tri, tokens in self.trigram_index.items():
+            if tri[0] == " " and tri[2] in letters:
+                candidates.update(tokens)
+        return candidates
+
+    def _term_tokens(self, term, prefix_limit):
+        tokens, truncated = self._prefix_tokens(term, prefix_limit)
+        # Нечёткий поиск нужен, только если нет точных и префиксных совпадений
+        if len(term) >= 3 and not tokens:
+            tokens = self._fuzzy_tokens(term)
+        return tokens, truncated
+
+    @staticmethod
+    def _doc_term_score(term, tokens, doc_tokens):
+        best = None
+        for t in doc_tokens:
+            score = tokens.get(t)
+            if score is None and t.startswith(term):
+                score = 2.0  # префиксное совпадение за пределами усечённого списка
+            if score is not None and (best is None or score > best):
+                best = score
+        return best
+
+    def search(self, query, limit=20, prefix_limit=500):
+        """Возвращает до limit пар (score, payload); все слова запроса должны совпасть."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        per_term = []
+        for term in terms:
+            tokens, truncated = self._term_tokens(term, prefix_limit)
+            if not tokens:
+                return []
+            size = float("inf") if truncated else sum(len(self.postings[t]) for t in tokens)
+            per_term.append((size, term, tokens))
+        # Ведущим берём слово с наименьшим числом документов, остальные проверяем по токенам документа
+        per_term.sort(key=lambda item: item[0])
+        driver = per_term[0][2]
+        others = [(term, tokens) for _, term, tokens in per_term[1:]]
+        others_max = sum(max(tokens.values()) for _, tokens in others)
+        heap = []
+        seen = set()
+        for token, score in sorted(driver.items(), key=lambda item: -item[1]):
+            bound = score + others_max
+            if len(heap) >= limit and heap[0][0] >= bound:
+                break
+            for doc_id in self.postings[token]:
+                if len(heap) >= limit and heap[0][0] >= bound:
+                    break
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                doc_tokens = self.docs[doc_id][0]
+                total = score
+                for term, tokens in others:
+                    best = self._doc_term_score(term, tokens, doc_tokens)
+                    if best is None:
+                        break
+                    total += best
+                else:
+                    entry = (total, len(seen), doc_id)
+                    if len(heap) < limit:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+        heap.sort(reverse=True)
+        return [(score, self.docs[doc_id][1]) for score, _, doc_id in heap]
@@ -0,0 +1,436 @@
+"""Опрос уровней расходных материалов принтеров по SNMP (Printer-MIB) и локальный симулятор принтеров.
+
+Запуск симулятора:   python snmp_poller.py simulate --count 50 --base-port 16100
+Опрос симулятора:    python snmp_poller.py poll 127.0.0.1:16100 127.0.0.1:16101
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+# Printer-MIB, таблица prtMarkerSuppliesTable (индекс устройства 1, номер расходника N)
+SUPPLY_DESCRIPTION_OID = "1.3.6.1.2.1.43.11.1.1.6.1.{}"
+SUPPLY_MAX_CAPACITY_OID = "1.3.6.1.2.1.43.11.1.1.8.1.{}"
+SUPPLY_LEVEL_OID = "1.3.6.1.2.1.43.11.1.1.9.1.{}"
+
+SNMP_PORT = 161
+SNMP_V2C = 1
+
+# Типы BER/SNMP
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+GET_REQUEST = 0xA0
+GET_RESPONSE = 0xA2
+
+_request_ids = itertools.count(random.randint(1, 1 << 20))
+
+
+class SnmpError(Exception):
+    pass
+
+
+# === Кодирование BER ===
+
+def _encode_length(length):
+    if length < 0x80:
+        return bytes([length])
+    body = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(body)]) + body
+
+
+def _tlv(tag, body):
+    return bytes([tag]) + _encode_length(len(body)) + body
+
+
+def _encode_integer(value, tag=INTEGER):
+    length = max(1, (value.bit_length() + 8) // 8)
+    return _tlv(tag, value.to_bytes(length, "big", signed=True))
+
+
+def _encode_oid(oid):
+    parts = [int(p) for p in oid.split(".")]
+    body = bytearray()
+    # Первые две дуги кодируются одним подыдентификатором 40 * X + Y (для X = 2 он может быть больше 127)
+    for part in [40 * parts[0] + parts[1]] + parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        body.extend(reversed(chunk))
+    return _tlv(OBJECT_IDENTIFIER, bytes(body))
+
+
+def _encode_value(value):
+    if value is None:
+        return _tlv(NULL, b"")
+    if isinstance(value, int):
+        return _encode_integer(value)
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return _tlv(OCTET_STRING, value)
+
+
+def encode_message(community, pdu_type, request_id, varbinds, error_status=0, error_index=0):
+    """Собирает SNMP-сообщение; varbinds — список пар (oid, значение или None)."""
+    bindings = b"".join(_tlv(SEQUENCE, _encode_oid(oid) + _encode_value(value)) for oid, value in varbinds)
+    pdu = _tlv(pdu_type, _encode_integer(request_id) + _encode_integer(error_status) +
+               _encode_integer(error_index) + _tlv(SEQUENCE, bindings))
+    return _tlv(SEQUENCE, _encode_integer(SNMP_V2C) + _encode_value(community) + pdu)
+
+
+# === Декодирование BER ===
+
+def _read_tlv(data, pos):
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        count = length & 0x7F
+        length = int.from_bytes(data[pos:pos + count], "big")
+        pos += count
+    end = pos + length
+    if end > len(data):
+        raise SnmpError("Обрезанный пакет")
+    return tag, data[pos:end], end
+
+
+def _decode_oid(body):
+    parts = []
+    value = 0
+    for byte in body:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            if not parts:
+                first = min(value // 40, 2)
+                parts = [first, value - 40 * first]
+            else:
+                parts.append(value)
+            value = 0
+    return ".".join(map(str, parts))
+
+
+def _decode_value(tag, body):
+    if tag == INTEGER:
+        return int.from_bytes(body, "big", signed=True)
+    if tag in (COUNTER32, GAUGE32, TIMETICKS):
+        return int.from_bytes(body, "big")
+    if tag == OCTET_STRING:
+        return body.decode("utf-8", errors="replace")
+    if tag == OBJECT_IDENTIFIER:
+        return _decode_oid(body)
+    return None  # NULL, noSuchObject, noSuchInstance, endOfMibView
+
+
+def _children(body):
+    pos = 0
+    while pos < len(body):
+        tag, value, pos = _read_tlv(body, pos)
+        yield tag, value
+
+
+def decode_message(data):
+    """Разбирает SNMP-сообщение. Возвращает (community, тип PDU, request_id, error_status, [(oid, значение)])."""
+    tag, message, _ = _read_tlv(data, 0)
+    if tag != SEQUENCE:
+        raise SnmpError("Ожидалась последовательность SNMP-сообщения")
+    fields = list(_children(message))
+    if len(fields) != 3:
+        raise SnmpError("Некорректное SNMP-сообщение")
+    community = fields[1][1].decode("utf-8", errors="replace")
+    pdu_type, pdu = fields[2]
+    pdu_fields = list(_children(pdu))
+    request_id = _decode_value(INTEGER, pdu_fields[0][1])
+    error_status = _decode_value(INTEGER, pdu_fields[1][1])
+    varbinds = []
+    for _, binding in _children(pdu_fields[3][1]):
+        (_, oid), (value_tag, value) = list(_children(binding))
+        varbinds.append((_decode_oid(oid), _decode_value(value_tag, value)))
+    return community, pdu_type, request_id, error_status, varbinds
+
+
+# === Клиент ===
+
+def parse_address(address, default_port=SNMP_PORT):
+    """'10.0.0.5', '127.0.0.1:16100', 'fe80::1' или '[fe80::1]:16100' -> (хост, порт)."""
+    address = address.strip()
+    if address.startswith("["):
+        host, bracket, rest = address[1:].partition("]")
+        if not bracket or (rest and not rest.startswith(":")):
+            raise ValueError(f"Некорректный адрес: {address}")
+        port = rest[1:]
+    elif address.count(":") > 1:
+        host, port = address, ""  # IPv6 без скобок — порт указать нельзя
+    else:
+        host, _, port = address.partition(":")
+    return host, int(port) if port else default_port
+
+
+class _RequestProtocol(asyncio.DatagramProtocol):
+    def __init__(self, request_id, future):
+        self.request_id = request_id
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        try:
+            _, pdu_type, request_id, error_status, varbinds = decode_message(data)
+        except (SnmpError, IndexError, ValueError):
+            return
+        if pdu_type != GET_RESPONSE or request_id != self.request_id or self.future.done():
+            return
+        if error_status:
+            self.future.set_exception(SnmpError(f"Ошибка SNMP агента: {error_status}"))
+        else:
+            self.future.set_result(dict(varbinds))
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def snmp_get(address, oids, community="public", timeout=2.0, retries=1):
+    """Выполняет SNMP GET и возвращает {oid: значение}."""
+    loop = asyncio.get_running_loop()
+    host, port = parse_address(address)
+    last_error = None
+    for _ in range(retries + 1):
+        request_id = next(_request_ids) & 0x7FFFFFFF
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _RequestProtocol(request_id, future), remote_addr=(host, port))
+        try:
+            transport.sendto(encode_message(community, GET_REQUEST, request_id, [(oid, None) for oid in oids]))
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, OSError, SnmpError) as e:
+            last_error = e
+        finally:
+            transport.close()
+    raise SnmpError(f"{address}: нет ответа ({last_error or 'таймаут'})")
+
+
+async def read_supplies(address, community="public", timeout=2.0, retries=1, supplies=4):
+    """Читает уровни расходников принтера: [{"номер", "описание", "уровень", "максимум", "процент"}]."""
+    oids = []
+    for n in range(1, supplies + 1):
+        oids += [SUPPLY_DESCRIPTION_OID.format(n), SUPPLY_MAX_CAPACITY_OID.format(n), SUPPLY_LEVEL_OID.format(n)]
+    values = await snmp_get(address, oids, community, timeout, retries)
+    result = []
+    for n in range(1, supplies + 1):
+        level = values.get(SUPPLY_LEVEL_OID.format(n))
+        if level is None:
+            continue
+        maximum = values.get(SUPPLY_MAX_CAPACITY_OID.format(n))
+        # Отрицательные уровни в Printer-MIB означают "неизвестно" / "что-то осталось"; нецелые значения
+        # (строки от нестандартных прошивок) тоже считаются неизвестным уровнем, а не ошибкой опроса
+        if isinstance(level, int) and isinstance(maximum, int) and maximum > 0 and level >= 0:
+            percent = round(100 * level / maximum)
+        else:
+            percent = None
+        result.append({
+            "номер": n,
+            "описание": values.get(SUPPLY_DESCRIPTION_OID.format(n)) or f"Расходник {n}",
+            "уровень": level,
+            "максимум": maximum,
+            "процент": percent
+        })
+    return result
+
+
+class SupplyPoller:
+    """Параллельный опрос парка принтеров с ограничением числа одновременных запросов,
+    кэшированием результатов и прогнозом даты замены по скорости расхода.
+
+    Опрос идёт в фоновом потоке, а отчёт читает кэш из потока интерфейса, поэтому кэш и
+    история уровней читаются и пишутся только под self._lock.
+    """
+
+    def __init__(self, community="public", timeout=2.0, retries=1, concurrency=32, cache_ttl=300, history=20):
+        self.community = community
+        self.timeout = timeout
+        self.retries = retries
+        self.concurrency = concurrency
+        self.cache_ttl = cache_ttl
+        self.cache = {}  # адрес -> {"время", "расходники" | "ошибка"}
+        self.samples = {}  # (адрес, номер расходника) -> deque[(время, процент)]
+        self.history = history
+        self._lock = threading.Lock()
+
+    async def poll(self, address, semaphore=None, force=False):
+        """Результат опроса принтера; свежий (моложе cache_ttl) берётся из кэша, если не force."""
+        cached = self.cached(address)
+        if cached and not force and time.time() - cached["время"] < self.cache_ttl:
+            return cached
+        semaphore = semaphore or asyncio.Semaphore(1)
+        async with semaphore:
+            try:
+                supplies = await read_supplies(address, self.community, self.timeout, self.retries)
+                result = {"время": time.time(), "расходники": supplies}
+            except (SnmpError, OSError, ValueError) as e:
+                result = {"время": time.time(), "ошибка": str(e)}
+        with self._lock:
+            if "расходники" in result:
+                self._add_samples(address, result["время"], result["расходники"])
+            self.cache[address] = result
+        return result
+
+    async def poll_all(self, addresses, force=False):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        addresses = list(dict.fromkeys(a for a in addresses if a))
+        results = await asyncio.gather(*(self.poll(a, semaphore, force) for a in addresses))
+        return dict(zip(addresses, results))
+
+    def poll_fleet(self, addresses, force=False):
+        """Синхронная обёртка для вызова из потока без собственного цикла событий.
+        force — опросить заново и принтеры со свежим результатом в кэше."""
+        started = time.perf_counter()
+        results = asyncio.run(self.poll_all(addresses, force))
+        failed = sum(1 for r in results.values() if "ошибка" in r)
+        logging.info(f"SNMP-опрос: {len(results)} принтеров, ошибок {failed}, "
+                     f"{time.perf_counter() - started:.1f} с")
+        return results
+
+    def cached(self, address):
+        """Последний результат опроса адреса или None."""
+        with self._lock:
+            return self.cache.get(address)
+
+    def invalidate(self, address=None):
+        with self._lock:
+            if address is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(address, None)
+
+    def _add_samples(self, address, timestamp, supplies):
+        for supply in supplies:
+            if supply["процент"] is None:
+                continue
+            samples = self.samples.setdefault((address, supply["номер"]), deque(maxlen=self.history))
+            if samples and supply["процент"] > samples[-1][1]:
+                samples.clear()  # уровень вырос — картридж заменили, старая статистика не нужна
+            samples.append((timestamp, supply["процент"]))
+
+    def predict_days_left(self, address, number):
+        """Оценка дней до опустошения расходника по линейному расходу; None, если данных мало."""
+        with self._lock:
+            samples = self.samples.get((address, number))
+            if not samples or len(samples) < 2:
+                return None
+            (t0, p0), (t1, p1) = samples[0], samples[-1]
+        if p1 >= p0 or t1 <= t0:
+            return None
+        rate_per_day = (p0 - p1) / ((t1 - t0) / 86400)
+        return p1 / rate_per_day
+
+    def summary(self, address):
+        """Краткая сводка для отчёта: (минимальный процент, прогноз дней до замены самого пустого расходника)."""
+        result = self.cached(address)
+        if not result or "расходники" not in result:
+            return None, None
+        known = [s for s in result["расходники"] if s["процент"] is not None]
+        if not known:
+            return None, None
+        lowest = min(known, key=lambda s: s["процент"])
+        return lowest["процент"], self.predict_days_left(address, lowest["номер"])
+
+
+# === Симулятор принтеров ===
+
+class PrinterSimulator(asyncio.DatagramProtocol):
+    """Отвечает на SNMP GET как принтер с убывающими уровнями расходников."""
+
+    def __init__(self, supplies, community="public", drain_per_second=0.0):
+        self.supplies = supplies  # [(описание, максимум, начальный уровень)]
+        self.community = community
+        self.drain_per_second = drain_per_second
+        self.started = time.time()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def current_values(self):
+        elapsed = time.time() - self.started
+        values = {}
+        for n, (description, maximum, level) in enumerate(self.supplies, 1):
+            values[SUPPLY_DESCRIPTION_OID.format(n)] = description
+            values[SUPPLY_MAX_CAPACITY_OID.format(n)] = maximum
+            values[SUPPLY_LEVEL_OID.format(n)] = max(0, int(level - self.drain_per_second * elapsed))
+        return values
+
+    def datagram_received(self, data, addr):
+        try:
+            community, pdu_type, request_id, _, varbinds = decode_message(data)
+        except (SnmpError, IndexError, ValueError):
+            return
+        if pdu_type != GET_REQUEST or community != self.community:
+            return
+        values = self.current_values()
+        response = [(oid, values.get(oid)) for oid, _ in varbinds]
+        self.transport.sendto(encode_message(community, GET_RESPONSE, request_id, response), addr)
+
+
+async def start_simulators(count, base_port, host="127.0.0.1", drain_per_second=0.5, seed=None):
+    """Поднимает count симуляторов на портах base_port..base_port+count-1. Возвращает (адреса, транспорты)."""
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    addresses, transports = [], []
+    for i in range(count):
+        color = rng.random() < 0.3
+        names = ["Black Toner", "Cyan Toner", "Magenta Toner", "Yellow Toner"] if color else ["Black Toner"]
+        supplies = [(name, 100, rng.randint(5, 100)) for name in names]
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: PrinterSimulator(supplies, drain_per_second=drain_per_second), local_addr=(host, base_port + i))
+        addresses.append(f"{host}:{base_port + i}")
+        transports.append(transport)
+    return addresses, transports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SNMP-опрос принтеров и симулятор")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sim = sub.add_parser("simulate", help="запустить симуляторы принтеров")
+    sim.add_argument("--count", type=int, default=20)
+    sim.add_argument("--base-port", type=int, default=16100)
+    sim.add_argument("--drain", type=float, default=0.5, help="расход единиц уровня в секунду")
+    poll = sub.add_parser("poll", help="опросить принтеры")
+    poll.add_argument("addresses", nargs="+")
+    poll.add_argument("--community", default="public")
+    poll.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.command == "simulate":
+        async def serve():
+            addresses, _ = await start_simulators(args.count, args.base_port, drain_per_second=args.drain)
+            print(f"Запущено симуляторов: {len(addresses)} ({addresses[0]} … {addresses[-1]})")
+            await asyncio.Event().wait()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+    else:
+        poller = SupplyPoller(args.community, args.timeout)
+        for address, result in poller.poll_fleet(args.addresses).items():
+            if "ошибка" in result:
+                print(f"{address}: {result['ошибка']}")
+            else:
+                levels = ", ".join(f"{s['описание']}: {s['процент']}%" for s in result["расходники"])
+                print(f"{address}: {levels}")
+
+
+if __name__ == "__main__":
+    main()
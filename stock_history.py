@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from config import resolve_data_dir
+from oplog import first_offset_at, last_entry_at, to_timestamp
+
+STOCK_EVENTS_FILENAME = "stock_events.jsonl"
+STOCK_SNAPSHOTS_FILENAME = "stock_snapshots.jsonl"
+
+
+class StockHistory:
+    """Остатки склада на любой момент времени.
+
+    Каждое изменение остатков дописывается в поток событий (stock_events.jsonl) строкой
+    {"отметка", "изменения": [[площадка, модель, дельта], ...]}. Периодически — каждые
+    snapshot_every строк или раз в snapshot_max_age секунд — в stock_snapshots.jsonl пишется
+    снимок всех остатков вместе со смещением в потоке. Запрос на дату находит ближайший
+    предшествующий снимок двоичным поиском и проигрывает не больше snapshot_every строк после него.
+    """
+
+    def __init__(self, data_dir, snapshot_every=500, snapshot_max_age=86400):
+        self.events_path = os.path.join(data_dir, STOCK_EVENTS_FILENAME)
+        self.snapshots_path = os.path.join(data_dir, STOCK_SNAPSHOTS_FILENAME)
+        self.snapshot_every = snapshot_every
+        self.snapshot_max_age = snapshot_max_age
+        self._last_snapshot_time = None
+        self._events_since_snapshot = 0
+        last = self._last_snapshot()
+        if last is not None:
+            self._last_snapshot_time = last["отметка"]
+            self._events_since_snapshot = sum(1 for _ in self._read_events(last["смещение"]))
+
+    def record(self, deltas, stock, timestamp=None):
+        """Дописывает изменения {(площадка, модель): дельта}; stock — текущие остатки для очередного снимка."""
+        deltas = [[site, model, delta] for (site, model), delta in sorted(deltas.items()) if delta]
+        if not deltas:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        with open(self.events_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"отметка": timestamp, "изменения": deltas}, ensure_ascii=False) + "\n")
+        self._events_since_snapshot += 1
+        if (self._last_snapshot_time is None or self._events_since_snapshot >= self.snapshot_every or
+                timestamp - self._last_snapshot_time >= self.snapshot_max_age):
+            self.snapshot(stock, timestamp)
+
+    def snapshot(self, stock, timestamp=None):
+        """Записывает снимок остатков {площадка: {модель: количество}}."""
+        timestamp = time.time() if timestamp is None else timestamp
+        offset = os.path.getsize(self.events_path) if os.path.exists(self.events_path) else 0
+        entry = {"отметка": timestamp, "смещение": offset,
+                 "остатки": {site: dict(models) for site, models in stock.items() if models}}
+        with open(self.snapshots_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._last_snapshot_time = timestamp
+        self._events_since_snapshot = 0
+
+    def ensure_snapshot(self, stock):
+        """Делает снимок при запуске, если снимков нет, последний устарел или данные правили в обход программы."""
+        now = time.time()
+        if (self._last_snapshot_time is None or now - self._last_snapshot_time >= self.snapshot_max_age or
+                self.stock_at(now) != _without_empty(stock)):
+            self.snapshot(stock, now)
+
+    def first_date(self):
+        """Время самого раннего снимка — раньше этой даты остатки неизвестны."""
+        if not os.path.exists(self.snapshots_path):
+            return None
+        with open(self.snapshots_path, 'rb') as f:
+            line = f.readline()
+        return json.loads(line)["отметка"] if line.strip() else None
+
+    def stock_at(self, when):
+        """Остатки {площадка: {модель: количество}} на момент when (timestamp или datetime) или None,
+        если when раньше первого снимка."""
+        when = to_timestamp(when)
+        if not os.path.exists(self.snapshots_path):
+            return None
+        with open(self.snapshots_path, 'rb') as f:
+            snapshot = last_entry_at(f, when)
+        if snapshot is None:
+            return None
+        stock = {site: dict(models) for site, models in snapshot["остатки"].items()}
+        for entry in self._read_events(snapshot["смещение"]):
+            if entry["отметка"] > when:
+                break
+            for site, model, delta in entry["изменения"]:
+                models = stock.setdefault(site, {})
+                models[model] = models.get(model, 0) + delta
+        return _without_empty(stock)
+
+    def changes_between(self, start, end):
+        """Строки потока событий с start <= отметка < end."""
+        start, end = to_timestamp(start), to_timestamp(end)
+        if not os.path.exists(self.events_path):
+            return []
+        with open(self.events_path, 'rb') as f:
+            offset = first_offset_at(f, start)
+        result = []
+        for entry in self._read_events(offset):
+            if entry["отметка"] >= end:
+                break
+            result.append(entry)
+        return result
+
+    def _read_events(self, offset):
+        if not os.path.exists(self.events_path):
+            return
+        with open(self.events_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _last_snapshot(self):
+        if not os.path.exists(self.snapshots_path):
+            return None
+        with open(self.snapshots_path, 'rb') as f:
+            return last_entry_at(f, float("inf"))
+
+
+def _without_empty(stock):
+    result = {}
+    for site, models in stock.items():
+        models = {model: qty for model, qty in models.items() if qty}
+        if models:
+            result[site] = models
+    return result
+
+
+# === Запуск из командной строки ===
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Signatum: остатки склада на дату")
+    parser.add_argument("date", help="дата и время в формате ГГГГ-ММ-ДД или ГГГГ-ММ-ДД ЧЧ:ММ")
+    parser.add_argument("--data-dir", help="папка данных Signatum (по умолчанию — SIGNATUM_DATA_DIR или config.json)")
+    parser.add_argument("--site", help="только эта площадка")
+    parser.add_argument("--model", help="только эта модель")
+    args = parser.parse_args(argv)
+    data_dir = resolve_data_dir(parser, args)
+    when = datetime.fromisoformat(args.date)
+    if len(args.date) <= 10:
+        when = when.replace(hour=23, minute=59, second=59)  # на конец дня
+    stock = StockHistory(data_dir).stock_at(when)
+    if stock is None:
+        print(f"Нет данных на {when:%d.%m.%Y %H:%M}: снимки остатков начинаются позже")
+        return 1
+    print(f"Остатки на {when:%d.%m.%Y %H:%M}")
+    for site in sorted(stock):
+        if args.site and site != args.site:
+            continue
+        print(f"{site}:")
+        for model, qty in sorted(stock[site].items()):
+            if not args.model or model == args.model:
+                print(f"  {model}: {qty}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import Timings  # noqa: E402
+from synthetic import dataset_sizes, generate  # noqa: E402
+
+# SIGNATUM_TEST_SCALE — множитель размера синтетического набора, SIGNATUM_BUDGET_FACTOR — множитель
+# бюджетов задержки (для медленных машин и отладчика)
+SCALE = float(os.environ.get("SIGNATUM_TEST_SCALE", "1"))
+BUDGET_FACTOR = float(os.environ.get("SIGNATUM_BUDGET_FACTOR", "1"))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "load: нагрузочные сценарии с бюджетами задержки")
+    config.addinivalue_line("markers", "ui: проверки через CartridgeApp (нужен дисплей)")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Нагрузочные сценарии долгие и запускаются только явно: -m load (или выражением с load)."""
+    if "load" in (config.getoption("markexpr") or ""):
+        return
+    load = [item for item in items if item.get_closest_marker("load")]
+    if load:
+        config.hook.pytest_deselected(items=load)
+        items[:] = [item for item in items if not item.get_closest_marker("load")]
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """Модуль main, загруженный из временной папки с синтетическими данными.
+
+    main читает данные при импорте, поэтому папка задаётся через SIGNATUM_DATA_DIR до импорта;
+    набор один на весь прогон, старые папки pytest удаляет сам. Тесты не рассчитывают на конкретные
+    записи набора, а заводят свои модели и площадки (см. site, new_model).
+    """
+    data_dir = str(tmp_path_factory.mktemp("signatum") / "data")
+    generate(data_dir, dataset_sizes(SCALE))
+    os.environ["SIGNATUM_DATA_DIR"] = data_dir
+    import main
+    assert main.DATA_DIR == data_dir
+    return main
+
+
+@pytest.fixture
+def site(app):
+    """Новая пустая площадка."""
+    name = f"Тест {uuid.uuid4().hex[:8]}"
+    app.register_site(name)
+    return name
+
+
+@pytest.fixture
+def new_model(app):
+    """Фабрика моделей реестра с уникальными названиями: new_model(critical=2, color=False)."""
+    def make(critical=2, color=False):
+        name = f"T-{uuid.uuid4().hex[:8]}" + (" Cyan" if color else " Black")
+        with app.operation(f"Тестовая модель {name}"):
+            app.save_cartridge_model({"модель": name, "тип": app.COLOR_TYPE if color else "чёрно-белый"})
+            app.set_critical_levels({name: critical})
+        return name
+    return make
+
+
+@pytest.fixture
+def timings():
+    return Timings(BUDGET_FACTOR)
+
+
+@pytest.fixture
+def tk_root():
+    """Корневое окно Tk; без дисплея тест пропускается (запуск под Xvfb: xvfb-run python -m pytest)."""
+    import tkinter
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError as e:
+        pytest.skip(f"нет дисплея для Tk: {e}")
+    root.withdraw()
+    yield root
+    root.destroy()
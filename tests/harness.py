@@ -0,0 +1,72 @@
+import random
+import time
+
+
+class Timings:
+    """Замеры длительности действий и проверка бюджетов задержки.
+
+    Бюджеты задаются в миллисекундах на действие и умножаются на factor
+    (SIGNATUM_BUDGET_FACTOR), чтобы тот же сценарий можно было гонять на медленной машине.
+    """
+
+    def __init__(self, factor=1.0):
+        self.factor = factor
+        self.samples = {}  # действие -> [длительность, с]
+
+    def measure(self, action, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.samples.setdefault(action, []).append(time.perf_counter() - start)
+        return result
+
+    def percentile(self, action, q):
+        samples = sorted(self.samples[action])
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def report(self):
+        lines = []
+        for action in sorted(self.samples):
+            lines.append(f"{action}: n={len(self.samples[action])}, "
+                         f"p50={self.percentile(action, 0.5) * 1000:.1f} мс, "
+                         f"p95={self.percentile(action, 0.95) * 1000:.1f} мс, "
+                         f"max={max(self.samples[action]) * 1000:.1f} мс")
+        return "\n".join(lines)
+
+    def check(self, budgets):
+        """budgets: действие -> (p95, максимум) в мс. Возвращает список превышений."""
+        over = []
+        for action, (p95, worst) in budgets.items():
+            if action not in self.samples:
+                continue
+            for name, value, limit in (("p95", self.percentile(action, 0.95), p95),
+                                       ("max", max(self.samples[action]), worst)):
+                if value * 1000 > limit * self.factor:
+                    over.append(f"{action}: {name} {value * 1000:.1f} мс > {limit * self.factor:.0f} мс")
+        return over
+
+
+class Session:
+    """Сценарий работы пользователя: последовательность действий, проигрываемая без пауз.
+
+    Действие — функция (app, rnd) -> None; она выполняет то же, что обработчик кнопки в CartridgeApp,
+    но без окон. Веса задают, как часто действие встречается в сценарии.
+    """
+
+    def __init__(self, app, seed=1):
+        self.app = app
+        self.rnd = random.Random(seed)
+        self.actions = []  # [(название, функция, вес)]
+
+    def add(self, name, func, weight=1):
+        self.actions.append((name, func, weight))
+        return self
+
+    def script(self, length):
+        names = [a[0] for a in self.actions]
+        weights = [a[2] for a in self.actions]
+        return self.rnd.choices(names, weights, k=length)
+
+    def replay(self, script, timings):
+        funcs = {name: func for name, func, _ in self.actions}
+        for name in script:
+            timings.measure(name, funcs[name], self.app, self.rnd)
@@ -0,0 +1,88 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+# Размер набора по умолчанию; SIGNATUM_TEST_SCALE умножает все количества (0.1 — быстрый прогон, 5 — нагрузочный)
+BASE_SIZES = {"моделей": 200, "площадок": 5, "принтеров": 3000, "картриджей": 30000, "установок": 60000}
+COLORS = ("Cyan", "Magenta", "Yellow")
+
+
+def dataset_sizes(scale=1.0):
+    return {key: max(1, int(n * scale)) for key, n in BASE_SIZES.items()}
+
+
+def generate(data_dir, sizes, seed=1):
+    """Пишет в data_dir синтетические printers.json, cartridge_models.json, cartridges.json,
+    history.json и settings.json в формате приложения. Набор детерминирован для seed."""
+    rnd = random.Random(seed)
+    now = datetime.now()
+    sites = [f"Площадка {i}" for i in range(1, sizes["площадок"] + 1)]
+
+    # Каждая четвёртая серия — цветная: чёрный и три цветных картриджа
+    models = []
+    mono, color_sets = [], []
+    for i in range(sizes["моделей"]):
+        series = i // 4
+        if series % 4 == 3:
+            name = f"CLR-{series}-{['Black', *COLORS][i % 4]}"
+            if i % 4 == 0:
+                color_sets.append([])
+            color_sets[-1].append(name)
+        else:
+            name = f"MONO-{i}"
+            mono.append(name)
+        models.append({"модель": name, "поставщик": f"Поставщик {i % 7}", "цена": 500 + i % 40 * 100,
+                       "срок_поставки_дней": 7 + i % 3 * 7, "кратность": 1 + i % 2,
+                       "id": f"m{i}"})
+    color_sets = [s for s in color_sets if len(s) == 4] or [[mono[0]]]
+
+    printers = []
+    for i in range(sizes["принтеров"]):
+        slots = rnd.choice(color_sets) if i % 5 == 0 else rnd.sample(mono, min(len(mono), rnd.randint(1, 2)))
+        printer = {"модель": f"Принтер {i % 50}", "серийный_номер": f"PRN{i:06d}", "ip_адрес": "",
+                   "закреплён_за": f"Отдел {i % 30}", "площадка": sites[i % len(sites)], "комментарий": "",
+                   "id": f"p{i}"}
+        for slot, model in enumerate(slots, 1):
+            printer[f"картридж_{slot}"] = model
+        printers.append(printer)
+
+    cartridges = []
+    statuses = ("на складе",) * 6 + ("в использовании", "пустой", "на заправке")
+    for i in range(sizes["картриджей"]):
+        status = rnd.choice(statuses)
+        cartridge = {"модель": models[rnd.randrange(len(models))]["модель"], "серийный_номер": f"SN{i:08d}",
+                     "статус": status, "площадка": rnd.choice(sites),
+                     "дата_поступления": (now - timedelta(days=rnd.randint(0, 700))).isoformat(),
+                     "остаточный_ресурс": 100 if status == "на складе" else rnd.randint(0, 100),
+                     "принтер": "", "принтер_сн": "", "комментарий": "", "количество_заправок": 0,
+                     "id": f"c{i}"}
+        if status == "в использовании":
+            printer = printers[i % len(printers)]
+            cartridge.update(принтер=f"{printer['модель']} ({printer['серийный_номер']})",
+                             принтер_сн=printer["серийный_номер"], площадка=printer["площадка"],
+                             дата_установки=(now - timedelta(days=rnd.randint(0, 200))).isoformat())
+        cartridges.append(cartridge)
+
+    history = []
+    start = now - timedelta(days=365)
+    step = 365 * 86400 / sizes["установок"]
+    for i in range(sizes["установок"]):
+        printer = printers[rnd.randrange(len(printers))]
+        history.append({"модель_картриджа": printer["картридж_1"],
+                        "серийный_номер": cartridges[rnd.randrange(len(cartridges))]["серийный_номер"],
+                        "принтер": f"{printer['модель']} ({printer['серийный_номер']})",
+                        "площадка": printer["площадка"],
+                        "дата_установки": (start + timedelta(seconds=i * step)).isoformat(),
+                        "остаток_при_установке": rnd.randint(0, 100), "id": f"h{i}"})
+
+    settings = {"критические_уровни": {m["модель"]: 2 + i % 4 for i, m in enumerate(models)},
+                "площадки": sites, "площадка_по_умолчанию": sites[0]}
+    files = {"cartridge_models.json": {"модели_картриджей": models}, "printers.json": {"принтеры": printers},
+             "cartridges.json": {"картриджи": cartridges}, "history.json": {"записи": history},
+             "settings.json": settings}
+    os.makedirs(data_dir, exist_ok=True)
+    for name, data in files.items():
+        with open(os.path.join(data_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+    return sites
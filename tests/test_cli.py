@@ -0,0 +1,101 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from synthetic import dataset_sizes, generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Файлы, которые команды вправе писать: журнал программы и пересобираемый кэш столбцов истории
+DERIVED = ("app_log.txt", "history_columns")
+
+
+@pytest.fixture
+def legacy_dir(tmp_path):
+    """Папка данных старой версии: записи без id и списанный картридж, ещё не перенесённый в архив."""
+    data_dir = tmp_path / "data"
+    generate(str(data_dir), dataset_sizes(0.01))
+    for name, section in (("printers.json", "принтеры"), ("cartridges.json", "картриджи")):
+        path = data_dir / name
+        data = json.loads(path.read_text(encoding='utf-8'))
+        for record in data[section][::2]:
+            del record["id"]
+        if section == "картриджи":
+            data[section][0]["статус"] = "списан"
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    return data_dir
+
+
+def folder_state(data_dir):
+    state = {}
+    for base, dirs, files in os.walk(data_dir):
+        dirs[:] = [d for d in dirs if d not in DERIVED]
+        for name in files:
+            if name not in DERIVED:
+                path = os.path.join(base, name)
+                with open(path, 'rb') as f:
+                    state[os.path.relpath(path, data_dir)] = f.read()
+    return state
+
+
+def run(script, *args, cwd):
+    env = {k: v for k, v in os.environ.items() if k != "SIGNATUM_DATA_DIR"}
+    return subprocess.run([sys.executable, os.path.join(ROOT, script), *map(str, args)], cwd=cwd, env=env,
+                          capture_output=True, text=True, timeout=300)
+
+
+def test_integrity_check_is_read_only(legacy_dir, tmp_path):
+    before = folder_state(legacy_dir)
+    result = run("integrity.py", "--data-dir", legacy_dir, cwd=tmp_path)
+    assert result.returncode in (0, 1), result.stderr
+    assert folder_state(legacy_dir) == before
+
+
+def test_integrity_without_data_dir(tmp_path):
+    result = run("integrity.py", "--repair", cwd=tmp_path)
+    assert result.returncode == 2
+    assert "--data-dir" in result.stderr
+
+
+def test_app_startup_migrates_legacy_folder(legacy_dir):
+    """То, что импорт больше не делает, выполняет startup() программы — после резервной копии."""
+    env = {**os.environ, "SIGNATUM_DATA_DIR": str(legacy_dir)}
+    subprocess.run([sys.executable, "-c", "import main; main.startup()"], cwd=ROOT, env=env, check=True,
+                   timeout=300)
+    cartridges = json.loads((legacy_dir / "cartridges.json").read_text(encoding='utf-8'))["картриджи"]
+    assert all(c.get("id") for c in cartridges)
+    assert all(c["статус"] != "списан" for c in cartridges)
+    assert len((legacy_dir / "cartridges_archive.jsonl").read_text(encoding='utf-8').splitlines()) == 1
+    assert (legacy_dir / "stock_snapshots.jsonl").exists()
+    assert any(name.endswith("cartridges.json") for name in os.listdir(legacy_dir / "backups"))
+
+
+def test_reorder_is_read_only(legacy_dir, tmp_path):
+    before = folder_state(legacy_dir)
+    result = run("reorder.py", "--data-dir", legacy_dir, "--csv", tmp_path / "заказ.csv", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / "заказ.csv").exists()
+    assert folder_state(legacy_dir) == before
+
+
+def test_reports_batch_is_read_only(legacy_dir, tmp_path):
+    before = folder_state(legacy_dir)
+    out = tmp_path / "отчёты"
+    result = run("reports.py", out, "--data-dir", legacy_dir, "--workers", 1, "--kinds", "остатки", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert json.loads((out / "manifest.json").read_text(encoding='utf-8'))["отчёты"]
+    assert folder_state(legacy_dir) == before
+
+
+def test_history_stats_rebuilds_stale_store(legacy_dir, tmp_path):
+    result = run("history_store.py", "--data-dir", legacy_dir, cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    path = legacy_dir / "history.json"
+    history = json.loads(path.read_text(encoding='utf-8'))
+    history["записи"].append({**history["записи"][-1], "id": "h-новая"})
+    path.write_text(json.dumps(history, ensure_ascii=False), encoding='utf-8')
+    result = run("history_store.py", "--data-dir", legacy_dir, cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert f"Установок в хранилище: {len(history['записи'])} " in result.stdout
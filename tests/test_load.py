@@ -0,0 +1,120 @@
+import pytest
+
+from harness import Session
+
+pytestmark = pytest.mark.load
+
+SESSION_LENGTH = 400
+# Бюджеты задержки (p95, максимум) в мс — цели отклика, а не замеры текущей версии: просмотр — 100 мс
+# (отклик воспринимается мгновенным), поиск — 200 мс (максимум включает построение индекса при первом
+# запросе), действия, меняющие данные, — 1 с вместе с записью файлов, как в обработчиках кнопок CartridgeApp.
+BUDGETS = {
+    "остатки": (100, 250),
+    "остатки_площадки": (100, 250),
+    "статус_принтера": (100, 250),
+    "статус_всех_принтеров": (100, 250),
+    "количество": (1000, 2000),
+    "установка": (1000, 2000),
+    "поиск": (200, 2000),
+    "отмена": (1000, 2000),
+}
+
+
+def show_stock(app, rnd):
+    app.get_stock_with_status()
+
+
+def show_site_stock(app, rnd):
+    app.get_stock_with_status(rnd.choice(app.get_sites()))
+
+
+def printer_status(app, rnd):
+    app.get_printer_cartridge_status(rnd.choice(app.printers_data["принтеры"]))
+
+
+def all_printers_status(app, rnd):
+    for p in app.printers_data["принтеры"]:
+        app.get_printer_cartridge_status(p)
+
+
+def apply_quantity(app, rnd):
+    """CartridgeApp.edit_stock_quantity → «Применить»."""
+    model = rnd.choice(app.get_cartridge_models_from_registry_only())
+    site = rnd.choice(app.get_sites())
+    current = app.site_stock.get(site, {}).get(model, 0)
+    new_qty = max(0, current + rnd.randint(-3, 5))
+    with app.operation(f"Количество {model} ({site}): {current} → {new_qty}"):
+        app.set_stock_quantity(model, new_qty, site)
+    app.save_json(app.CARTRIDGES_FILE, app.cartridges_data)
+    assert app.site_stock.get(site, {}).get(model, 0) == new_qty
+
+
+def install(app, rnd):
+    """CartridgeApp.confirm_installation без серийного номера: картридж выбирается по политике выдачи."""
+    printer = rnd.choice(app.printers_data["принтеры"])
+    model = printer["картридж_1"]
+    chosen = app.stock_allocator.allocate(model, app.site_of(printer), printer["серийный_номер"])
+    if not chosen:
+        return
+    before = app.site_stock[app.site_of(printer)][model]
+    with app.operation(f"Установка {model}"):
+        app.record_installation(chosen[0], printer)
+    app.save_json(app.CARTRIDGES_FILE, app.cartridges_data)
+    app.save_json(app.HISTORY_FILE, app.history_data)
+    assert chosen[0]["статус"] == "в использовании"
+    assert app.site_stock.get(app.site_of(printer), {}).get(model, 0) == before - 1
+
+
+def search(app, rnd):
+    app.global_search(rnd.choice(["MONO", "CLR Cyan", "Отдел 1", "SN0001", "PRN00", "Принтер 4"]))
+
+
+def undo(app, rnd):
+    app.undo_last()
+
+
+def check_consistency(app):
+    """Счётчики и индексы, которые ведутся по событиям, совпадают с пересчётом по данным."""
+    counted = {}
+    for c in app.cartridges_data["картриджи"]:
+        if c["статус"] == "на складе":
+            counted[c["модель"]] = counted.get(c["модель"], 0) + 1
+    assert counted == app.warehouse_stock
+    assert sum(sum(s.values()) for s in app.site_stock.values()) == sum(counted.values())
+    assert set(app.cartridges_by_id) == {c["id"] for c in app.cartridges_data["картриджи"]}
+    for sn, installed in app.printer_cartridges_index.items():
+        assert all(c["статус"] == "в использовании" and c["принтер_сн"] == sn for c in installed)
+
+
+def user_session(app, seed):
+    return (Session(app, seed)
+            .add("остатки", show_stock, 10)
+            .add("остатки_площадки", show_site_stock, 10)
+            .add("статус_принтера", printer_status, 20)
+            .add("статус_всех_принтеров", all_printers_status, 2)
+            .add("количество", apply_quantity, 2)
+            .add("установка", install, 2)
+            .add("поиск", search, 5)
+            .add("отмена", undo, 1))
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_session_replay(app, timings, seed):
+    session = user_session(app, seed)
+    session.replay(session.script(SESSION_LENGTH), timings)
+    print(timings.report())
+    check_consistency(app)
+    assert not timings.check(BUDGETS), "\n".join(timings.check(BUDGETS)) + "\n" + timings.report()
+
+
+def test_undo_everything_restores_stock(app, timings):
+    check_consistency(app)
+    stock_before = dict(app.warehouse_stock)
+    app.undo_stack.clear()  # отменяются только операции этого сценария
+    session = Session(app, 3).add("количество", apply_quantity).add("установка", install)
+    session.replay(session.script(12), timings)
+    while app.undo_stack:
+        timings.measure("отмена", app.undo_last)
+    check_consistency(app)
+    assert app.warehouse_stock == stock_before
+    assert not timings.check(BUDGETS), "\n".join(timings.check(BUDGETS))
@@ -0,0 +1,82 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def printer(app, site):
+    """Фабрика принтеров площадки site: printer(модель_слота_1, ...)."""
+    def make(*models):
+        record = {"модель": "Тестовый принтер", "серийный_номер": f"T{uuid.uuid4().hex[:10]}", "площадка": site}
+        for slot, model in enumerate(models, 1):
+            record[f"картридж_{slot}"] = model
+        with app.operation("тест"):
+            return app.save_printer_record(record)
+    return make
+
+
+def stock(app, site, **quantities):
+    with app.operation("тест"):
+        for model, qty in quantities.items():
+            app.set_stock_quantity(model, qty, site)
+
+
+def overall(app, printer):
+    return app.get_printer_cartridge_status(printer)[1]
+
+
+def test_not_configured(app, printer):
+    assert app.get_printer_cartridge_status(printer()) == ([], "⚪ Не настроен", "gray")
+
+
+def test_slot_statuses(app, site, printer, new_model):
+    a, b, c = new_model(critical=2), new_model(critical=2), new_model(critical=2)
+    stock(app, site, **{a: 0, b: 1, c: 4})
+    slots, _, _ = app.get_printer_cartridge_status(printer(a, b, c))
+    assert [(s["модель"], s["статус"], s["цвет"]) for s in slots] == [
+        (a, "❌ Отсутствует", "red"), (b, "⚠️ Низкий (1)", "orange"), (c, "✅ Есть (4)", "green")]
+
+
+def test_mono_ready_with_one_cartridge_in_stock(app, site, printer, new_model):
+    a, b = new_model(critical=2), new_model(critical=2)
+    stock(app, site, **{a: 0, b: 2})
+    assert not app.is_color_printer(printer(a, b))
+    assert overall(app, printer(a, b)) == "✅ Готов"
+
+
+def test_mono_not_ready_without_stock(app, site, printer, new_model):
+    a, b = new_model(critical=2), new_model(critical=2)
+    stock(app, site, **{a: 0, b: 1})
+    assert overall(app, printer(a, b)) == "❌ Не готов"
+
+
+def test_mono_low_is_ready(app, site, printer, new_model):
+    a = new_model(critical=3)
+    stock(app, site, **{a: 1})
+    assert overall(app, printer(a)) == "✅ Готов"
+
+
+def test_color_low_is_not_ready(app, site, printer, new_model):
+    black, cyan = new_model(critical=2), new_model(critical=2, color=True)
+    p = printer(black, cyan)
+    assert app.is_color_printer(p)
+    stock(app, site, **{black: 5, cyan: 1})
+    assert app.get_printer_cartridge_status(p)[1:] == ("❌ Не готов", "red")
+    stock(app, site, **{cyan: 2})
+    assert app.get_printer_cartridge_status(p)[1:] == ("✅ Готов", "green")
+
+
+def test_color_by_model_name(app, site, printer):
+    name = f"T-{uuid.uuid4().hex[:8]} Magenta"
+    with app.operation("тест"):
+        app.save_cartridge_model({"модель": name})
+    assert app.is_color_printer(printer(name))
+
+
+def test_uses_printer_site_stock(app, site, printer, new_model):
+    a = new_model(critical=1)
+    other = site + " Б"
+    stock(app, other, **{a: 5})
+    assert overall(app, printer(a)) == "❌ Не готов"
+    stock(app, site, **{a: 1})
+    assert overall(app, printer(a)) == "✅ Готов"
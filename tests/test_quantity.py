@@ -0,0 +1,55 @@
+def on_stock(app, model, site):
+    return [c for c in app.cartridges_data["картриджи"]
+            if c["модель"] == model and c["статус"] == "на складе" and app.site_of(c) == site]
+
+
+def test_increase_and_decrease(app, site, new_model):
+    model = new_model()
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 5, site)
+    added = on_stock(app, model, site)
+    assert len(added) == 5
+    assert len({c["серийный_номер"] for c in added}) == 5
+    assert all(c["остаточный_ресурс"] == 100 and c["площадка"] == site for c in added)
+    assert app.site_stock[site][model] == 5
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 2, site)
+    assert on_stock(app, model, site) == added[:2]
+    assert app.site_stock[site][model] == 2
+    assert app.warehouse_stock[model] == 2
+
+
+def test_zero_removes_site_counter(app, site, new_model):
+    model = new_model()
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 3, site)
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 0, site)
+    assert model not in app.site_stock.get(site, {})
+    assert model not in app.warehouse_stock
+
+
+def test_only_target_site_changes(app, site, new_model):
+    model = new_model()
+    other = site + " Б"
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 4, other)
+        app.set_stock_quantity(model, 1, site)
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 0, site)
+    assert len(on_stock(app, model, other)) == 4
+    assert app.warehouse_stock[model] == 4
+
+
+def test_undo_redo(app, site, new_model):
+    model = new_model()
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 3, site)
+    with app.operation(f"Количество {model} ({site}): 3 → 7"):
+        app.set_stock_quantity(model, 7, site)
+    assert app.undo_last() == f"Количество {model} ({site}): 3 → 7"
+    assert len(on_stock(app, model, site)) == 3
+    assert app.site_stock[site][model] == 3
+    app.redo_last()
+    assert len(on_stock(app, model, site)) == 7
+    assert app.warehouse_stock[model] == 7
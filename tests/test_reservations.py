@@ -0,0 +1,70 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def printer(app, site, new_model):
+    """Новый принтер площадки site под новую модель; на складе 3 картриджа этой модели."""
+    model = new_model()
+    record = {"id": app.new_record_id(), "модель": "Тестовый принтер", "серийный_номер": f"PT-{uuid.uuid4().hex[:8]}",
+              "площадка": site, "картридж_1": model}
+    with app.operation("тест"):
+        app.save_printer_record(record)
+        app.set_stock_quantity(model, 3, site)
+    return record
+
+
+def reserved(app, model, sn):
+    return [c for c in app.cartridges_data["картриджи"] if c["модель"] == model and c.get(app.RESERVE_FIELD) == sn]
+
+
+def orphan_issues(app):
+    issues = app.check_data_integrity()
+    return [i for i in issues if i["проверка"] == "резерв_без_принтера"]
+
+
+@pytest.mark.parametrize("sn", ["", "N/A"])
+def test_no_reservation_without_serial(app, printer, sn):
+    model = printer["картридж_1"]
+    with app.operation("тест"):
+        app.save_printer_record({**printer, "серийный_номер": sn})
+    with pytest.raises(ValueError):
+        with app.operation("тест"):
+            app.set_reservation(model, printer["площадка"], printer, 1)
+    assert reserved(app, model, sn) == []
+
+
+def test_delete_printer_releases_reservation(app, printer):
+    model, sn = printer["картридж_1"], printer["серийный_номер"]
+    with app.operation("тест"):
+        app.set_reservation(model, printer["площадка"], printer, 2)
+    assert len(reserved(app, model, sn)) == 2
+    with app.operation("тест"):
+        app.release_reservations(app.delete_printer(printer["id"])["серийный_номер"])
+    assert reserved(app, model, sn) == []
+    assert app.stock_allocator.available(model, printer["площадка"]) == 3
+    app.undo_last()
+    assert len(reserved(app, model, sn)) == 2
+
+
+def test_serial_change_releases_reservation(app, printer):
+    model, sn = printer["картридж_1"], printer["серийный_номер"]
+    with app.operation("тест"):
+        app.set_reservation(model, printer["площадка"], printer, 1)
+    with app.operation("тест"):
+        app.save_printer_record({**printer, "серийный_номер": sn + "-new"})
+        app.release_reservations(sn)
+    assert reserved(app, model, sn) == []
+
+
+def test_orphan_reservation_found_and_repaired(app, printer):
+    model, sn = printer["картридж_1"], printer["серийный_номер"]
+    with app.operation("тест"):
+        app.set_reservation(model, printer["площадка"], printer, 1)
+        app.delete_printer(printer["id"])  # удалён в обход release_reservations, как в старых данных
+    issues = orphan_issues(app)
+    assert [i["значение"] for i in issues] == [sn]
+    app.repair_data_integrity(issues)
+    assert reserved(app, model, sn) == []
+    assert orphan_issues(app) == []
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+import search_index
+from search_index import SearchIndex, bounded_prefix_distance
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add("принтер", "HP LaserJet printer", "принтер")
+    index.add("картридж", "Cartridge CF283A", "картридж")
+    index.prepare()
+    return index
+
+
+def found(index, query):
+    return [payload for _, payload in index.search(query)]
+
+
+@pytest.mark.parametrize("query", [
+    "pirnte",  # перестановка в начале слова
+    "prnite",
+    "rpin",  # короткое слово
+    "priint",  # лишняя буква у места обрезки префикса
+    "prnter",  # пропущенная буква
+    "pritner",  # перестановка соседних
+    "prinrer",  # замена
+    "printre",
+    "lasrejet",
+])
+def test_one_edit_prefix_typos(index, query):
+    assert found(index, query) == ["принтер"]
+
+
+def test_prefix_and_exact_rank_above_fuzzy(index):
+    assert found(index, "cf283") == ["картридж"]
+    assert index.search("cartridge")[0][0] > index.search("cartrigde")[0][0]
+
+
+def test_two_edits_not_found(index):
+    assert found(index, "pirntre") == []
+
+
+@pytest.mark.parametrize("term, token, distance", [
+    ("priint", "printer", 1),
+    ("print", "printer", 0),
+    ("prnt", "printer", 1),
+    ("abcd", "xyzw", 2),
+])
+def test_bounded_prefix_distance(term, token, distance):
+    assert bounded_prefix_distance(term, token, 1) == min(distance, 2)
+
+
+def one_edit(rnd, word, alphabet):
+    i = rnd.randrange(len(word))
+    kind = rnd.choice(("замена", "вставка", "удаление", "перестановка"))
+    if kind == "замена":
+        return word[:i] + rnd.choice(alphabet) + word[i + 1:]
+    if kind == "вставка":
+        return word[:i] + rnd.choice(alphabet) + word[i:]
+    if kind == "удаление":
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i + 1:i + 2] + word[i] + word[i + 2:]
+
+
+@pytest.mark.parametrize("scan_limit", [search_index.FUZZY_SCAN_LIMIT, 3])
+def test_fuzzy_candidates_match_brute_force(monkeypatch, scan_limit):
+    """Отбор по триграммам не теряет токены, до начала которых от запроса одна правка."""
+    monkeypatch.setattr(search_index, "FUZZY_SCAN_LIMIT", scan_limit)
+    rnd = random.Random(1)
+    alphabet = "abcde"
+    for _ in range(20):
+        vocabulary = {"".join(rnd.choice(alphabet) for _ in range(rnd.randint(3, 9))) for _ in range(150)}
+        index = SearchIndex()
+        for n, token in enumerate(vocabulary):
+            index.add(n, token)
+        words = sorted(vocabulary)
+        for _ in range(150):
+            word = rnd.choice(words)
+            query = one_edit(rnd, word[:rnd.randint(3, len(word))], alphabet)
+            if len(query) < 3:
+                continue
+            expected = {t for t in vocabulary if bounded_prefix_distance(query, t, 1) <= 1}
+            assert set(index._fuzzy_tokens(query)) == expected, query
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+import snmp_poller
+from snmp_poller import (GET_REQUEST, GET_RESPONSE, SUPPLY_DESCRIPTION_OID, SUPPLY_LEVEL_OID, SUPPLY_MAX_CAPACITY_OID,
+                         PrinterSimulator, SnmpError, SupplyPoller, decode_message, encode_message, parse_address)
+
+
+@pytest.mark.parametrize("value", [0, 1, -1, 127, 128, -129, 255, 65535, 2 ** 31 - 1, -2 ** 31, "", "Black Toner",
+                                   "Тонер чёрный", "x" * 300, None])
+def test_value_round_trip(value):
+    data = encode_message("public", GET_RESPONSE, 12345, [("1.3.6.1.2.1.43.11.1.1.9.1.1", value)])
+    assert decode_message(data) == ("public", GET_RESPONSE, 12345, 0, [("1.3.6.1.2.1.43.11.1.1.9.1.1", value)])
+
+
+def test_message_round_trip():
+    varbinds = [("1.3.6.1.2.1.43.11.1.1.6.1.1", None), ("1.3.6.1.4.1.2147483647.16383.128", None),
+                ("2.999.1", None)]
+    data = encode_message("private", GET_REQUEST, 2 ** 31 - 1, varbinds, error_status=2, error_index=1)
+    assert decode_message(data) == ("private", GET_REQUEST, 2 ** 31 - 1, 2, varbinds)
+
+
+def test_long_message_length_encoding():
+    varbinds = [(SUPPLY_LEVEL_OID.format(n), "y" * 50) for n in range(1, 40)]
+    data = encode_message("public", GET_RESPONSE, 1, varbinds)
+    assert len(data) > 1000
+    assert decode_message(data)[4] == varbinds
+
+
+def test_truncated_message():
+    data = encode_message("public", GET_RESPONSE, 1, [(SUPPLY_LEVEL_OID.format(1), "Black Toner")])
+    with pytest.raises(SnmpError):
+        decode_message(data[:-5])
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("10.0.0.5", ("10.0.0.5", 161)),
+    (" 127.0.0.1:16100 ", ("127.0.0.1", 16100)),
+    ("printer.local:1161", ("printer.local", 1161)),
+    ("fe80::1", ("fe80::1", 161)),
+    ("[fe80::1]", ("fe80::1", 161)),
+    ("[::1]:16100", ("::1", 16100)),
+])
+def test_parse_address(address, expected):
+    assert parse_address(address) == expected
+
+
+@pytest.mark.parametrize("address", ["[::1", "[::1]16100", "10.0.0.5:порт"])
+def test_parse_address_invalid(address):
+    with pytest.raises(ValueError):
+        parse_address(address)
+
+
+async def start_simulator(supplies, drain=0.0):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: PrinterSimulator(supplies, drain_per_second=drain), local_addr=("127.0.0.1", 0))
+    host, port = transport.get_extra_info("sockname")[:2]
+    return f"{host}:{port}", transport
+
+
+def test_simulator_round_trip():
+    async def scenario():
+        address, transport = await start_simulator([("Black Toner", 200, 50), ("Cyan Toner", 100, 7)])
+        try:
+            poller = SupplyPoller(timeout=1.0, retries=0)
+            return address, await poller.poll_all([address, "", address]), poller
+        finally:
+            transport.close()
+
+    address, results, poller = asyncio.run(scenario())
+    assert list(results) == [address]
+    supplies = results[address]["расходники"]
+    assert [(s["номер"], s["описание"], s["уровень"], s["максимум"], s["процент"]) for s in supplies] == [
+        (1, "Black Toner", 50, 200, 25), (2, "Cyan Toner", 7, 100, 7)]
+    assert poller.summary(address) == (7, None)
+
+
+def test_non_integer_levels(monkeypatch):
+    """Строка вместо числа в уровне или ёмкости даёт неизвестный процент, а не ошибку всего принтера."""
+    values = {SUPPLY_DESCRIPTION_OID.format(1): "Black Toner", SUPPLY_MAX_CAPACITY_OID.format(1): 100,
+              SUPPLY_LEVEL_OID.format(1): "OK",
+              SUPPLY_DESCRIPTION_OID.format(2): "Cyan Toner", SUPPLY_MAX_CAPACITY_OID.format(2): "",
+              SUPPLY_LEVEL_OID.format(2): 40,
+              SUPPLY_DESCRIPTION_OID.format(3): "Magenta Toner", SUPPLY_MAX_CAPACITY_OID.format(3): 200,
+              SUPPLY_LEVEL_OID.format(3): 50}
+
+    async def fake_get(address, oids, *args):
+        return values
+
+    monkeypatch.setattr(snmp_poller, "snmp_get", fake_get)
+    supplies = asyncio.run(snmp_poller.read_supplies("printer", supplies=3))
+    assert [(s["уровень"], s["максимум"], s["процент"]) for s in supplies] == [
+        ("OK", 100, None), (40, "", None), (50, 200, 25)]
+
+
+def test_cache_and_force_refresh():
+    async def scenario():
+        address, transport = await start_simulator([("Black Toner", 100, 80)])
+        poller = SupplyPoller(timeout=0.3, retries=0, cache_ttl=300)
+        first = await poller.poll(address)
+        transport.close()
+        cached = await poller.poll(address)  # симулятор остановлен — ответ из кэша
+        forced = await poller.poll(address, force=True)
+        return first, cached, forced
+
+    first, cached, forced = asyncio.run(scenario())
+    assert cached is first
+    assert "ошибка" in forced
+
+
+def test_prediction_from_samples():
+    poller = SupplyPoller()
+    day = 86400
+    poller._add_samples("a", 0, [{"номер": 1, "процент": 50}])
+    poller._add_samples("a", 5 * day, [{"номер": 1, "процент": 40}])
+    assert poller.predict_days_left("a", 1) == pytest.approx(20)
+    # Уровень вырос — картридж заменили, прогноз начинается заново
+    poller._add_samples("a", 6 * day, [{"номер": 1, "процент": 100}])
+    assert poller.predict_days_left("a", 1) is None
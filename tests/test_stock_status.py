@@ -0,0 +1,83 @@
+def status_of(app, model, site=None):
+    return next(item for item in app.get_stock_with_status(site) if item["модель"] == model)
+
+
+def test_all_registry_models_listed_with_zero_stock(app, site, new_model):
+    model = new_model()
+    rows = app.get_stock_with_status(site)
+    assert {row["модель"] for row in rows} == set(app.get_cartridge_models_from_registry_only())
+    row = status_of(app, model, site)
+    assert (row["количество"], row["статус"], row["цвет"], row["приоритет"]) == (0, "Отсутствует", "red", 1)
+
+
+def test_status_thresholds(app, site, new_model):
+    model = new_model(critical=3)
+    expected = {0: "Отсутствует", 1: "Низкий", 2: "Низкий", 3: "Норма", 7: "Норма"}
+    for qty, status in expected.items():
+        with app.operation("тест"):
+            app.set_stock_quantity(model, qty, site)
+        row = status_of(app, model, site)
+        assert row["количество"] == qty
+        assert row["критический_уровень"] == 3
+        assert row["статус"] == status, qty
+
+
+def test_site_critical_level_overrides_global(app, site, new_model):
+    model = new_model(critical=2)
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 3, site)
+        app.set_critical_levels({model: 5}, site)
+    assert status_of(app, model, site)["статус"] == "Низкий"
+    assert status_of(app, model)["критический_уровень"] == 2
+
+
+def test_all_sites_total(app, site, new_model):
+    other = site + " Б"
+    app.register_site(other)
+    model = new_model(critical=4)
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 2, site)
+        app.set_stock_quantity(model, 3, other)
+    assert status_of(app, model, site)["статус"] == "Низкий"
+    assert status_of(app, model, other)["статус"] == "Низкий"
+    total = status_of(app, model)
+    assert (total["количество"], total["статус"]) == (5, "Норма")
+
+
+def test_sorted_by_priority(app, site):
+    priorities = [row["приоритет"] for row in app.get_stock_with_status(site)]
+    assert priorities == sorted(priorities)
+
+
+def test_only_stock_status_counts(app, site, new_model):
+    model = new_model(critical=1)
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 2, site)
+    cartridge = next(c for c in app.cartridges_data["картриджи"] if c["модель"] == model)
+    with app.operation("тест"):
+        app.change_cartridge_state(cartridge, "списан")
+    assert status_of(app, model, site)["количество"] == 1
+
+
+def archived_ids(app):
+    with open(app.CARTRIDGES_ARCHIVE_FILE, encoding='utf-8') as f:
+        return [app.json.loads(line)["id"] for line in f if line.strip()]
+
+
+def test_write_off_undo_keeps_archive_in_step(app, site, new_model):
+    model = new_model()
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 1, site)
+    cartridge = next(c for c in app.cartridges_data["картриджи"] if c["модель"] == model)
+    app.undo_stack.clear()
+    for _ in range(2):  # списание, отмена и повторное списание — в архиве одна строка
+        with app.operation("тест"):
+            app.change_cartridge_state(cartridge, "списан")
+            app.offload_terminal_cartridges()
+        assert archived_ids(app).count(cartridge["id"]) == 1
+        app.undo_last()
+        assert cartridge["id"] not in archived_ids(app)
+        assert status_of(app, model, site)["количество"] == 1
+    app.redo_last()
+    assert archived_ids(app).count(cartridge["id"]) == 1
+    assert cartridge["id"] not in app.cartridges_by_id
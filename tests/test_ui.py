@@ -0,0 +1,92 @@
+import pytest
+
+pytestmark = pytest.mark.ui
+
+
+@pytest.fixture
+def ui(app, tk_root, monkeypatch):
+    """CartridgeApp в скрытом окне; диалоги messagebox не показываются, а записываются в ui.messages."""
+    messages = []
+    for kind in ("showinfo", "showwarning", "showerror"):
+        monkeypatch.setattr(app.messagebox, kind, lambda title, text, kind=kind, **kw: messages.append((kind, text)))
+    window = app.CartridgeApp(tk_root)
+    window.messages = messages
+    yield window
+    app.bus.unsubscribe(window.on_data_changed)
+    app.bus.unsubscribe(window.views._on_changes)
+    app.alert_engine.listeners.remove(window.show_alerts)
+
+
+def select_stock_row(ui, site, model):
+    ui.site_var.set(site)
+    ui.on_search_change()
+    ui.stock_tree.selection_set(model)
+
+
+def dialog(ui):
+    """Последнее открытое окно Toplevel: (окно, поле ввода, кнопки по тексту)."""
+    win = [w for w in ui.root.winfo_children() if w.winfo_class() == "Toplevel"][-1]
+    entry = next(w for w in win.winfo_children() if w.winfo_class() == "Entry")
+    buttons = {w.cget("text"): w for w in win.winfo_children() if w.winfo_class() == "Button"}
+    return win, entry, buttons
+
+
+def test_main_view_rows_match_stock(app, ui, site, new_model):
+    model = new_model(critical=3)
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 1, site)
+    ui.site_var.set(site)
+    ui.on_search_change()
+    values = ui.stock_tree.item(model)["values"]
+    assert [str(v) for v in values] == [model, "1", "3", "Низкий"]
+    assert list(ui.stock_tree.item(model)["tags"]) == ["orange"]
+
+
+def test_apply_quantity(app, ui, site, new_model):
+    model = new_model(critical=2)
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 1, site)
+    select_stock_row(ui, site, model)
+    ui.edit_stock_quantity()
+    win, entry, buttons = dialog(ui)
+    entry.delete(0, "end")
+    entry.insert(0, "4")
+    buttons["Применить"].invoke()
+    assert ui.messages[-1][0] == "showinfo"
+    assert app.site_stock[site][model] == 4
+    # Главный экран обновился по событию, без ручного «Обновить данные»
+    assert str(ui.stock_tree.item(model)["values"][1]) == "4"
+    assert app.undo_stack[-1]["операция"] == f"Количество {model} ({site}): 1 → 4"
+
+
+@pytest.mark.parametrize("text", ["-1", "abc", ""])
+def test_apply_quantity_rejects_invalid(app, ui, site, new_model, text):
+    model = new_model()
+    with app.operation("тест"):
+        app.set_stock_quantity(model, 2, site)
+    select_stock_row(ui, site, model)
+    ui.edit_stock_quantity()
+    win, entry, buttons = dialog(ui)
+    entry.delete(0, "end")
+    entry.insert(0, text)
+    buttons["Применить"].invoke()
+    assert ui.messages[-1][0] == "showerror"
+    assert win.winfo_exists()
+    assert app.site_stock[site][model] == 2
+
+
+def test_quantity_needs_site(app, ui, new_model):
+    model = new_model()
+    ui.site_var.set(app.ALL_SITES)
+    ui.on_search_change()
+    ui.stock_tree.selection_set(model)
+    ui.edit_stock_quantity()
+    assert ui.messages[-1][0] == "showwarning"
+
+
+def test_main_view_refresh_budget(app, ui, timings):
+    for site in [app.ALL_SITES] + app.get_sites()[:5]:
+        ui.site_var.set(site)
+        timings.measure("обновление_главного_экрана", ui.on_search_change)
+    budget = {"обновление_главного_экрана": (app.VIEW_SWITCH_BUDGET_MS, 3 * app.VIEW_SWITCH_BUDGET_MS)}
+    assert not timings.check(budget), timings.report()
@@ -0,0 +1,253 @@
+import io
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
+
+# Минимальная поддержка формата XLSX (Office Open XML) без сторонних библиотек.
+# Запись потоковая: строки листа сразу уходят в zip-архив; чтение — iterparse по строкам листа.
+
+NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+MAX_SHEET_NAME = 31
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_SHEET_NAME_FORBIDDEN = re.compile(r"[\[\]:*?/\\]")
+
+_CONTENT_TYPES_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<Relationships xmlns="{PKG_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+# Стиль 0 — обычный, стиль 1 — жирный (строка заголовков)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<styleSheet xmlns="{NS}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+
+
+def column_letter(index):
+    """0 -> A, 25 -> Z, 26 -> AA."""
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def column_index(ref):
+    """Номер столбца (с нуля) по ссылке на ячейку вида "AB12"."""
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - 64
+    return index - 1
+
+
+class XlsxWriter:
+    """Потоковая запись книги XLSX.
+
+    Листы пишутся по одному: write_sheet принимает итерируемый источник строк и сразу
+    сжимает их в архив, так что в памяти держится только текущая строка. Строки хранятся
+    прямо в ячейках (inline), без общей таблицы строк, которую пришлось бы копить до конца.
+    """
+
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        self.sheets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write_sheet(self, name, header, rows):
+        """Пишет лист с заголовком header (жирным, закреплённым) и строками rows. Возвращает число строк."""
+        name = self._unique_name(name)
+        self.sheets.append(name)
+        letters = [column_letter(i) for i in range(len(header))]
+        raw = self.zip.open(f"xl/worksheets/sheet{len(self.sheets)}.xml", 'w', force_zip64=True)
+        f = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        count = 0
+        try:
+            f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<worksheet xmlns="{NS}"><sheetViews><sheetView workbookViewId="0">'
+                    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+                    '</sheetView></sheetViews><sheetData>')
+            f.write(_row_xml(1, header, letters, ' s="1"'))
+            for count, row in enumerate(rows, 1):
+                if len(row) > len(letters):
+                    letters.extend(column_letter(i) for i in range(len(letters), len(row)))
+                f.write(_row_xml(count + 1, row, letters))
+            f.write('</sheetData></worksheet>')
+        finally:
+            f.close()
+        return count
+
+    def close(self):
+        if self.zip is None:
+            return
+        content_types = _CONTENT_TYPES_HEAD + "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(self.sheets) + 1)) + '</Types>'
+        workbook = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<workbook xmlns="{NS}" xmlns:r="{REL_NS}"><sheets>' +
+            "".join(f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>'
+                    for i, name in enumerate(self.sheets, 1)) +
+            '</sheets></workbook>')
+        styles_id = len(self.sheets) + 1
+        workbook_rels = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{PKG_REL_NS}">' +
+            "".join(f'<Relationship Id="rId{i}" Type="{REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                    for i in range(1, len(self.sheets) + 1)) +
+            f'<Relationship Id="rId{styles_id}" Type="{REL_NS}/styles" Target="styles.xml"/>'
+            '</Relationships>')
+        self.zip.writestr("[Content_Types].xml", content_types)
+        self.zip.writestr("_rels/.rels", _ROOT_RELS)
+        self.zip.writestr("xl/workbook.xml", workbook)
+        self.zip.writestr("xl/_rels/workbook.xml.rels", workbook_rels)
+        self.zip.writestr("xl/styles.xml", _STYLES)
+        self.zip.close()
+        self.zip = None
+
+    def _unique_name(self, name):
+        name = _SHEET_NAME_FORBIDDEN.sub("_", name)[:MAX_SHEET_NAME] or "Лист"
+        base, n = name, 2
+        while name in self.sheets:
+            suffix = f" ({n})"
+            name = base[:MAX_SHEET_NAME - len(suffix)] + suffix
+            n += 1
+        return name
+
+
+def _row_xml(number, values, letters, style=""):
+    cells = []
+    for letter, value in zip(letters, values):
+        if value is None or value == "":
+            continue
+        ref = f"{letter}{number}"
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value == value and \
+                abs(value) != float("inf"):
+            cells.append(f'<c r="{ref}"{style}><v>{value}</v></c>')
+        else:
+            text = escape(_ILLEGAL_XML.sub("", str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"{style}><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+# === Чтение ===
+
+def sheet_names(path):
+    with zipfile.ZipFile(path) as z:
+        return [name for name, _ in _sheet_targets(z)]
+
+
+def iter_rows(path, sheet=None):
+    """Строки листа sheet (по умолчанию — первого) списками значений: str, int, float или bool; пустые ячейки — None.
+    Даты (t="d") возвращаются строкой ISO 8601; числовая ячейка с нечисловым текстом вызывает ValueError.
+
+    Лист разбирается потоково: обработанные строки сразу удаляются из дерева, в памяти остаётся
+    только таблица общих строк книги.
+    """
+    with zipfile.ZipFile(path) as z:
+        targets = dict(_sheet_targets(z))
+        if sheet is None:
+            if not targets:
+                return
+            sheet = next(iter(targets))
+        if sheet not in targets:
+            raise KeyError(f"В книге нет листа '{sheet}'")
+        shared = _shared_strings(z)
+        with z.open(targets[sheet]) as f:
+            sheet_data = None
+            for event, elem in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == f"{{{NS}}}sheetData":
+                        sheet_data = elem
+                    continue
+                if elem.tag != f"{{{NS}}}row":
+                    continue
+                row = []
+                for cell in elem.iter(f"{{{NS}}}c"):
+                    ref = cell.get("r")
+                    if ref:
+                        index = column_index(ref)
+                        if index > len(row):
+                            row.extend([None] * (index - len(row)))
+                    row.append(_cell_value(cell, shared))
+                yield row
+                if sheet_data is not None:
+                    sheet_data.clear()
+
+
+def _sheet_targets(z):
+    """[(имя листа, путь в архиве)] в порядке книги."""
+    workbook = ET.fromstring(z.read("xl/workbook.xml"))
+    rels = ET.fromstring(z.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{{{PKG_REL_NS}}}Relationship")}
+    result = []
+    for sheet in workbook.iter(f"{{{NS}}}sheet"):
+        target = targets[sheet.get(f"{{{REL_NS}}}id")]
+        target = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+        result.append((sheet.get("name"), target))
+    return result
+
+
+def _shared_strings(z):
+    if "xl/sharedStrings.xml" not in z.namelist():
+        return []
+    strings = []
+    with z.open("xl/sharedStrings.xml") as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f"{{{NS}}}si":
+                strings.append("".join(t.text or "" for t in elem.iter(f"{{{NS}}}t")))
+                elem.clear()
+    return strings
+
+
+def _cell_value(cell, shared):
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        return "".join(t.text or "" for t in cell.iter(f"{{{NS}}}t"))
+    v = cell.find(f"{{{NS}}}v")
+    if v is None or v.text is None:
+        return None
+    if kind == "s":
+        return shared[int(v.text)]
+    if kind in ("str", "e"):
+        return v.text
+    if kind == "b":
+        return v.text == "1"
+    if kind == "d":
+        return v.text  # дата ISO 8601 — строкой, как записана в книге
+    try:
+        number = float(v.text)
+    except ValueError:
+        raise ValueError(f"ячейка {cell.get('r', '?')}: «{v.text}» — не число") from None
+    return int(number) if number.is_integer() else number